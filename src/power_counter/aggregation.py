@@ -0,0 +1,256 @@
+"""
+Module providing the windowed aggregation of the readings of the powercounter application.
+
+The WindowAggregator is placed between the parsing of the SML files and the
+sinks. It keeps running statistics of the readings of each meter and OBIS ID
+and passes the minimum, maximum, mean, last value and count of each closed
+window to the sinks instead of (or in addition to) the raw readings.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .sml_message_processor import ReadingBatchCallbackType, SmlReading, SmlReadingBatch
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Names of the statistics of a window used as SmlReading.statistic
+STATISTIC_MIN = "min"
+STATISTIC_MAX = "max"
+STATISTIC_MEAN = "mean"
+STATISTIC_LAST = "last"
+STATISTIC_COUNT = "count"
+
+
+# -----------------------------------------------------------------------------
+# Class Definitions
+# -----------------------------------------------------------------------------
+class RunningStatistics:
+    """Running statistics of the readings of an OBIS ID in a fixed amount of memory."""
+
+    __slots__ = ("obj_name", "unit", "minimum", "maximum", "total", "count", "last")
+
+    def __init__(self, obj_name: str, unit: str) -> None:
+        """Construct a new, empty RunningStatistics object.
+
+        Args:
+            obj_name (str): The OBIS ID of the readings.
+            unit (str):     The unit of the readings.
+        """
+        self.obj_name = obj_name
+        self.unit = unit
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+        self.count = 0
+        self.last = 0.0
+
+    def add(self, value: float) -> None:
+        """Add a reading.
+
+        Args:
+            value (float): The value of the reading.
+        """
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.total += value
+        self.count += 1
+        self.last = value
+
+    def merge(self, other: "RunningStatistics") -> None:
+        """Add the readings of a later period.
+
+        Args:
+            other (obj): The RunningStatistics object of the later period.
+        """
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.total += other.total
+        self.count += other.count
+        self.last = other.last
+        self.unit = other.unit
+
+    def get_readings(self, obis_code: bytes) -> List[SmlReading]:
+        """Get the statistics as readings.
+
+        Args:
+            obis_code (bytes): The raw object name.
+
+        Return:
+            Returns the readings of the minimum, maximum, mean, last value and count.
+        """
+        return [
+            SmlReading(obis_code, self.obj_name, self.minimum, self.unit, STATISTIC_MIN),
+            SmlReading(obis_code, self.obj_name, self.maximum, self.unit, STATISTIC_MAX),
+            SmlReading(obis_code, self.obj_name, self.total / self.count, self.unit, STATISTIC_MEAN),
+            SmlReading(obis_code, self.obj_name, self.last, self.unit, STATISTIC_LAST),
+            SmlReading(obis_code, self.obj_name, float(self.count), "", STATISTIC_COUNT),
+        ]
+
+
+# pylint: disable=too-few-public-methods
+class _MeterWindows:
+    """Panes of the current windows of a meter."""
+
+    def __init__(self, num_panes: int, pane_index: int) -> None:
+        """Construct a new _MeterWindows object with an empty pane.
+
+        Args:
+            num_panes (int):  The number of panes of a window.
+            pane_index (int): The index of the current pane.
+        """
+        self.pane_index = pane_index
+        self.panes: Deque[Dict[bytes, RunningStatistics]] = deque([{}], maxlen=num_panes)
+
+
+class WindowAggregator:
+    """Aggregate the readings over windows based on the arrival time of the SML files.
+
+    The time is split into panes of the step size aligned to the epoch, so a
+    window of 60 seconds ends at full minutes. A window consists of the last
+    window / step panes, rounded up. With a step equal to the window size the
+    windows are tumbling, with a smaller step they are sliding. Only the
+    statistics of each pane are kept, so the memory is fixed per meter and
+    OBIS ID.
+
+    A window is closed by the first SML file of the meter arriving after the
+    end of the window, or by calling flush(). The statistics of a closed window
+    are passed to the callback as SmlReadingBatch with the end of the window as
+    timestamp and five readings per OBIS ID with the statistic set to min, max,
+    mean, last and count.
+    """
+
+    def __init__(
+        self, reading_batch_cb: ReadingBatchCallbackType, window: float, step: Optional[float] = None, raw: bool = False
+    ) -> None:
+        """Construct a new WindowAggregator object.
+
+        Args:
+            reading_batch_cb: Callback function taking a SmlReadingBatch object.
+            window (float):   The size of a window in seconds.
+            step (float):     The time in seconds between the ends of two windows.
+                              None or a value larger than the window size selects
+                              tumbling windows.
+            raw (bool):       If set to True, the raw readings are passed to the
+                              callback as well.
+        """
+        if window <= 0.0:
+            raise ValueError(f"Invalid window size {window}!")
+        self.step = window if step is None or step <= 0.0 or step > window else step
+        self.num_panes = math.ceil(window / self.step - 1e-9)
+        self.raw = raw
+        self._reading_batch_cb = reading_batch_cb
+        self._meters: Dict[str, _MeterWindows] = {}
+
+    def __call__(self, batch: SmlReadingBatch) -> None:
+        """Add the readings of an SML file and pass the statistics of the closed windows to the callback.
+
+        Args:
+            batch (obj): The SmlReadingBatch object.
+        """
+        pane_index = int(batch.timestamp // self.step)
+        meter = self._meters.get(batch.label)
+        if meter is None:
+            meter = self._meters[batch.label] = _MeterWindows(self.num_panes, pane_index)
+        elif pane_index > meter.pane_index:
+            self._close_panes(batch.label, meter, pane_index, batch.monotonic)
+        if self.raw:
+            self._reading_batch_cb(batch)
+
+        # Readings arriving late, e.g., after a clock change, are added to the current pane
+        pane = meter.panes[-1]
+        for reading in batch.readings:
+            statistics = pane.get(reading.obis_code)
+            if statistics is None:
+                statistics = pane[reading.obis_code] = RunningStatistics(reading.obj_name, reading.unit)
+            statistics.add(reading.value)
+
+    def flush(self) -> None:
+        """Close the current windows of all meters, e.g., at the end of the input."""
+        for label, meter in self._meters.items():
+            self._close_panes(label, meter, meter.pane_index + 1, time.monotonic())
+
+    def _close_panes(self, label: str, meter: _MeterWindows, pane_index: int, monotonic: float) -> None:
+        """Close the panes of a meter before the given pane and pass the statistics of the windows to the callback.
+
+        Args:
+            label (str):       The label of the meter.
+            meter (obj):       The _MeterWindows object of the meter.
+            pane_index (int):  The index of the new current pane.
+            monotonic (float): The monotonic time of the batches passed to the callback.
+        """
+        while meter.pane_index < pane_index:
+            readings = self._get_window_readings(meter.panes)
+            if not readings:
+                # All panes of the window are empty, so are the following windows
+                meter.pane_index = pane_index
+                break
+            meter.pane_index += 1
+            self._reading_batch_cb(SmlReadingBatch(meter.pane_index * self.step, monotonic, readings, label))
+            meter.panes.append({})
+
+    @staticmethod
+    def _get_window_readings(panes: Iterable[Dict[bytes, RunningStatistics]]) -> tuple:
+        """Combine the statistics of the panes of a window.
+
+        Args:
+            panes (list): The statistics of the panes by raw object name, oldest first.
+
+        Return:
+            Returns the readings of the statistics of the window.
+        """
+        window: Dict[bytes, RunningStatistics] = {}
+        for pane in panes:
+            for obis_code, statistics in pane.items():
+                combined = window.get(obis_code)
+                if combined is None:
+                    combined = window[obis_code] = RunningStatistics(statistics.obj_name, statistics.unit)
+                combined.merge(statistics)
+        return tuple(
+            reading for obis_code, statistics in window.items() for reading in statistics.get_readings(obis_code)
+        )
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def get_window_aggregator(args: Any, reading_batch_cb: ReadingBatchCallbackType) -> Optional[WindowAggregator]:
+    """Get the WindowAggregator object specified by the --window options.
+
+    Args:
+        args (obj):       The command line arguments.
+        reading_batch_cb: Callback function taking a SmlReadingBatch object.
+
+    Return:
+        Returns the WindowAggregator object passing the statistics to the callback
+        or None if no window is specified.
+    """
+    if not args.window or args.window <= 0.0:
+        return None
+    aggregator = WindowAggregator(reading_batch_cb, args.window, args.window_step, args.window_raw)
+    LOGGER.debug("Aggregating the readings over windows of %d x %.1f seconds.", aggregator.num_panes, aggregator.step)
+    return aggregator
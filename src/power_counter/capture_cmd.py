@@ -16,9 +16,11 @@ Copyright:
 # -----------------------------------------------------------------------------
 import argparse
 import logging
+import time
 from typing import Any
 
-from .serial_ifc import get_serial
+from .input_source import open_source
+from .serial_ifc import get_devices
 
 # -----------------------------------------------------------------------------
 # Logger
@@ -26,6 +28,13 @@ from .serial_ifc import get_serial
 LOGGER = logging.getLogger()
 
 
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Minimum interval in seconds between two progress outputs
+PROGRESS_INTERVAL = 1.0
+
+
 # -----------------------------------------------------------------------------
 # Module Variables
 # -----------------------------------------------------------------------------
@@ -33,11 +42,12 @@ DESCRIPTION = """
 PowerCounter 'capture' command
 ==============================
 
-Capture from the serial port and save the output in a file without any further
-processing.
+Capture from the serial port (or another device source) and save the output in
+a file without any further processing.
 
 Example:
     powercounter -d /dev/ttyUSB1 capture test.dat
+    powercounter -d tcp://ser2net-host:2001 capture test.dat
 """
 
 
@@ -55,19 +65,28 @@ def capture(args: Any) -> bool:
     """
     print(f"Saving data into file {args.output_file}. Press Ctrl-C to stop.")
 
-    # Open serial port
-    serial_dev = get_serial(args)
-    if serial_dev is None:
+    # Open the first device
+    devices = get_devices(args)
+    if not devices:
+        return False
+    source = open_source(devices[0].port)
+    if source is None:
         return False
 
     with open(args.output_file, "wb") as output_fh:
         num_bytes = 0
+        next_progress = time.monotonic()
         while True:
             try:
-                byte_buffer = serial_dev.read(64)
+                byte_buffer = source.read()
+                if not byte_buffer and source.finished:
+                    print(f"\n\nInput source finished after {num_bytes} bytes.")
+                    break
                 output_fh.write(byte_buffer)
                 num_bytes += len(byte_buffer)
-                print(f"Read {num_bytes} bytes...\r")
+                if time.monotonic() >= next_progress:
+                    print(f"Read {num_bytes} bytes...\r")
+                    next_progress = time.monotonic() + PROGRESS_INTERVAL
             except KeyboardInterrupt:
                 print("\n\nFinishing capture.")
                 break
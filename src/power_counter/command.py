@@ -20,8 +20,11 @@ import time
 from typing import Any, Dict
 
 from .capture_cmd import add_capture_parser
+from .derived_power import DEFAULT_POWER_INTERVAL, parse_derived_power_rule
+from .pipeline import DEFAULT_QUEUE_SIZE, OVERFLOW_POLICIES
 from .print_cmd import add_print_parser
 from .publish_cmd import add_publish_parser
+from .serial_ifc import DEFAULT_DEVICE, parse_device_spec
 
 # -----------------------------------------------------------------------------
 # Logger
@@ -120,19 +123,86 @@ def get_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "-d",
         "--device",
-        help="The serial port device to open. Default: %(default)s.",
-        action="store",
-        default="/dev/ttyUSB0",
+        metavar="PORT[,label=LABEL][,prefix=PREFIX]",
+        help="The serial port device to open or a source URL like serial:///dev/ttyUSB0, tcp://host:port "
+        "(e.g., of a ser2net server), file://capture.dat or - for the standard input. "
+        "Specify this option multiple times to read several meters. "
+        "The label identifies the meter in the output and defaults to the base name of the port, the prefix "
+        f"is prepended to the MQTT topics of the meter. Default: {DEFAULT_DEVICE}.",
+        action="append",
+        type=parse_device_spec,
+        default=None,
     )
     parser.add_argument(
         "-i",
         "--input-file",
         metavar="DATAFILE",
         help="Instead of using a serial port, read the data from "
-        "the specified data file (previously captured using the -c option).",
+        "the specified data file (previously captured using the capture command) or - for the standard input.",
+        action="store",
+        default=None,
+    )
+    parser.add_argument(
+        "--queue-size",
+        help="Maximum number of SML files in each queue between reading, parsing and "
+        "processing the data. Default: %(default)s",
         action="store",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+    )
+    parser.add_argument(
+        "--overflow-policy",
+        help="Policy if a queue is full. Default: block for input files, drop-oldest for serial ports and "
+        "network sources.",
+        action="store",
+        choices=OVERFLOW_POLICIES,
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of processes to parse an input file in parallel or 0 to use all cores. In parallel mode, "
+        "the input file is memory-mapped and only the readings are processed. Default: %(default)s",
+        action="store",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--derive-power",
+        metavar="OBIS_ID[,power=OBIS_ID][,interval=SECONDS][,wrap=VALUE]",
+        help="Derive the average power from the changes of an energy counter and process it like a reading of "
+        "the meter. The power OBIS ID defaults to the OBIS ID of the counter with the value group D set to 7, "
+        "e.g., 1-0:1.7.0*255 for 1-0:1.8.0*255. The power is derived once per interval (Default: "
+        f"{DEFAULT_POWER_INTERVAL} seconds). A counter decreasing by at least half of the wrap value wraps "
+        "around. Specify this option multiple times for several counters.",
+        action="append",
+        type=parse_derived_power_rule,
         default=None,
     )
+    parser.add_argument(
+        "--window",
+        metavar="SECONDS",
+        help="Aggregate the readings over windows of the given size based on the arrival time of the SML files "
+        "and process the min, max, mean, last value and count of each window instead of the raw readings.",
+        action="store",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--window-step",
+        metavar="SECONDS",
+        help="Time between the ends of two sliding windows. The window size is rounded up to a multiple of "
+        "the step. Default: the window size (tumbling windows)",
+        action="store",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--window-raw",
+        help="Process the raw readings in addition to the statistics of the windows.",
+        action="store_true",
+        default=False,
+    )
 
     # Add commands
     add_capture_parser(subparsers)
@@ -1,6 +1,14 @@
 """
 CRC calculation.
 
+The CRC16 X25 checksum is calculated using a slicing-by-8 table engine that
+processes eight bytes per loop iteration. The tables are derived from the
+classic byte-wise table :data:`CRC16_X25_TABLE` at import time.
+
+The :class:`Crc16X25` object can optionally keep the register value at every
+multiple of 8 bytes. Together with the zero-shift tables this allows to get
+the checksum of any range of the fed data without processing the range again.
+
 Copyright:
     2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
 
@@ -11,6 +19,11 @@ Copyright:
     that is included as part of this package.
 """
 
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+from typing import List, Optional, Tuple
+
 # -----------------------------------------------------------------------------
 # Constants
 # -----------------------------------------------------------------------------
@@ -274,6 +287,220 @@ CRC16_X25_TABLE = [
 ]
 
 
+def _get_slicing_tables(num_tables: int) -> List[List[int]]:
+    """Derive the slicing-by-N tables from the byte-wise table.
+
+    Table ``k`` contains the CRC register contribution of a byte that is
+    followed by ``k`` further bytes.
+
+    Args:
+        num_tables (int): The number of tables to create.
+
+    Return:
+        Returns a list of ``num_tables`` tables of 256 entries each.
+    """
+    tables = [CRC16_X25_TABLE]
+    for _ in range(1, num_tables):
+        prev = tables[-1]
+        tables.append([(prev[idx] >> 8) ^ CRC16_X25_TABLE[prev[idx] & 0xFF] for idx in range(256)])
+    return tables
+
+
+def _get_zero_shift_tables(num_levels: int) -> List[Tuple[List[int], List[int]]]:
+    """Derive the tables to shift the CRC register through a run of zero bytes.
+
+    Shifting the register through zero bytes is a linear operation. Level ``j``
+    describes the shift through ``2**j`` zero bytes as the XOR of the results
+    for the low byte (first table) and the high byte (second table).
+
+    Args:
+        num_levels (int): The number of levels to create.
+
+    Return:
+        Returns a list of ``num_levels`` table pairs of 256 entries each.
+    """
+
+    def shift_one(register: int) -> int:
+        return CRC16_X25_TABLE[register & 0xFF] ^ (register >> 8)
+
+    levels = [([shift_one(idx) for idx in range(256)], [shift_one(idx << 8) for idx in range(256)])]
+    for _ in range(1, num_levels):
+        low, high = levels[-1]
+
+        def shift_twice(register: int, low=low, high=high) -> int:
+            register = low[register & 0xFF] ^ high[register >> 8]
+            return low[register & 0xFF] ^ high[register >> 8]
+
+        levels.append(([shift_twice(idx) for idx in range(256)], [shift_twice(idx << 8) for idx in range(256)]))
+    return levels
+
+
+CRC16_X25_SLICING_TABLES = _get_slicing_tables(8)
+
+# Buffers shorter than this number of bytes are processed faster by the
+# byte-wise loop than by setting up the slicing-by-8 engine.
+SLICING_MIN_SIZE = 48
+CRC16_X25_ZERO_SHIFT_TABLES = _get_zero_shift_tables(24)
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _shift_zeros(register: int, num_bytes: int) -> int:
+    """Shift the CRC register through the given number of zero bytes.
+
+    Args:
+        register (int):  The CRC register value.
+        num_bytes (int): The number of zero bytes (less than 2**24).
+
+    Return:
+        Returns the new CRC register value.
+    """
+    for low, high in CRC16_X25_ZERO_SHIFT_TABLES:
+        if not num_bytes:
+            break
+        if num_bytes & 1:
+            register = low[register & 0xFF] ^ high[register >> 8]
+        num_bytes >>= 1
+    return register
+
+
+def _update_bytewise(register: int, buffer: bytes) -> int:
+    """Update the CRC register with the given bytes using the byte-wise table.
+
+    Args:
+        register (int): The CRC register value.
+        buffer (bytes): Byte-buffer.
+
+    Return:
+        Returns the new CRC register value.
+    """
+    for byte in buffer:
+        register = CRC16_X25_TABLE[(byte ^ register) & 0xFF] ^ (register >> 8)
+    return register
+
+
+def _finalize(register: int) -> int:
+    """Get the final (byte swapped) checksum from the CRC register value."""
+    register ^= 0xFFFF
+    return ((register & 0xFF00) >> 8) | ((register & 0x00FF) << 8)
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class Crc16X25:
+    """Incremental CRC16 X25 calculation.
+
+    The data can be fed in arbitrary chunks using :meth:`update`. The checksum
+    of all data fed so far is returned by :meth:`digest` in the same byte
+    swapped form as returned by :func:`crc16_x25`.
+
+    If checkpoints are enabled, the register value is recorded at every
+    multiple of 8 bytes, so that :meth:`range_digest` can determine the
+    checksum of a part of the data without processing that part again.
+    """
+
+    def __init__(self, buffer: bytes = b"", checkpoints: bool = False) -> None:
+        """Construct a new Crc16X25 object.
+
+        Args:
+            buffer (bytes):     Optional initial data.
+            checkpoints (bool): If set to True, record the register value at
+                                every multiple of 8 bytes.
+        """
+        self.register = 0xFFFF
+        self.length = 0
+        self.checkpoints: Optional[List[int]] = [0xFFFF] if checkpoints else None
+        if buffer:
+            self.update(buffer)
+
+    def update(self, buffer: bytes) -> None:
+        """Add the given data to the checksum.
+
+        Args:
+            buffer (bytes): Byte-buffer (or any object supporting the buffer protocol).
+        """
+        # pylint: disable=invalid-name,too-many-locals
+        t0, t1, t2, t3, t4, t5, t6, t7 = CRC16_X25_SLICING_TABLES
+        buffer = memoryview(buffer).cast("B")
+        num_bytes = len(buffer)
+        checkpoints = self.checkpoints
+        # With checkpoints, the 8 byte blocks must be aligned to the start of the data
+        bulk_start = min(-self.length % 8, num_bytes) if checkpoints is not None else 0
+        bulk_end = num_bytes - ((num_bytes - bulk_start) % 8)
+
+        crcsum = _update_bytewise(self.register, buffer[:bulk_start])
+        it = iter(buffer[bulk_start:bulk_end])
+        if checkpoints is None:
+            for b0, b1, b2, b3, b4, b5, b6, b7 in zip(it, it, it, it, it, it, it, it):
+                crcsum = (
+                    t7[b0 ^ (crcsum & 0xFF)]
+                    ^ t6[b1 ^ (crcsum >> 8)]
+                    ^ t5[b2]
+                    ^ t4[b3]
+                    ^ t3[b4]
+                    ^ t2[b5]
+                    ^ t1[b6]
+                    ^ t0[b7]
+                )
+        else:
+            if bulk_start and (self.length + bulk_start) % 8 == 0:
+                checkpoints.append(crcsum)
+            for b0, b1, b2, b3, b4, b5, b6, b7 in zip(it, it, it, it, it, it, it, it):
+                crcsum = (
+                    t7[b0 ^ (crcsum & 0xFF)]
+                    ^ t6[b1 ^ (crcsum >> 8)]
+                    ^ t5[b2]
+                    ^ t4[b3]
+                    ^ t3[b4]
+                    ^ t2[b5]
+                    ^ t1[b6]
+                    ^ t0[b7]
+                )
+                checkpoints.append(crcsum)
+        self.register = _update_bytewise(crcsum, buffer[bulk_end:])
+        self.length += num_bytes
+
+    def digest(self) -> int:
+        """Get the checksum of all data added so far.
+
+        Return:
+            Returns the CRC16 X25 checksum (byte swapped).
+        """
+        return _finalize(self.register)
+
+    def range_digest(self, buffer: bytes, start: int, end: int) -> int:
+        """Get the checksum of a part of the data added so far.
+
+        Only the up to 14 bytes at the borders of the range are processed
+        again, the rest is derived from the recorded checkpoints. Without
+        checkpoints, the whole range is processed.
+
+        Args:
+            buffer (bytes): The data added so far (or at least the first ``end`` bytes of it).
+            start (int):    Start index of the range.
+            end (int):      End index of the range (exclusive).
+
+        Return:
+            Returns the CRC16 X25 checksum (byte swapped) of ``buffer[start:end]``.
+        """
+        checkpoints = self.checkpoints
+        first_checkpoint = -(-start // 8)
+        last_checkpoint = end // 8
+        if checkpoints is None or end > self.length or last_checkpoint - first_checkpoint < 2:
+            return crc16_x25(buffer[start:end])
+
+        first_offset = first_checkpoint * 8
+        last_offset = last_checkpoint * 8
+        register = _update_bytewise(0xFFFF, buffer[start:first_offset])
+        register = checkpoints[last_checkpoint] ^ _shift_zeros(
+            register ^ checkpoints[first_checkpoint], last_offset - first_offset
+        )
+        register = _update_bytewise(register, buffer[last_offset:end])
+        return _finalize(register)
+
+
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
@@ -286,9 +513,6 @@ def crc16_x25(buffer: bytes) -> int:
     Return:
         Returns the CRC16 X25 checksum (byte swapped).
     """
-    crcsum = 0xFFFF
-    for byte in buffer:
-        crcsum = CRC16_X25_TABLE[(byte ^ crcsum) & 0xFF] ^ (crcsum >> 8 & 0xFF)
-    crcsum ^= 0xFFFF
-    crcsum = ((crcsum & 0xFF00) >> 8) | ((crcsum & 0x00FF) << 8)
-    return crcsum
+    if len(buffer) < SLICING_MIN_SIZE:
+        return _finalize(_update_bytewise(0xFFFF, buffer))
+    return Crc16X25(buffer).digest()
@@ -0,0 +1,240 @@
+"""
+Module providing the derivation of the power from the energy counters of the powercounter application.
+
+Some meters only report the energy counters, e.g., 1-0:1.8.0*255 and
+1-0:2.8.0*255, but not the current power. The PowerDeriver keeps the last
+change of each counter and adds the average power between the changes of the
+counter as readings of the corresponding power OBIS ID, e.g., 1-0:1.7.0*255,
+so they are processed like the readings sent by the meter.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import argparse
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .obis import get_obis_id, parse_obis_id
+from .sml_message_processor import ReadingBatchCallbackType, SmlReading, SmlReadingBatch
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Default minimum interval in seconds to average the power over
+DEFAULT_POWER_INTERVAL = 60.0
+
+# Value group D of the OBIS IDs of energy counters and of the power
+OBIS_D_ENERGY = 8
+OBIS_D_POWER = 7
+
+SECONDS_PER_HOUR = 3600.0
+
+
+# -----------------------------------------------------------------------------
+# Class Definitions
+# -----------------------------------------------------------------------------
+class DerivedPowerRule(NamedTuple):
+    """Rule to derive the power from an energy counter specified by the --derive-power option."""
+
+    obis_code: bytes
+    power_code: bytes
+    interval: float = DEFAULT_POWER_INTERVAL
+    wrap: Optional[float] = None
+
+
+# pylint: disable=too-few-public-methods
+class _CounterState:
+    """Reference point, last change and last derived power of an energy counter."""
+
+    __slots__ = ("ref_time", "ref_value", "change_time", "output_time", "value")
+
+    def __init__(self, value: float) -> None:
+        """Construct a new _CounterState object without a reference point.
+
+        Args:
+            value (float): The first value of the counter.
+        """
+        self.ref_time: Optional[float] = None
+        self.ref_value = value
+        self.change_time = 0.0
+        self.output_time = 0.0
+        self.value = value
+
+
+class PowerDeriver:
+    """Add the average power derived from the energy counters to the readings.
+
+    The counters change only in steps of their resolution, so the power is
+    averaged between the times the counter changed instead of the arrival
+    times of the SML files. The first change of a counter sets the reference
+    point. Once per interval, the energy between the reference point and the
+    last change divided by the time between them is added as reading of the
+    power OBIS ID, and the last change becomes the new reference point. If the
+    counter did not change since the reference point, a power of 0 is added
+    and the reference point is kept, so no energy is lost.
+
+    A counter decreasing by at least half of the wrap value is considered to
+    wrap around. Without a wrap value or for smaller decreases, e.g., a reset
+    of the counter, the reference point is set again.
+    """
+
+    def __init__(self, reading_batch_cb: ReadingBatchCallbackType, rules: Iterable[DerivedPowerRule]) -> None:
+        """Construct a new PowerDeriver object.
+
+        Args:
+            reading_batch_cb: Callback function taking a SmlReadingBatch object.
+            rules (list):     List of DerivedPowerRule objects.
+        """
+        self.rules: Dict[bytes, DerivedPowerRule] = {rule.obis_code: rule for rule in rules}
+        self._reading_batch_cb = reading_batch_cb
+        # Counter states by meter label and raw object name
+        self._counters: Dict[Tuple[str, bytes], _CounterState] = {}
+
+    def __call__(self, batch: SmlReadingBatch) -> None:
+        """Add the derived power readings to an SML file and pass it to the callback.
+
+        Args:
+            batch (obj): The SmlReadingBatch object.
+        """
+        derived: List[SmlReading] = []
+        for reading in batch.readings:
+            rule = self.rules.get(reading.obis_code)
+            if rule is not None:
+                power = self._update(rule, batch.label, reading.value, batch.monotonic)
+                if power is not None:
+                    power_unit = reading.unit[:-1] if reading.unit.endswith("h") else f"{reading.unit}/h"
+                    derived.append(SmlReading(rule.power_code, get_obis_id(rule.power_code), power, power_unit))
+        self._reading_batch_cb(batch._replace(readings=batch.readings + tuple(derived)) if derived else batch)
+
+    def _update(self, rule: DerivedPowerRule, label: str, value: float, now: float) -> Optional[float]:
+        """Update the state of a counter and get the derived power if the interval passed.
+
+        Args:
+            rule (obj):    The DerivedPowerRule object of the counter.
+            label (str):   The label of the meter.
+            value (float): The value of the counter.
+            now (float):   The monotonic arrival time of the SML file.
+
+        Return:
+            Returns the average power or None if the interval did not pass.
+        """
+        state = self._counters.get((label, rule.obis_code))
+        if state is None:
+            self._counters[(label, rule.obis_code)] = _CounterState(value)
+            return None
+
+        if value != state.value:
+            delta = value - state.value
+            if delta < 0.0 and rule.wrap is not None and -delta >= rule.wrap / 2.0:
+                delta += rule.wrap
+            if delta < 0.0:
+                LOGGER.warning(
+                    "Energy counter %s decreased from %f to %f. Restarting the power derivation.",
+                    get_obis_id(rule.obis_code),
+                    state.value,
+                    value,
+                )
+                state.ref_time = None
+            state.value = value
+            state.change_time = now
+            if state.ref_time is None:
+                state.ref_time = state.output_time = now
+                state.ref_value = value
+                return None
+
+        if state.ref_time is None or now - state.output_time < rule.interval:
+            return None
+        state.output_time = now
+        if state.change_time <= state.ref_time:
+            return 0.0
+        energy = state.value - state.ref_value
+        if energy < 0.0 and rule.wrap is not None:
+            energy += rule.wrap
+        power = energy * SECONDS_PER_HOUR / (state.change_time - state.ref_time)
+        state.ref_time = state.change_time
+        state.ref_value = state.value
+        return power
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def parse_derived_power_rule(spec: str) -> DerivedPowerRule:
+    """Parse a rule of the --derive-power option.
+
+    The rule has the format OBIS_ID[,power=OBIS_ID][,interval=SECONDS][,wrap=VALUE].
+    The power OBIS ID defaults to the OBIS ID of the energy counter with the
+    value group D set to 7, e.g., 1-0:1.7.0*255 for 1-0:1.8.0*255.
+
+    Args:
+        spec (str) - The rule, e.g., "1-0:1.8.0*255,interval=30,wrap=100000000".
+
+    Return:
+        Returns the DerivedPowerRule object.
+
+    Raises:
+        argparse.ArgumentTypeError if the rule is invalid.
+    """
+    obis_id, *options = spec.split(",")
+    obis_code = parse_obis_id(obis_id)
+    if obis_code is None:
+        raise argparse.ArgumentTypeError(f"{obis_id} in power derivation {spec} is not a valid OBIS ID!")
+    values = {"power": "", "interval": str(DEFAULT_POWER_INTERVAL), "wrap": ""}
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator or key not in values:
+            raise argparse.ArgumentTypeError(
+                f"Invalid option {option} in power derivation {spec}! "
+                "Please use power=OBIS_ID, interval=SECONDS or wrap=VALUE."
+            )
+        values[key] = value
+
+    if values["power"]:
+        power_code = parse_obis_id(values["power"])
+        if power_code is None:
+            raise argparse.ArgumentTypeError(f"{values['power']} in power derivation {spec} is not a valid OBIS ID!")
+    elif obis_code[3] == OBIS_D_ENERGY:
+        power_code = obis_code[:3] + bytes([OBIS_D_POWER]) + obis_code[4:]
+        get_obis_id(power_code)
+    else:
+        raise argparse.ArgumentTypeError(f"Please specify the power OBIS ID of {obis_id} in power derivation {spec}!")
+    try:
+        interval = float(values["interval"])
+        wrap = float(values["wrap"]) if values["wrap"] else None
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"Invalid value in power derivation {spec}: {exception}") from exception
+    if interval <= 0.0 or (wrap is not None and wrap <= 0.0):
+        raise argparse.ArgumentTypeError(f"Invalid interval or wrap value in power derivation {spec}!")
+    return DerivedPowerRule(obis_code, power_code, interval, wrap)
+
+
+def get_power_deriver(args: Any, reading_batch_cb: ReadingBatchCallbackType) -> Optional[PowerDeriver]:
+    """Get the PowerDeriver object specified by the --derive-power options.
+
+    Args:
+        args (obj):       The command line arguments.
+        reading_batch_cb: Callback function taking a SmlReadingBatch object.
+
+    Return:
+        Returns the PowerDeriver object passing the extended batches to the callback
+        or None if no power is derived.
+    """
+    if not args.derive_power:
+        return None
+    return PowerDeriver(reading_batch_cb, args.derive_power)
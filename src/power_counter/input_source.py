@@ -0,0 +1,641 @@
+"""
+Module providing the input sources of the SML data stream.
+
+An input source is specified by an URL like string:
+
+  - ``serial:///dev/ttyUSB0`` for a serial port,
+  - ``tcp://host:port`` for a TCP connection, e.g., to a ser2net server,
+  - ``file://capture.dat`` for a previously captured file and
+  - ``-`` for the standard input.
+
+Network sources use non-blocking sockets and reconnect automatically, also if
+no data is received for some time. All sources can be read blocking using
+read() or multiplexed with other sources using the selectors module based on
+wait_events(), get_timeout() and process_events().
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import atexit
+import errno
+import logging
+import os
+import selectors
+import socket
+import stat
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, BinaryIO, Callable, List, Optional, Tuple
+
+import serial
+
+from .serial_ifc import FILE_READ_SIZE, SERIAL_READ_HOLD_OFF, DeviceSpec, get_devices, open_serial, read_serial
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+SCHEME_SERIAL = "serial"
+SCHEME_TCP = "tcp"
+SCHEME_FILE = "file"
+STDIN_URL = "-"
+
+# Time in seconds to wait for a TCP connection
+CONNECT_TIMEOUT = 5.0
+
+# Delay in seconds before reconnecting a TCP connection. The delay is doubled
+# after each failed attempt up to the maximum delay.
+DEFAULT_RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+# Time in seconds without received data after which a TCP connection is
+# considered dead. Meters send an SML file every few seconds.
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# Interval in seconds to check for the result of a host name lookup
+RESOLVE_POLL_INTERVAL = 0.05
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class InputSource(ABC):
+    """Base class of all input sources.
+
+    Attributes:
+        url (str):              The URL of the source.
+        finite (bool):          True if the source ends, e.g., a file.
+        finished (bool):        True if the source ended or failed permanently.
+        connection_count (int): Number of connections of the source. The file
+                                descriptor must be registered again if the
+                                count changes.
+    """
+
+    finite = False
+
+    def __init__(self, url: str) -> None:
+        """Construct a new InputSource object.
+
+        Args:
+            url (str): The URL of the source.
+        """
+        self.url = url
+        self.finished = False
+        self.connection_count = 0
+
+    @abstractmethod
+    def open(self) -> bool:
+        """Open the source.
+
+        Return:
+            Returns True on success, otherwise False.
+        """
+
+    def close(self) -> None:
+        """Close the source."""
+        self.finished = True
+
+    @abstractmethod
+    def wait_events(self) -> Tuple[Optional[int], int]:
+        """Get the file descriptor and the selector events to wait for.
+
+        Return:
+            Returns the tuple (fd, events) or (None, 0) if the source does not
+            wait for a file descriptor.
+        """
+
+    def get_timeout(self) -> Optional[float]:
+        """Get the time until process_events() must be called even without an event.
+
+        Return:
+            Returns the time in seconds or None if the source waits only for events.
+        """
+        return None
+
+    @abstractmethod
+    def process_events(self, events: int) -> bytes:
+        """Handle the events of the file descriptor or an expired timeout without blocking.
+
+        Args:
+            events (int): The selector events of the file descriptor or 0 on a timeout.
+
+        Return:
+            Returns the received data, which might be empty.
+        """
+
+    def read(self) -> bytes:
+        """Block until data is received.
+
+        Return:
+            Returns the received data or an empty bytes object if the source is
+            finished.
+        """
+        with selectors.DefaultSelector() as selector:
+            registration: Optional[Tuple[int, int, int]] = None
+            while not self.finished:
+                fd, events = self.wait_events()
+                new_registration = (fd, events, self.connection_count) if fd is not None and events else None
+                if new_registration != registration:
+                    if registration is not None:
+                        selector.unregister(registration[0])
+                    if new_registration is not None:
+                        selector.register(fd, events)  # type: ignore
+                    registration = new_registration
+
+                timeout = self.get_timeout()
+                ready_events = 0
+                if registration is not None:
+                    for _, ready_events in selector.select(timeout):
+                        pass
+                elif timeout:
+                    time.sleep(timeout)
+                data = self.process_events(ready_events)
+                if data:
+                    return data
+        return b""
+
+
+class SerialSource(InputSource):
+    """Serial port input source.
+
+    The bytes following a received byte are collected by the driver for the
+    hold-off time and then read at once, both by a blocking read and when
+    multiplexed, instead of handling each byte on its own.
+    """
+
+    def __init__(self, url: str, port: str) -> None:
+        """Construct a new SerialSource object.
+
+        Args:
+            url (str):  The URL of the source.
+            port (str): The serial port device.
+        """
+        super().__init__(url)
+        self.port = port
+        self.handle: Optional[serial.Serial] = None
+        self._hold_off_end: Optional[float] = None
+
+    def open(self) -> bool:
+        """Open the serial port.
+
+        Return:
+            Returns True on success, otherwise False.
+        """
+        self.handle = open_serial(self.port, close_on_exit=False)
+        if self.handle is None:
+            return False
+        self.connection_count += 1
+        return True
+
+    def close(self) -> None:
+        """Close the serial port."""
+        super().close()
+        if self.handle is not None:
+            self.handle.close()
+
+    def wait_events(self) -> Tuple[Optional[int], int]:
+        """Get the file descriptor of the serial port and the read event unless the hold-off time is running."""
+        if self.handle is None or self.finished or self._hold_off_end is not None:
+            return (None, 0)
+        return (self.handle.fileno(), selectors.EVENT_READ)
+
+    def get_timeout(self) -> Optional[float]:
+        """Get the time until the end of the hold-off time."""
+        if self._hold_off_end is None or self.finished:
+            return None
+        return max(0.0, self._hold_off_end - time.monotonic())
+
+    def process_events(self, events: int) -> bytes:
+        """Start the hold-off time on a read event and read all waiting bytes at its end."""
+        if events & selectors.EVENT_READ:
+            self._hold_off_end = time.monotonic() + SERIAL_READ_HOLD_OFF
+            return b""
+        if self._hold_off_end is None or time.monotonic() < self._hold_off_end:
+            return b""
+        self._hold_off_end = None
+        # After a read event, at least one byte or an error is pending
+        return self._read(lambda handle: handle.read(max(1, min(handle.in_waiting, FILE_READ_SIZE))))
+
+    def read(self) -> bytes:
+        """Block until at least one byte is received and return it together with the following bytes."""
+        return self._read(read_serial)
+
+    def _read(self, read_function: Callable[[serial.SerialBase], bytes]) -> bytes:
+        """Read from the serial port and close it on errors.
+
+        Args:
+            read_function: Function taking the serial port object and returning the read bytes.
+
+        Return:
+            Returns the read bytes.
+        """
+        if self.handle is None or self.finished:
+            return b""
+        try:
+            return read_function(self.handle)
+        except (serial.SerialException, OSError) as exception:
+            LOGGER.error("Reading serial device %s failed: %s", self.port, exception)
+            self.close()
+            return b""
+
+
+class FileSource(InputSource):
+    """File input source."""
+
+    finite = True
+
+    def __init__(self, url: str, path: str) -> None:
+        """Construct a new FileSource object.
+
+        Args:
+            url (str):  The URL of the source.
+            path (str): The path of the file.
+        """
+        super().__init__(url)
+        self.path = path
+        self.file: Optional[BinaryIO] = None
+
+    def open(self) -> bool:
+        """Open the file.
+
+        Return:
+            Returns True on success, otherwise False.
+        """
+        try:
+            LOGGER.debug("Opening specified input file %s.", self.path)
+            # pylint: disable=consider-using-with
+            self.file = open(self.path, "rb")
+        except OSError:
+            LOGGER.critical("Can't open input file %s!", self.path)
+            return False
+        self.connection_count += 1
+        return True
+
+    def close(self) -> None:
+        """Close the file."""
+        super().close()
+        if self.file is not None:
+            self.file.close()
+
+    def wait_events(self) -> Tuple[Optional[int], int]:
+        """Regular files are always readable, so no file descriptor is waited for."""
+        return (None, 0)
+
+    def get_timeout(self) -> Optional[float]:
+        """Regular files are read immediately."""
+        return 0.0
+
+    def process_events(self, events: int) -> bytes:
+        """Read the next block of the file."""
+        return self.read()
+
+    def read(self) -> bytes:
+        """Read the next block of the file."""
+        if self.file is None or self.finished:
+            return b""
+        data = self.file.read(FILE_READ_SIZE)
+        if not data:
+            self.finished = True
+        return data
+
+
+class StdinSource(InputSource):
+    """Standard input source, e.g., a pipe or a redirected file."""
+
+    finite = True
+
+    def __init__(self, url: str = STDIN_URL, fd: Optional[int] = None) -> None:
+        """Construct a new StdinSource object.
+
+        Args:
+            url (str): The URL of the source.
+            fd (int):  The file descriptor to read from or None to use the
+                       file descriptor of sys.stdin.
+        """
+        super().__init__(url)
+        self.fd = -1 if fd is None else fd
+        self.regular_file = False
+
+    def open(self) -> bool:
+        """Get the file descriptor of the standard input.
+
+        Return:
+            Returns True on success, otherwise False.
+        """
+        try:
+            if self.fd < 0:
+                self.fd = sys.stdin.buffer.fileno()
+            self.regular_file = stat.S_ISREG(os.fstat(self.fd).st_mode)
+        except (AttributeError, OSError, ValueError):
+            LOGGER.critical("Can't read from the standard input!")
+            return False
+        self.connection_count += 1
+        return True
+
+    def wait_events(self) -> Tuple[Optional[int], int]:
+        """Get the file descriptor of the standard input and the read event."""
+        if self.regular_file or self.finished:
+            return (None, 0)
+        return (self.fd, selectors.EVENT_READ)
+
+    def get_timeout(self) -> Optional[float]:
+        """A redirected regular file is read immediately."""
+        return 0.0 if self.regular_file else None
+
+    def process_events(self, events: int) -> bytes:
+        """Read the available data of the standard input."""
+        return self.read()
+
+    def read(self) -> bytes:
+        """Block until data is available and return it."""
+        if self.finished:
+            return b""
+        data = os.read(self.fd, FILE_READ_SIZE)
+        if not data:
+            self.finished = True
+        return data
+
+
+class TcpSource(InputSource):
+    """TCP client input source reconnecting automatically, e.g., to a ser2net server.
+
+    The host name is resolved in a separate thread before each connection
+    attempt, so a slow name lookup does not block the event loop. A connection
+    without any received data for the idle timeout is considered dead and
+    reconnected. TCP keepalive is enabled in addition.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(
+        self,
+        url: str,
+        host: str,
+        port: int,
+        reconnect_delay: float = DEFAULT_RECONNECT_DELAY,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        """Construct a new TcpSource object.
+
+        Args:
+            url (str):               The URL of the source.
+            host (str):              The host name or address of the server.
+            port (int):              The TCP port of the server.
+            reconnect_delay (float): The initial delay before reconnecting in seconds.
+            connect_timeout (float): The time to wait for a connection in seconds.
+            idle_timeout (float):    The time without received data in seconds after
+                                     which the connection is reconnected.
+        """
+        super().__init__(url)
+        self.host = host
+        self.port = port
+        self.reconnect_delay = reconnect_delay
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self._socket: Optional[socket.socket] = None
+        self._resolving: Optional["Future[Tuple[Any, ...]]"] = None
+        self._connected = False
+        self._deadline = 0.0
+        self._current_delay = reconnect_delay
+
+    def open(self) -> bool:
+        """Start connecting to the server. Failed connections are retried automatically.
+
+        Return:
+            Returns always True.
+        """
+        self._resolve()
+        return True
+
+    def close(self) -> None:
+        """Close the connection."""
+        super().close()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def wait_events(self) -> Tuple[Optional[int], int]:
+        """Get the file descriptor of the socket and the write event while connecting or the read event."""
+        if self._socket is None:
+            return (None, 0)
+        return (self._socket.fileno(), selectors.EVENT_READ if self._connected else selectors.EVENT_WRITE)
+
+    def get_timeout(self) -> Optional[float]:
+        """Get the time until the next connection attempt, the end of the current attempt or the idle timeout."""
+        if self.finished:
+            return None
+        if self._resolving is not None:
+            return 0.0 if self._resolving.done() else RESOLVE_POLL_INTERVAL
+        return max(0.0, self._deadline - time.monotonic())
+
+    def process_events(self, events: int) -> bytes:
+        """Connect to the server or receive the available data."""
+        if self.finished:
+            return b""
+        if self._resolving is not None:
+            if self._resolving.done():
+                self._connect()
+            return b""
+        if self._socket is None:
+            if time.monotonic() >= self._deadline:
+                self._resolve()
+            return b""
+        if not self._connected:
+            if events & selectors.EVENT_WRITE:
+                error = self._socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    self._disconnect(os.strerror(error))
+                else:
+                    self._set_connected()
+            elif time.monotonic() >= self._deadline:
+                self._disconnect("Timeout")
+            return b""
+
+        if not events & selectors.EVENT_READ:
+            if time.monotonic() >= self._deadline:
+                self._disconnect(f"No data received for {self.idle_timeout:.1f} seconds")
+            return b""
+        try:
+            data = self._socket.recv(FILE_READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return b""
+        except OSError as exception:
+            self._disconnect(str(exception))
+            return b""
+        if not data:
+            self._disconnect("Connection closed by the server")
+        else:
+            self._deadline = time.monotonic() + self.idle_timeout
+        return data
+
+    def _resolve(self) -> None:
+        """Start resolving the address of the server in a separate thread."""
+        future: "Future[Tuple[Any, ...]]" = Future()
+
+        def resolve() -> None:
+            try:
+                future.set_result(socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)[0])
+            except OSError as exception:
+                future.set_exception(exception)
+
+        self._resolving = future
+        threading.Thread(target=resolve, name=f"resolve-{self.host}", daemon=True).start()
+
+    def _connect(self) -> None:
+        """Start a non-blocking connection attempt to the resolved address."""
+        future, self._resolving = self._resolving, None
+        try:
+            family, sock_type, proto, _, address = future.result()  # type: ignore
+            self._socket = socket.socket(family, sock_type, proto)
+        except OSError as exception:
+            self._schedule_reconnect(str(exception))
+            return
+        self._socket.setblocking(False)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.connection_count += 1
+        self._deadline = time.monotonic() + self.connect_timeout
+        error = self._socket.connect_ex(address)
+        if error == 0:
+            self._set_connected()
+        elif error not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            self._disconnect(os.strerror(error))
+
+    def _set_connected(self) -> None:
+        """Mark the connection as established."""
+        LOGGER.info("Connected to %s.", self.url)
+        self._connected = True
+        self._deadline = time.monotonic() + self.idle_timeout
+        self._current_delay = self.reconnect_delay
+
+    def _disconnect(self, reason: str) -> None:
+        """Close the socket and schedule a new connection attempt.
+
+        Args:
+            reason (str): The reason of closing the connection.
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self._schedule_reconnect(reason)
+
+    def _schedule_reconnect(self, reason: str) -> None:
+        """Schedule a new connection attempt.
+
+        Args:
+            reason (str): The reason of the failed connection.
+        """
+        LOGGER.warning(
+            "Connection to %s failed: %s. Reconnecting in %.1f seconds.", self.url, reason, self._current_delay
+        )
+        self._connected = False
+        self._deadline = time.monotonic() + self._current_delay
+        self._current_delay = min(2.0 * self._current_delay, MAX_RECONNECT_DELAY)
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def open_source(url: str, default_scheme: str = SCHEME_SERIAL, close_on_exit: bool = True) -> Optional[InputSource]:
+    """Open an input source specified by an URL.
+
+    Args:
+        url (str):            The URL of the source, e.g., serial:///dev/ttyUSB0,
+                              tcp://host:port, file://capture.dat or - for the
+                              standard input.
+        default_scheme (str): The scheme used if the URL has no scheme.
+        close_on_exit (bool): If set to True, the source is closed automatically on exit.
+
+    Return:
+        Returns the opened InputSource object or None if the URL is invalid or
+        the source could not be opened.
+    """
+    source: InputSource
+    if url == STDIN_URL:
+        source = StdinSource()
+    else:
+        scheme, separator, location = url.partition("://")
+        if not separator:
+            scheme, location = default_scheme, url
+        if scheme == SCHEME_SERIAL:
+            source = SerialSource(url, location)
+        elif scheme == SCHEME_FILE:
+            source = FileSource(url, location)
+        elif scheme == SCHEME_TCP:
+            host, _, port = location.rpartition(":")
+            if not host or not port.isdigit():
+                LOGGER.critical("Invalid TCP source %s! Please use tcp://host:port.", url)
+                return None
+            source = TcpSource(url, host.strip("[]"), int(port))
+        else:
+            LOGGER.critical("Unknown scheme of the input source %s!", url)
+            return None
+
+    if not source.open():
+        return None
+    if close_on_exit:
+        LOGGER.debug("Registering at exit handler to close the input source in the end.")
+        atexit.register(source.close)
+    return source
+
+
+def get_input_source(args: Any, close_on_exit: bool = True) -> Optional[InputSource]:
+    """Get the input file or the first device specified by the command line arguments.
+
+    Args:
+        args (obj)           - The arguments object.
+        close_on_exit (bool) - If set to True, the source is closed automatically on exit.
+
+    Return:
+        Returns the opened InputSource object or None if it could not be opened.
+    """
+    if args.input_file:
+        return open_source(args.input_file, SCHEME_FILE, close_on_exit)
+    devices = get_devices(args)
+    if not devices:
+        return None
+    if len(devices) > 1:
+        LOGGER.warning("Using only the first device %s.", devices[0].port)
+    return open_source(devices[0].port, SCHEME_SERIAL, close_on_exit)
+
+
+def get_device_sources(args: Any, close_on_exit: bool = True) -> Optional[List[Tuple[DeviceSpec, InputSource]]]:
+    """Get the input sources of all devices specified by the --device options.
+
+    Args:
+        args (obj)           - The arguments object.
+        close_on_exit (bool) - If set to True, the sources are closed automatically on exit.
+
+    Return:
+        Returns a list of tuples (device, source) or None if a source could not
+        be opened.
+    """
+    devices = get_devices(args)
+    if not devices:
+        return None
+    sources = []
+    for device in devices:
+        source = open_source(device.port, SCHEME_SERIAL, close_on_exit)
+        if source is None:
+            for _, opened_source in sources:
+                opened_source.close()
+            return None
+        sources.append((device, source))
+    return sources
@@ -14,23 +14,124 @@ Copyright:
 # -----------------------------------------------------------------------------
 # Module Import
 # -----------------------------------------------------------------------------
+import asyncio
+import json
 import logging
+import threading
 import time
-from typing import Any
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple, Union
 
 import paho.mqtt.client as mqtt
 
+from .obis import parse_obis_id
+from .publish_rules import PublishFilter
+from .sml_message_processor import SmlReading, SmlReadingBatch
+
 # -----------------------------------------------------------------------------
 # Logger
 # -----------------------------------------------------------------------------
 LOGGER = logging.getLogger()
 
 
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Time in seconds to wait for the confirmation of an asynchronous publish
+DEFAULT_PUBLISH_TIMEOUT = 10.0
+
+# Time in seconds to wait for the broker accepting the connection on startup
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+# Maximum number of messages kept while the client is disconnected
+DEFAULT_OFFLINE_QUEUE_SIZE = 1000
+
+# Minimum and maximum delay in seconds between reconnection attempts. The delay
+# is doubled on each failed attempt.
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+# Payload modes: one message per reading on its own topic or one message per
+# SML file on the meter topic with all readings as JSON object or as compact
+# comma separated key=value pairs.
+PAYLOAD_TOPIC = "topic"
+PAYLOAD_JSON = "json"
+PAYLOAD_COMPACT = "compact"
+PAYLOAD_MODES = (PAYLOAD_TOPIC, PAYLOAD_JSON, PAYLOAD_COMPACT)
+DEFAULT_METER_TOPIC = "power/meter"
+
+# Key of the timestamp of the SML file in the payloads of the meter topic
+TIMESTAMP_KEY = "time"
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _get_topic(topics: Dict[bytes, str], reading: SmlReading) -> str:
+    """Get the MQTT topic of a reading mapped to a topic.
+
+    The statistics of a window are published on subtopics, e.g., power/rate/mean.
+
+    Args:
+        topics (dict): The MQTT topics by raw object name.
+        reading (obj): The SmlReading object.
+
+    Return:
+        Returns the MQTT topic without the topic prefix of the meter.
+    """
+    topic = topics[reading.obis_code]
+    return f"{topic}/{reading.statistic}" if reading.statistic else topic
+
+
+def _set_future_result(future: "asyncio.Future[bool]", result: bool) -> None:
+    """Set the result of a future unless it is already done, e.g., cancelled by a timeout.
+
+    Args:
+        future (obj):  The asyncio.Future object.
+        result (bool): The result.
+    """
+    if not future.done():
+        future.set_result(result)
+
+
+def encode_batch(batch: SmlReadingBatch, topics: Dict[bytes, str], payload_mode: str) -> Optional[str]:
+    """Encode all readings of an SML file that are mapped to a MQTT topic as a single payload.
+
+    The topics of the readings are used as keys, e.g., in JSON mode
+    {"time": 1600000000.5, "power/total": 1234.5, "power/rate": 300.0} or in
+    compact mode time=1600000000.5,power/total=1234.5,power/rate=300.0.
+
+    Args:
+        batch (obj):        The SmlReadingBatch object.
+        topics (dict):      The MQTT topics by raw object name.
+        payload_mode (str): PAYLOAD_JSON or PAYLOAD_COMPACT.
+
+    Return:
+        Returns the payload or None if no reading is mapped to a topic.
+    """
+    values = {_get_topic(topics, reading): reading.value for reading in batch.readings if reading.obis_code in topics}
+    if not values:
+        return None
+    if payload_mode == PAYLOAD_JSON:
+        return json.dumps({TIMESTAMP_KEY: batch.timestamp, **values}, separators=(",", ":"))
+    return ",".join(f"{key}={value!r}" for key, value in [(TIMESTAMP_KEY, batch.timestamp), *values.items()])
+
+
 # -----------------------------------------------------------------------------
 # Class Definitions
 # -----------------------------------------------------------------------------
 class MqttInterface:
-    """This class represents the MQTT interface to send the current values."""
+    """This class represents the MQTT interface to send the current values.
+
+    The client connects and reconnects in the background. Messages published
+    while the client is disconnected are kept in a bounded queue, dropping the
+    oldest messages if it is full, and are sent as soon as the broker accepts
+    the connection again.
+
+    Depending on the payload mode, the readings of an SML file are published
+    each on its own topic or together as a single message on the meter topic.
+    Readings suppressed by the publishing rules are left out.
+    """
 
     def __init__(self, args: Any) -> None:
         """Construct a new MqttInterface object.
@@ -39,42 +140,286 @@ class MqttInterface:
             args (obj): The arguments object.
         """
         LOGGER.debug("Parsing topic definition string %s.", args.mqtt_topics)
-        self.topics = {}
+        # MQTT topics by raw object name
+        self.topics: Dict[bytes, str] = {}
         for item in args.mqtt_topics.split(","):
             if item.count("=") == 1:
                 obis, topic = item.split("=")
-                self.topics[obis] = topic
+                obis_code = parse_obis_id(obis)
+                if obis_code is None:
+                    LOGGER.error("Ignoring MQTT item %s. %s is not a valid OBIS ID!", item, obis)
+                    continue
+                self.topics[obis_code] = topic
                 LOGGER.debug("Found OBIS ID %s mapped to MQTT topic %s.", obis, topic)
             else:
                 LOGGER.error("Ignoring MQTT item %s. Please use <OBIS ID>=<MQTT Topic> items!", item)
+        self.payload_mode = args.mqtt_payload
+        self.meter_topic = args.mqtt_meter_topic
+        self.publish_filter = PublishFilter(args.mqtt_rule or [])
+
+        # Futures of the asynchronous publish calls by message ID
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, "asyncio.Future[bool]"]] = {}
+        self._publish_lock = threading.RLock()
+        self._publishing_thread: Optional[int] = None
+        self._early_mids: Set[int] = set()
+
+        # Messages (topic, payload) published while disconnected
+        self.connected = threading.Event()
+        self.dropped = 0
+        self._offline_queue: Deque[Tuple[str, Union[str, float]]] = deque(maxlen=args.mqtt_queue_size)
 
         LOGGER.debug("Create MQTT client and connect to MQTT server %s:%d.", args.mqtt_host, args.mqtt_port)
         self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, client_id="powercounter")
         self.client.username_pw_set(args.mqtt_username, args.mqtt_password)
+        self.client.reconnect_delay_set(MIN_RECONNECT_DELAY, MAX_RECONNECT_DELAY)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
         self.client.connect_async(args.mqtt_host, args.mqtt_port)
         self.client.loop_start()
 
-        # To allow the client to connect to the broker
-        LOGGER.debug("Waiting 1 second to give the client time to connect to the broker.")
-        time.sleep(1)
+        if not self.connected.wait(args.mqtt_connect_timeout):
+            LOGGER.warning(
+                "MQTT server %s:%d did not accept the connection within %.1f seconds. Keeping the messages until "
+                "the connection is established.",
+                args.mqtt_host,
+                args.mqtt_port,
+                args.mqtt_connect_timeout,
+            )
 
     def close(self) -> None:
         """Close the connection."""
         LOGGER.debug("Close MQTT client.")
-        self.client.loop_stop()
         self.client.disconnect()
+        self.client.loop_stop()
+        LOGGER.debug("Suppressed %d readings by the publishing rules.", self.publish_filter.suppressed)
+        if self._offline_queue:
+            LOGGER.warning("Discarding %d messages not sent to the MQTT server.", len(self._offline_queue))
 
-    def publish(self, obis_id: str, value: float) -> None:
+    def publish(self, obis_id: Union[str, bytes], value: float) -> None:
         """Publish a new value.
 
         Args:
-            obis_id (str): The OBIS ID as a string, e.g., "1-0:1.8.0*255".
+            obis_id (str): The raw object name or the OBIS ID as a string, e.g., "1-0:1.8.0*255".
             value (float): Value to publish.
         """
-        if obis_id in self.topics:
-            LOGGER.debug("Publishing OBIS ID %s on topic %s with value %f.", obis_id, self.topics[obis_id], value)
-            ret = self.client.publish(self.topics[obis_id], value)
+        obis_code = parse_obis_id(obis_id) if isinstance(obis_id, str) else obis_id
+        topic = self.topics.get(obis_code) if obis_code is not None else None
+        if topic is not None and self.publish_filter.check(topic, obis_code, value, time.monotonic()):  # type: ignore
+            self._publish(topic, value)
+
+    def publish_batch(self, batch: SmlReadingBatch, topic_prefix: str = "") -> None:
+        """Publish all readings of an SML file that are mapped to a MQTT topic.
+
+        Args:
+            batch (obj):        The SmlReadingBatch object.
+            topic_prefix (str): Prefix of the MQTT topics, e.g., the topic prefix of the meter.
+        """
+        readings = self._select_readings(batch, topic_prefix)
+        if self.payload_mode != PAYLOAD_TOPIC:
+            payload = encode_batch(batch._replace(readings=readings), self.topics, self.payload_mode)
+            if payload is not None:
+                self._publish(topic_prefix + self.meter_topic, payload)
+            return
+        for reading in readings:
+            self._publish(topic_prefix + _get_topic(self.topics, reading), reading.value)
+
+    async def publish_async(
+        self, obis_id: Union[str, bytes], value: float, timeout: float = DEFAULT_PUBLISH_TIMEOUT
+    ) -> bool:
+        """Publish a new value and wait until the message is sent.
+
+        Args:
+            obis_id (str):   The raw object name or the OBIS ID as a string, e.g., "1-0:1.8.0*255".
+            value (float):   Value to publish.
+            timeout (float): The maximum time to wait for sending the message in seconds.
+
+        Return:
+            Returns True if the message was sent, otherwise False.
+        """
+        obis_code = parse_obis_id(obis_id) if isinstance(obis_id, str) else obis_id
+        topic = self.topics.get(obis_code) if obis_code is not None else None
+        if topic is None:
+            return False
+        if not self.publish_filter.check(topic, obis_code, value, time.monotonic()):  # type: ignore
+            return True
+        return await self._publish_async(topic, value, timeout)
+
+    async def publish_batch_async(
+        self, batch: SmlReadingBatch, timeout: float = DEFAULT_PUBLISH_TIMEOUT, topic_prefix: str = ""
+    ) -> bool:
+        """Publish all readings of an SML file that are mapped to a MQTT topic and wait until they are sent.
+
+        Args:
+            batch (obj):        The SmlReadingBatch object.
+            timeout (float):    The maximum time to wait for sending the messages in seconds.
+            topic_prefix (str): Prefix of the MQTT topics, e.g., the topic prefix of the meter.
+
+        Return:
+            Returns True if all messages were sent, otherwise False.
+        """
+        readings = self._select_readings(batch, topic_prefix)
+        if self.payload_mode != PAYLOAD_TOPIC:
+            payload = encode_batch(batch._replace(readings=readings), self.topics, self.payload_mode)
+            return payload is None or await self._publish_async(topic_prefix + self.meter_topic, payload, timeout)
+        results = await asyncio.gather(
+            *(
+                self._publish_async(topic_prefix + _get_topic(self.topics, reading), reading.value, timeout)
+                for reading in readings
+            )
+        )
+        return all(results)
+
+    def _select_readings(self, batch: SmlReadingBatch, topic_prefix: str) -> Tuple[SmlReading, ...]:
+        """Get the readings of an SML file that are mapped to a MQTT topic and pass the publishing rules.
+
+        Args:
+            batch (obj):        The SmlReadingBatch object.
+            topic_prefix (str): Prefix of the MQTT topics, e.g., the topic prefix of the meter.
+
+        Return:
+            Returns the readings to publish.
+        """
+        return tuple(
+            reading
+            for reading in batch.readings
+            if reading.obis_code in self.topics
+            and self.publish_filter.check(
+                topic_prefix + _get_topic(self.topics, reading), reading.obis_code, reading.value, batch.monotonic
+            )
+        )
+
+    def _publish(self, topic: str, payload: Union[str, float]) -> Optional[mqtt.MQTTMessageInfo]:
+        """Publish a payload on a topic or queue it if the client is not connected.
+
+        Args:
+            topic (str):     The MQTT topic.
+            payload (float): The value or encoded readings to publish.
+
+        Return:
+            Returns the MQTTMessageInfo object of the message or None if the value was queued.
+        """
+        # The publish lock is also taken by the on_publish callback of the client
+        with self._publish_lock:
+            # Keep the order of the readings until the queue is flushed
+            if self._offline_queue:
+                self._enqueue(topic, payload)
+                return None
+            LOGGER.debug("Publishing %s on topic %s.", payload, topic)
+            ret = self.client.publish(topic, payload)
             if ret.rc == mqtt.MQTT_ERR_NO_CONN:
-                LOGGER.error("MQTT client is not connected!")
-            elif ret.rc == mqtt.MQTT_ERR_QUEUE_SIZE:
-                LOGGER.error("MQTT client queue size exceeded!")
+                self._enqueue(topic, payload)
+                return None
+        if ret.rc == mqtt.MQTT_ERR_QUEUE_SIZE:
+            LOGGER.error("MQTT client queue size exceeded!")
+        return ret
+
+    def _enqueue(self, topic: str, payload: Union[str, float]) -> None:
+        """Add a message to the queue of messages published while disconnected.
+
+        Args:
+            topic (str):     The MQTT topic.
+            payload (float): The value or encoded readings to publish.
+        """
+        if len(self._offline_queue) == self._offline_queue.maxlen:
+            self.dropped += 1
+            LOGGER.warning(
+                "MQTT client is not connected and the queue is full. Dropping the oldest message "
+                "(%d messages dropped in total).",
+                self.dropped,
+            )
+        else:
+            LOGGER.debug("MQTT client is not connected. Queueing the message on topic %s.", topic)
+        self._offline_queue.append((topic, payload))
+
+    def _flush(self) -> None:
+        """Publish the messages queued while the client was disconnected."""
+        with self._publish_lock:
+            if self._offline_queue:
+                LOGGER.info("Publishing %d messages queued while disconnected.", len(self._offline_queue))
+            while self._offline_queue:
+                topic, payload = self._offline_queue[0]
+                if self.client.publish(topic, payload).rc == mqtt.MQTT_ERR_NO_CONN:
+                    break
+                self._offline_queue.popleft()
+
+    async def _publish_async(self, topic: str, payload: Union[str, float], timeout: float) -> bool:
+        """Publish a value on a topic and wait until the message is sent.
+
+        The message is sent when the client calls the on_publish callback. As
+        the callback can be called before client.publish() returns, the
+        message IDs published while registering the future are kept.
+
+        Args:
+            topic (str):       The MQTT topic.
+            obis_code (bytes): The raw object name.
+            value (float):     Value to publish.
+            timeout (float):   The maximum time to wait in seconds.
+
+        Return:
+            Returns True if the message was sent, otherwise False.
+        """
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[bool]" = loop.create_future()
+        with self._publish_lock:
+            self._publishing_thread = threading.get_ident()
+            try:
+                ret = self._publish(topic, payload)
+            finally:
+                self._publishing_thread = None
+            if ret is None or ret.rc != mqtt.MQTT_ERR_SUCCESS:
+                self._early_mids.clear()
+                return False
+            if ret.mid in self._early_mids:
+                self._early_mids.clear()
+                return True
+            self._pending[ret.mid] = (loop, future)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            LOGGER.error("Publishing on topic %s was not confirmed within %.1f seconds!", topic, timeout)
+            with self._publish_lock:
+                self._pending.pop(ret.mid, None)
+            return False
+
+    # pylint: disable=too-many-arguments
+    def _on_connect(self, _client: Any, _userdata: Any, _flags: Any, reason_code: Any, _properties: Any) -> None:
+        """Mark the client as connected and send the queued readings.
+
+        Args:
+            reason_code (obj): The ReasonCode object of the connection attempt.
+        """
+        if reason_code.is_failure:
+            LOGGER.error("MQTT server refused the connection: %s", reason_code)
+            return
+        LOGGER.info("Connected to the MQTT server.")
+        self.connected.set()
+        self._flush()
+
+    # pylint: disable=too-many-arguments
+    def _on_disconnect(self, _client: Any, _userdata: Any, _flags: Any, reason_code: Any, _properties: Any) -> None:
+        """Mark the client as disconnected.
+
+        Args:
+            reason_code (obj): The ReasonCode object of the disconnection.
+        """
+        if self.connected.is_set():
+            LOGGER.warning("Disconnected from the MQTT server: %s", reason_code)
+        self.connected.clear()
+
+    # pylint: disable=too-many-arguments
+    def _on_publish(self, _client: Any, _userdata: Any, mid: int, _reason_code: Any, _properties: Any) -> None:
+        """Resolve the future of an asynchronous publish call.
+
+        Args:
+            mid (int): The message ID of the sent message.
+        """
+        with self._publish_lock:
+            entry = self._pending.pop(mid, None)
+            if entry is None:
+                if self._publishing_thread == threading.get_ident():
+                    self._early_mids.add(mid)
+                return
+        loop, future = entry
+        loop.call_soon_threadsafe(_set_future_result, future, True)
@@ -0,0 +1,185 @@
+"""
+Module providing the processing of several devices in a single thread.
+
+The input sources of all meters, e.g., serial ports or TCP connections, are
+multiplexed using the selectors module (epoll on Linux), so a single process
+can read a dozen meters without a thread per device. Each source has its own
+SmlFileExtractor and caches.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import logging
+import selectors
+import time
+from typing import AbstractSet, Optional, Sequence, Tuple
+
+from .input_source import InputSource
+from .serial_ifc import DeviceSpec
+from .sml_file import SmlTemplateCache
+from .sml_file_extractor import SmlFileExtractor
+from .sml_message_processor import (
+    ReadingBatchCallbackType,
+    SmlFileCache,
+    SmlFileCallbackType,
+    SmlReadingBatch,
+    parse_sml_file,
+)
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+# pylint: disable=too-few-public-methods
+class DeviceState:
+    """The state of processing the data stream of a device."""
+
+    def __init__(self, device: DeviceSpec, source: InputSource) -> None:
+        """Construct a new DeviceState object.
+
+        Args:
+            device (obj): The DeviceSpec object.
+            source (obj): The opened InputSource object of the device.
+        """
+        self.device = device
+        self.source = source
+        self.extractor = SmlFileExtractor()
+        self.template_cache = SmlTemplateCache()
+        self.file_cache = SmlFileCache()
+        self.connection_count = source.connection_count
+        # Tuple (fd, events, connection_count) registered at the selector
+        self.registration: Optional[Tuple[int, int, int]] = None
+
+    def update_registration(self, selector: selectors.BaseSelector) -> None:
+        """Register the file descriptor and the events the source waits for at the selector.
+
+        Args:
+            selector (obj): The selector object.
+        """
+        fd, events = self.source.wait_events()
+        registration = (fd, events, self.source.connection_count) if fd is not None and events else None
+        if registration != self.registration:
+            if self.registration is not None:
+                selector.unregister(self.registration[0])
+            if registration is not None:
+                selector.register(fd, events, self)  # type: ignore
+            self.registration = registration
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+# pylint: disable=too-many-arguments
+def process_device_file(
+    state: DeviceState,
+    file_data: bytes,
+    arrival_time: Tuple[float, float],
+    sml_file_cb: Optional[SmlFileCallbackType] = None,
+    reading_batch_cb: Optional[ReadingBatchCallbackType] = None,
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+) -> None:
+    """Parse an SML file of a device and call the callbacks.
+
+    Exceptions of the parser and the callbacks are logged and only the SML file
+    is skipped, so a single broken file or callback does not stop reading the
+    other devices.
+
+    Args:
+        state (obj):          The DeviceState object of the device.
+        file_data (bytes):    The raw data of the SML file.
+        arrival_time (tuple): The tuple (time.time(), time.monotonic()) of receiving the file.
+        sml_file_cb:          Callback function taking the arguments (file_data, sml_file).
+        reading_batch_cb:     Callback function taking a SmlReadingBatch object.
+        obis_codes (set):     Optional set of raw 6-byte object names of interest.
+    """
+    label = state.device.label
+    try:
+        sml_file, readings = parse_sml_file(file_data, obis_codes, state.template_cache, state.file_cache)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("Parsing an SML file of %s failed!", label)
+        return
+    try:
+        if sml_file_cb:
+            sml_file_cb(file_data, sml_file)
+        if reading_batch_cb:
+            reading_batch_cb(SmlReadingBatch(arrival_time[0], arrival_time[1], readings, label))
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("Processing an SML file of %s failed!", label)
+
+
+def process_devices(
+    sources: Sequence[Tuple[DeviceSpec, InputSource]],
+    sml_file_cb: Optional[SmlFileCallbackType] = None,
+    reading_batch_cb: Optional[ReadingBatchCallbackType] = None,
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+) -> None:
+    """Read from several input sources and process all SML files by calling the callbacks.
+
+    The callbacks are called within the reading thread, so they should return
+    quickly, e.g., by publishing with MqttInterface.publish_batch(). A source
+    that is finished, e.g., because the serial device was removed, is closed
+    and no longer read. Network sources reconnect automatically. The function
+    returns when no source is left.
+
+    Args:
+        sources (list):    List of tuples (device, source) of the DeviceSpec objects
+                           and the opened InputSource objects.
+        sml_file_cb:       Callback function taking the arguments (file_data, sml_file).
+        reading_batch_cb:  Callback function taking a SmlReadingBatch object with all
+                           readings of a file. The label of the batch is the label of
+                           the device.
+        obis_codes (set):  Optional set of raw 6-byte object names of interest. List
+                           entries of other object names are skipped.
+    """
+    states = []
+    for device, source in sources:
+        LOGGER.debug("Starting processing the Sml data stream of %s (%s).", device.label, device.port)
+        states.append(DeviceState(device, source))
+
+    with selectors.DefaultSelector() as selector:
+        while states:
+            timeout = None
+            for state in states:
+                state.update_registration(selector)
+                source_timeout = state.source.get_timeout()
+                if source_timeout is not None and (timeout is None or source_timeout < timeout):
+                    timeout = source_timeout
+
+            ready_events = {key.data: events for key, events in selector.select(timeout)}
+            for state in states:
+                events = ready_events.get(state, 0)
+                if not events:
+                    source_timeout = state.source.get_timeout()
+                    if source_timeout is None or source_timeout > 0.0:
+                        continue
+                data = state.source.process_events(events)
+                if state.source.connection_count != state.connection_count:
+                    # Discard a partial SML file of a previous connection
+                    state.connection_count = state.source.connection_count
+                    state.extractor.reset()
+                if data:
+                    arrival_time = (time.time(), time.monotonic())
+                    for file_data in state.extractor.add_bytes(data):
+                        process_device_file(state, file_data, arrival_time, sml_file_cb, reading_batch_cb, obis_codes)
+
+            for state in [state for state in states if state.source.finished]:
+                LOGGER.debug("Finished processing the Sml data stream of %s.", state.device.label)
+                if state.registration is not None:
+                    selector.unregister(state.registration[0])
+                state.source.close()
+                states.remove(state)
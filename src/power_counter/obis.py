@@ -0,0 +1,229 @@
+"""
+Module providing the registry of OBIS identifiers and DLMS units.
+
+The OBIS ID strings of the raw 6-byte object names are formatted only once
+and interned, so the same string object is returned for every SML file. The
+registry also parses OBIS ID strings into raw object names and converts the
+DLMS unit codes into unit strings.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import logging
+import re
+import sys
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# OBIS ID in the format A-B:C.D.E*F as used by SmlListEntry.obj_name
+OBIS_ID_REGEX = re.compile(r"^(\d+)-(\d+):(\d+)\.(\d+)\.(\d+)\*(\d+)$")
+
+# Maximum number of object names kept in the registry
+MAX_REGISTRY_SIZE = 4096
+
+# DLMS unit codes (IEC 62056-62, enumeration of the unit of a COSEM register)
+UNIT_W = 27
+UNIT_WH = 30
+UNIT_NAMES: Dict[int, str] = {
+    1: "a",
+    2: "mo",
+    3: "wk",
+    4: "d",
+    5: "h",
+    6: "min",
+    7: "s",
+    8: "°",
+    9: "°C",
+    10: "currency",
+    11: "m",
+    12: "m/s",
+    13: "m³",
+    14: "m³",
+    15: "m³/h",
+    16: "m³/h",
+    17: "m³/d",
+    18: "m³/d",
+    19: "l",
+    20: "kg",
+    21: "N",
+    22: "Nm",
+    23: "Pa",
+    24: "bar",
+    25: "J",
+    26: "J/h",
+    27: "W",
+    28: "VA",
+    29: "var",
+    30: "Wh",
+    31: "VAh",
+    32: "varh",
+    33: "A",
+    34: "C",
+    35: "V",
+    36: "V/m",
+    37: "F",
+    38: "Ω",
+    39: "Ωm²/m",
+    40: "Wb",
+    41: "T",
+    42: "A/m",
+    43: "H",
+    44: "Hz",
+    45: "1/(Wh)",
+    46: "1/(varh)",
+    47: "1/(VAh)",
+    48: "V²h",
+    49: "A²h",
+    50: "kg/s",
+    51: "S",
+    52: "K",
+    53: "1/(V²h)",
+    54: "1/(A²h)",
+    55: "1/m³",
+    56: "%",
+    57: "Ah",
+    60: "Wh/m³",
+    61: "J/m³",
+    62: "Mol %",
+    63: "g/m³",
+    64: "Pa s",
+    65: "J/kg",
+    66: "g/cm²",
+    67: "atm",
+    70: "dBm",
+    71: "dBµV",
+    72: "dB",
+    253: "reserved",
+    254: "other",
+    255: "count",
+}
+
+
+# -----------------------------------------------------------------------------
+# Module Variables
+# -----------------------------------------------------------------------------
+# Registry of the OBIS ID strings by raw object name and vice versa
+_NAMES_BY_CODE: Dict[bytes, str] = {}
+_CODES_BY_NAME: Dict[str, bytes] = {}
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _register(obis_code: bytes, obis_id: str) -> str:
+    """Add an object name and its OBIS ID string to the registry.
+
+    Args:
+        obis_code (bytes): The raw object name.
+        obis_id (str):     The OBIS ID string.
+
+    Return:
+        Returns the interned OBIS ID string.
+    """
+    obis_id = sys.intern(obis_id)
+    if len(_NAMES_BY_CODE) < MAX_REGISTRY_SIZE:
+        _NAMES_BY_CODE[obis_code] = obis_id
+        _CODES_BY_NAME[obis_id] = obis_code
+    return obis_id
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def get_obis_id(obis_code: bytes) -> str:
+    """Get the OBIS ID string of a raw object name.
+
+    Args:
+        obis_code (bytes): The raw object name.
+
+    Return:
+        Returns the OBIS ID in the format A-B:C.D.E*F for object names of 6 bytes,
+        otherwise the string representation of the bytes.
+    """
+    obis_id = _NAMES_BY_CODE.get(obis_code)
+    if obis_id is None:
+        if len(obis_code) == 6:
+            a, b, c, d, e, f = obis_code  # pylint: disable=invalid-name
+            obis_id = _register(bytes(obis_code), f"{a}-{b}:{c}.{d}.{e}*{f}")
+        else:
+            obis_id = str(obis_code)
+    return obis_id
+
+
+def parse_obis_id(obis_id: str) -> Optional[bytes]:
+    """Convert an OBIS ID string into the raw 6-byte object name.
+
+    Args:
+        obis_id (str): The OBIS ID in the format A-B:C.D.E*F, e.g., 1-0:1.8.0*255.
+
+    Return:
+        Returns the raw object name or None if the string is not a valid OBIS ID.
+    """
+    obis_code = _CODES_BY_NAME.get(obis_id)
+    if obis_code is not None:
+        return obis_code
+    match = OBIS_ID_REGEX.match(obis_id.strip())
+    if match is None:
+        return None
+    values = [int(group) for group in match.groups()]
+    if max(values) > 255:
+        return None
+    obis_code = bytes(values)
+    get_obis_id(obis_code)
+    return obis_code
+
+
+def get_obis_codes(obis_ids: Iterable[str]) -> FrozenSet[bytes]:
+    """Convert a list of OBIS ID strings into a set of raw object names.
+
+    Args:
+        obis_ids (list): List of OBIS IDs in the format A-B:C.D.E*F.
+
+    Return:
+        Returns the set of raw 6-byte object names. Invalid OBIS IDs are
+        ignored with an error message.
+    """
+    obis_codes = set()
+    for obis_id in obis_ids:
+        obis_code = parse_obis_id(obis_id)
+        if obis_code is None:
+            LOGGER.error("Ignoring invalid OBIS ID %s. Please use the format A-B:C.D.E*F!", obis_id)
+        else:
+            obis_codes.add(obis_code)
+    return frozenset(obis_codes)
+
+
+def get_unit_name(unit_code: Union[int, bytes, None]) -> Optional[str]:
+    """Get the unit string of a DLMS unit code.
+
+    Args:
+        unit_code (int): The unit code or None.
+
+    Return:
+        Returns the unit string, the string representation of unknown unit
+        codes or None if no unit code is given.
+    """
+    if unit_code is None:
+        return None
+    unit_name = UNIT_NAMES.get(unit_code)  # type: ignore
+    if unit_name is None:
+        return str(unit_code)
+    return unit_name
@@ -0,0 +1,157 @@
+"""
+Module providing the parallel processing of large capture files.
+
+The capture file is memory-mapped and split at start markers into chunks of
+about the same size. Each chunk contains complete SML files only and is
+parsed in its own worker process of a ProcessPoolExecutor. The readings of
+the chunks are passed to the callback in the original order of the file.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AbstractSet, List, Optional, Tuple
+
+from .sml_file import SmlTemplateCache
+from .sml_file_extractor import ESCAPE_SEQUENCE, VERSION_SEQUENCE, SmlFileExtractor
+from .sml_message_processor import ReadingBatchCallbackType, SmlFileCache, SmlReading, SmlReadingBatch, parse_sml_file
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Minimum size of a chunk of the capture file parsed by a worker process
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Start marker of an SML file, the chunks are split before
+START_MARKER = ESCAPE_SEQUENCE + VERSION_SEQUENCE
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _parse_chunk(
+    path: str, start: int, end: int, obis_codes: Optional[AbstractSet[bytes]]
+) -> List[Tuple[SmlReading, ...]]:
+    """Parse the SML files of a chunk of the capture file in a worker process.
+
+    Args:
+        path (str):       The path of the capture file.
+        start (int):      The start index of the chunk.
+        end (int):        The end index of the chunk (exclusive).
+        obis_codes (set): Optional set of raw 6-byte object names of interest.
+
+    Return:
+        Returns a list with the readings of each SML file of the chunk.
+    """
+    extractor = SmlFileExtractor()
+    template_cache = SmlTemplateCache()
+    file_cache = SmlFileCache()
+    results = []
+    with open(path, "rb") as input_fh, mmap.mmap(input_fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for file_data in extractor.add_bytes(data[start:end]):
+            try:
+                results.append(parse_sml_file(file_data, obis_codes, template_cache, file_cache)[1])
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Parsing an SML file failed!")
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def split_at_start_markers(data: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """Split the data into chunks starting at start markers.
+
+    Each chunk is at least chunk_size bytes long and ends before the first
+    start marker following, so no SML file is split between two chunks.
+
+    Args:
+        data (bytes):     The data (or a memory-mapped file) to split.
+        chunk_size (int): The minimum size of a chunk in bytes.
+
+    Return:
+        Returns a list of tuples (start, end) of the chunks.
+    """
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = data.find(START_MARKER, start + chunk_size) if start + chunk_size < len(data) else -1
+        if end < 0:
+            end = len(data)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def process_file_parallel(
+    path: str,
+    reading_batch_cb: ReadingBatchCallbackType,
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+    jobs: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> bool:
+    """Parse a capture file using several processes and call the callback in the order of the file.
+
+    Args:
+        path (str):       The path of the capture file.
+        reading_batch_cb: Callback function taking a SmlReadingBatch object with all
+                          readings of a file. The time of the batch is the time the
+                          results of the chunk were received.
+        obis_codes (set): Optional set of raw 6-byte object names of interest. List
+                          entries of other object names are skipped.
+        jobs (int):       The number of worker processes or None to use all cores.
+        chunk_size (int): The minimum size of the chunk parsed by a worker process.
+
+    Return:
+        Returns True on success, otherwise False.
+    """
+    try:
+        with open(path, "rb") as input_fh:
+            if os.fstat(input_fh.fileno()).st_size == 0:
+                return True
+            with mmap.mmap(input_fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                chunks = split_at_start_markers(data, chunk_size)
+    except OSError as exception:
+        LOGGER.critical("Can't open input file %s: %s", path, exception)
+        return False
+
+    LOGGER.debug("Parsing %d chunks of %s in parallel.", len(chunks), path)
+    num_files = 0
+    try:
+        with ProcessPoolExecutor(jobs) as executor:
+            # map() returns the results in the order of the chunks
+            for results in executor.map(
+                _parse_chunk,
+                [path] * len(chunks),
+                [start for start, _ in chunks],
+                [end for _, end in chunks],
+                [obis_codes] * len(chunks),
+            ):
+                num_files += len(results)
+                for readings in results:
+                    reading_batch_cb(SmlReadingBatch(time.time(), time.monotonic(), readings))
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("Parsing the input file %s failed!", path)
+        return False
+    LOGGER.debug("Parsed %d SML files.", num_files)
+    return True
@@ -0,0 +1,299 @@
+"""
+Module providing a threaded pipeline to read, parse and process SML files.
+
+The pipeline consists of a reader thread, a parser thread and one worker
+thread per sink. The reader thread only reads the input and extracts the SML
+files, so the serial port is drained promptly even if a sink is slow. The
+stages are connected by bounded queues with a configurable overflow policy.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from .sml_file_extractor import SmlFileExtractor
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+DEFAULT_QUEUE_SIZE = 64
+
+# Overflow policies of the queues
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_NEWEST = "drop-newest"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST)
+
+
+# -----------------------------------------------------------------------------
+# Types
+# -----------------------------------------------------------------------------
+ReadFunctionType = Callable[[], bytes]
+ParseFunctionType = Callable[[bytes, Tuple[float, float]], Any]
+SinkFunctionType = Callable[[Any], None]
+
+
+# -----------------------------------------------------------------------------
+# Module Variables
+# -----------------------------------------------------------------------------
+# Item put into a queue to stop the consuming stage
+_END_OF_STREAM = object()
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class BoundedQueue:
+    """Queue of a limited size between two stages of the pipeline.
+
+    If the queue is full, the overflow policy decides whether the producer
+    blocks until the consumer takes an item (block), the new item is dropped
+    (drop-newest) or the oldest item in the queue is dropped (drop-oldest).
+    The dropping policies expect a single producer.
+    """
+
+    def __init__(self, name: str, max_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = OVERFLOW_BLOCK) -> None:
+        """Construct a new, empty BoundedQueue object.
+
+        Args:
+            name (str):            The name of the queue used in the log messages.
+            max_size (int):        The maximum number of items in the queue.
+            overflow_policy (str): One of the OVERFLOW_POLICIES.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy}!")
+        if max_size < 1:
+            raise ValueError(f"Invalid queue size {max_size}!")
+        self.name = name
+        self.overflow_policy = overflow_policy
+        self.max_depth = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(max_size)
+
+    @property
+    def depth(self) -> int:
+        """Get the current number of items in the queue."""
+        return self._queue.qsize()
+
+    def put(self, item: Any) -> bool:
+        """Add an item to the queue according to the overflow policy.
+
+        Args:
+            item (obj): The item to add.
+
+        Return:
+            Returns True if the item was added or False if it was dropped.
+        """
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            self._queue.put(item)
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                        self._drop()
+                        return False
+                try:
+                    self._queue.get_nowait()
+                    self._drop()
+                except queue.Empty:
+                    pass
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def get(self) -> Any:
+        """Remove and return the next item of the queue, blocking until an item is available."""
+        return self._queue.get()
+
+    def close(self) -> None:
+        """Signal the consumer that no more items follow."""
+        self._queue.put(_END_OF_STREAM)
+
+    def _drop(self) -> None:
+        """Count a dropped item."""
+        self.dropped += 1
+        LOGGER.warning("Queue %s is full. Dropping an item (%d items dropped in total).", self.name, self.dropped)
+
+    def __str__(self) -> str:
+        """Get the statistics of the queue as a human readable string."""
+        return f"Queue {self.name}: depth {self.depth}, max depth {self.max_depth}, dropped {self.dropped} items"
+
+
+class SmlPipeline:
+    """Threaded pipeline reading, parsing and processing SML files.
+
+    The reader thread calls the read function and extracts the SML files of the
+    data. Each SML file is passed together with its arrival time as tuple
+    (time.time(), time.monotonic()) to the parse function in the parser thread.
+    The result of the parse function is passed to each sink function in its
+    own worker thread. Results of None are not passed to the sinks.
+
+    An exception raised by the read function stops the pipeline and is kept in
+    :attr:`error`. Exceptions of the parse and sink functions are logged and
+    only the affected item is skipped.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        read: ReadFunctionType,
+        parse: ParseFunctionType,
+        sinks: Sequence[Tuple[str, SinkFunctionType]],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        stop_on_eof: bool = True,
+    ) -> None:
+        """Construct a new SmlPipeline object.
+
+        Args:
+            read:                  Function returning the next chunk of input data.
+            parse:                 Function taking the arguments (file_data, arrival_time).
+            sinks (list):          List of tuples (name, sink function) of the sinks.
+            queue_size (int):      The maximum number of items in each queue.
+            overflow_policy (str): The overflow policy of all queues.
+            stop_on_eof (bool):    If set to True, the pipeline stops when the read
+                                   function returns no data.
+        """
+        self.extractor = SmlFileExtractor()
+        self.file_queue = BoundedQueue("files", queue_size, overflow_policy)
+        self.sink_queues = [BoundedQueue(name, queue_size, overflow_policy) for name, _ in sinks]
+        self._read = read
+        self._parse = parse
+        self._sink_functions = [sink for _, sink in sinks]
+        self._stop_on_eof = stop_on_eof
+        self.error: Optional[Exception] = None
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def queues(self) -> List[BoundedQueue]:
+        """Get all queues of the pipeline."""
+        return [self.file_queue] + self.sink_queues
+
+    def start(self) -> None:
+        """Start the threads of the pipeline."""
+        self._threads = [
+            threading.Thread(target=self._reader, name="sml-reader", daemon=True),
+            threading.Thread(target=self._parser, name="sml-parser", daemon=True),
+        ]
+        for sink_queue, sink in zip(self.sink_queues, self._sink_functions):
+            self._threads.append(
+                threading.Thread(
+                    target=self._sink_worker, args=(sink_queue, sink), name=f"sml-sink-{sink_queue.name}", daemon=True
+                )
+            )
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Request the reader thread to stop after the current read call."""
+        self._stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all threads of the pipeline finished.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds or None to wait forever.
+
+        Return:
+            Returns True if all threads finished, otherwise False.
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if end_time is None else max(0.0, end_time - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def run(self, statistics_interval: Optional[float] = None) -> bool:
+        """Start the pipeline and wait until all SML files are processed.
+
+        Args:
+            statistics_interval (float): The interval in seconds to log the statistics
+                                         of the queues or None to log them only by
+                                         calling log_statistics().
+
+        Return:
+            Returns True on success or False if reading the input failed.
+        """
+        self.start()
+        while not self.join(statistics_interval):
+            self.log_statistics()
+        return self.error is None
+
+    def log_statistics(self) -> None:
+        """Log the depth and drop counters of all queues."""
+        for bounded_queue in self.queues:
+            LOGGER.debug("%s.", bounded_queue)
+
+    def _reader(self) -> None:
+        """Read the input and extract the SML files."""
+        try:
+            while not self._stop_event.is_set():
+                data = self._read()
+                arrival_time = (time.time(), time.monotonic())
+                if not data and self._stop_on_eof:
+                    break
+                for file_data in self.extractor.add_bytes(data):
+                    self.file_queue.put((file_data, arrival_time))
+        except Exception as exception:  # pylint: disable=broad-except
+            LOGGER.exception("Reading the input failed!")
+            self.error = exception
+        finally:
+            self.file_queue.close()
+
+    def _parser(self) -> None:
+        """Parse the extracted SML files and pass the results to the sinks."""
+        while True:
+            item = self.file_queue.get()
+            if item is _END_OF_STREAM:
+                break
+            try:
+                result = self._parse(*item)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Parsing an SML file failed!")
+                continue
+            if result is not None:
+                for sink_queue in self.sink_queues:
+                    sink_queue.put(result)
+        for sink_queue in self.sink_queues:
+            sink_queue.close()
+
+    @staticmethod
+    def _sink_worker(sink_queue: BoundedQueue, sink: SinkFunctionType) -> None:
+        """Pass the results of the parser to a sink function.
+
+        Args:
+            sink_queue (obj): The queue of the sink.
+            sink:             The sink function.
+        """
+        while True:
+            item = sink_queue.get()
+            if item is _END_OF_STREAM:
+                break
+            try:
+                sink(item)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Sink %s failed!", sink_queue.name)
@@ -17,7 +17,11 @@ Copyright:
 import argparse
 import logging
 
-from .serial_ifc import get_input_file_or_serial
+from .aggregation import get_window_aggregator
+from .derived_power import get_power_deriver
+from .input_source import FileSource, get_device_sources, get_input_source
+from .multi_device import process_devices
+from .offline import process_file_parallel
 from .sml_message_processor import process
 
 # -----------------------------------------------------------------------------
@@ -38,6 +42,7 @@ on stdout.
 
 Example:
     powercounter -d /dev/ttyUSB1 print
+    powercounter -d /dev/ttyUSB0,label=house -d /dev/ttyUSB1,label=heatpump print
 """
 
 
@@ -53,9 +58,6 @@ def print_cmd(args):
     Return:
         Returns True on success, otherwise False.
     """
-    input_fh = get_input_file_or_serial(args)
-    if input_fh is None:
-        return False
 
     def sml_file_cb(file_data, sml_file):
         if args.verbose:
@@ -64,13 +66,47 @@ def print_cmd(args):
             for message in sml_file.messages:
                 print(message)
 
-    def obis_data_cb(obj_name, value, unit):
-        print(f"{obj_name}: {value:.3f} {unit}")
+    def reading_batch_cb(batch):
+        if batch.readings:
+            prefix = f"{batch.label}: " if batch.label else ""
+            print(
+                "\n".join(
+                    f"{prefix}{reading.obj_name}{'/' + reading.statistic if reading.statistic else ''}: "
+                    f"{reading.value:.3f} {reading.unit}"
+                    for reading in batch.readings
+                )
+            )
+
+    aggregator = get_window_aggregator(args, reading_batch_cb)
+    if aggregator is not None:
+        reading_batch_cb = aggregator
+    # The derived power is aggregated like the readings of the meter
+    deriver = get_power_deriver(args, reading_batch_cb)
+    if deriver is not None:
+        reading_batch_cb = deriver
+
+    if not args.input_file and args.device and len(args.device) > 1:
+        sources = get_device_sources(args)
+        if sources is None:
+            return False
+        process_devices(sources, sml_file_cb, reading_batch_cb)
+        if aggregator is not None:
+            aggregator.flush()
+        return True
+
+    input_fh = get_input_source(args)
+    if input_fh is None:
+        return False
 
-    process(args, input_fh, sml_file_cb, obis_data_cb)
+    if isinstance(input_fh, FileSource) and args.jobs != 1:
+        success = process_file_parallel(input_fh.path, reading_batch_cb, jobs=args.jobs or None)
+    else:
+        success = process(args, input_fh, sml_file_cb, reading_batch_cb=reading_batch_cb)
+    if aggregator is not None:
+        aggregator.flush()
 
     input_fh.close()
-    return True
+    return success
 
 
 def add_print_parser(subparsers):
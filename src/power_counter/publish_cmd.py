@@ -16,11 +16,24 @@ Copyright:
 # -----------------------------------------------------------------------------
 import argparse
 import logging
-from typing import Any
-
-from .mqtt_ifc import MqttInterface
-from .serial_ifc import get_input_file_or_serial
-from .sml_message_processor import process
+from typing import Any, FrozenSet
+
+from .aggregation import get_window_aggregator
+from .derived_power import get_power_deriver
+from .input_source import FileSource, get_device_sources, get_input_source
+from .mqtt_ifc import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_METER_TOPIC,
+    DEFAULT_OFFLINE_QUEUE_SIZE,
+    PAYLOAD_MODES,
+    PAYLOAD_TOPIC,
+    MqttInterface,
+)
+from .multi_device import process_devices
+from .offline import process_file_parallel
+from .publish_rules import parse_publish_rule
+from .serial_ifc import get_devices
+from .sml_message_processor import SmlReadingBatch, process
 
 # -----------------------------------------------------------------------------
 # Logger
@@ -40,9 +53,29 @@ as mqtt messages.
 
 Example:
     powercounter -d /dev/ttyUSB1 publish
+    powercounter -d /dev/ttyUSB0,prefix=house/ -d /dev/ttyUSB1,prefix=heatpump/ publish
 """
 
 
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _get_obis_codes(args: Any, mqtt: MqttInterface) -> FrozenSet[bytes]:
+    """Get the raw object names to decode.
+
+    Only the entries of OBIS IDs with a MQTT topic and of the energy counters
+    to derive the power from are decoded.
+
+    Args:
+        args (obj) - The command line arguments.
+        mqtt (obj) - The MqttInterface object.
+
+    Return:
+        Returns the set of raw object names.
+    """
+    return frozenset(mqtt.topics).union(rule.obis_code for rule in args.derive_power or [])
+
+
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
@@ -55,20 +88,55 @@ def publish(args: Any) -> bool:
     Return:
         Returns True on success, otherwise False.
     """
-    input_fh = get_input_file_or_serial(args)
+    if not args.input_file and args.device and len(args.device) > 1:
+        sources = get_device_sources(args)
+        if sources is None:
+            return False
+
+        # One MQTT connection for all meters
+        mqtt = MqttInterface(args)
+        prefixes = {device.label: device.prefix for device, _ in sources}
+
+        def publish_meter_batch(batch: SmlReadingBatch) -> None:
+            mqtt.publish_batch(batch, prefixes[batch.label])
+
+        aggregator = get_window_aggregator(args, publish_meter_batch)
+        reading_batch_cb = aggregator or publish_meter_batch
+        process_devices(
+            sources,
+            reading_batch_cb=get_power_deriver(args, reading_batch_cb) or reading_batch_cb,
+            obis_codes=_get_obis_codes(args, mqtt),
+        )
+        if aggregator is not None:
+            aggregator.flush()
+        mqtt.close()
+        return True
+
+    input_fh = get_input_source(args)
     if input_fh is None:
         return False
 
     mqtt = MqttInterface(args)
+    prefix = "" if args.input_file else get_devices(args)[0].prefix
+
+    obis_codes = _get_obis_codes(args, mqtt)
 
-    def obis_data_cb(obj_name, value, unit):
-        mqtt.publish(obj_name, value)
+    def publish_batch(batch: SmlReadingBatch) -> None:
+        mqtt.publish_batch(batch, prefix)
 
-    process(args, input_fh, None, obis_data_cb)
+    aggregator = get_window_aggregator(args, publish_batch)
+    reading_batch_cb = aggregator or publish_batch
+    reading_batch_cb = get_power_deriver(args, reading_batch_cb) or reading_batch_cb
+    if isinstance(input_fh, FileSource) and args.jobs != 1:
+        success = process_file_parallel(input_fh.path, reading_batch_cb, obis_codes, args.jobs or None)
+    else:
+        success = process(args, input_fh, obis_codes=obis_codes, reading_batch_cb=reading_batch_cb)
+    if aggregator is not None:
+        aggregator.flush()
 
     mqtt.close()
     input_fh.close()
-    return True
+    return success
 
 
 def add_publish_parser(subparsers: Any) -> None:
@@ -99,4 +167,45 @@ def add_publish_parser(subparsers: Any) -> None:
         action="store",
         default="1-0:1.8.0*255=power/total,1-0:16.7.0*255=power/rate,1-0:2.8.0*255=power/feed-total",
     )
+    publish_parser.add_argument(
+        "--mqtt-connect-timeout",
+        help="Maximum time in seconds to wait for the connection to the MQTT host on startup. "
+        "[Default: %(default)s]",
+        action="store",
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+    )
+    publish_parser.add_argument(
+        "--mqtt-queue-size",
+        help="Maximum number of messages kept while the MQTT host is not reachable. [Default: %(default)s]",
+        action="store",
+        type=int,
+        default=DEFAULT_OFFLINE_QUEUE_SIZE,
+    )
+    publish_parser.add_argument(
+        "--mqtt-payload",
+        help="Publish each reading on its own topic (topic) or all readings of an SML file as a single "
+        "message on the meter topic, encoded as JSON object (json) or as comma separated key=value pairs "
+        "(compact). [Default: %(default)s]",
+        action="store",
+        choices=PAYLOAD_MODES,
+        default=PAYLOAD_TOPIC,
+    )
+    publish_parser.add_argument(
+        "--mqtt-meter-topic",
+        help="MQTT topic of the messages containing all readings of an SML file. [Default: %(default)s]",
+        action="store",
+        default=DEFAULT_METER_TOPIC,
+    )
+    publish_parser.add_argument(
+        "--mqtt-rule",
+        help="Publishing rule of an OBIS ID in the format "
+        "OBIS_ID[,deadband=VALUE[%%]][,min-interval=SECONDS][,heartbeat=SECONDS]. A reading is only published "
+        "if it changed by more than the deadband (absolute or in percent of the last published value) and the "
+        "minimum interval passed, or if the heartbeat interval passed. Specify the option multiple times for "
+        "several OBIS IDs.",
+        action="append",
+        type=parse_publish_rule,
+        metavar="RULE",
+    )
     publish_parser.set_defaults(func=publish)
@@ -0,0 +1,141 @@
+"""
+Module providing the change-driven publishing rules of the powercounter application.
+
+A publishing rule of an OBIS ID suppresses readings that did not change by
+more than a deadband, limits the rate of the readings by a minimum interval
+and forces a reading after a maximum silence (heartbeat). The last published
+value and time of each topic are kept in a table, so checking a reading costs
+a single dictionary lookup.
+
+Copyright:
+    2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+
+    All rights reserved.
+
+    This file is part of powercounter (https://github.com/seeraven/powercounter)
+    and is released under the "BSD 3-Clause License". Please see the ``LICENSE`` file
+    that is included as part of this package.
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import argparse
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .obis import parse_obis_id
+
+# -----------------------------------------------------------------------------
+# Logger
+# -----------------------------------------------------------------------------
+LOGGER = logging.getLogger()
+
+
+# -----------------------------------------------------------------------------
+# Class Definitions
+# -----------------------------------------------------------------------------
+class PublishRule(NamedTuple):
+    """Publishing rule of an OBIS ID specified by the --mqtt-rule option."""
+
+    obis_code: bytes
+    deadband: float = 0.0
+    relative: bool = False
+    min_interval: float = 0.0
+    heartbeat: Optional[float] = None
+
+
+class PublishFilter:
+    """Decide which readings to publish according to the publishing rules.
+
+    A reading of an OBIS ID with a rule is published if it is the first
+    reading of its topic, or if at least the minimum interval passed since
+    the last published reading of the topic and either the value changed by
+    more than the deadband or the heartbeat interval passed. Readings of OBIS
+    IDs without a rule are always published.
+    """
+
+    def __init__(self, rules: Iterable[PublishRule]) -> None:
+        """Construct a new PublishFilter object.
+
+        Args:
+            rules (list): List of PublishRule objects.
+        """
+        self.rules: Dict[bytes, PublishRule] = {rule.obis_code: rule for rule in rules}
+        # Last published value and monotonic time by topic
+        self._last: Dict[str, List[float]] = {}
+        self.suppressed = 0
+
+    def check(self, topic: str, obis_code: bytes, value: float, now: float) -> bool:
+        """Check whether to publish a reading and update the table of the topic.
+
+        Args:
+            topic (str):       The MQTT topic of the reading.
+            obis_code (bytes): The raw object name.
+            value (float):     The value of the reading.
+            now (float):       The monotonic time of the reading, e.g., the arrival time of the SML file.
+
+        Return:
+            Returns True if the reading should be published, otherwise False.
+        """
+        rule = self.rules.get(obis_code)
+        if rule is None:
+            return True
+        last = self._last.get(topic)
+        if last is None:
+            self._last[topic] = [value, now]
+            return True
+
+        last_value, last_time = last
+        elapsed = now - last_time
+        if elapsed >= rule.min_interval:
+            deadband = rule.deadband * abs(last_value) if rule.relative else rule.deadband
+            if abs(value - last_value) > deadband or (rule.heartbeat is not None and elapsed >= rule.heartbeat):
+                last[0] = value
+                last[1] = now
+                return True
+        self.suppressed += 1
+        return False
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def parse_publish_rule(spec: str) -> PublishRule:
+    """Parse a publishing rule of the --mqtt-rule option.
+
+    The rule has the format OBIS_ID[,deadband=VALUE[%]][,min-interval=SECONDS][,heartbeat=SECONDS].
+    A deadband with a trailing % is relative to the last published value.
+
+    Args:
+        spec (str) - The rule, e.g., "1-0:1.8.0*255,deadband=10,min-interval=5,heartbeat=300".
+
+    Return:
+        Returns the PublishRule object.
+
+    Raises:
+        argparse.ArgumentTypeError if the rule is invalid.
+    """
+    obis_id, *options = spec.split(",")
+    obis_code = parse_obis_id(obis_id)
+    if obis_code is None:
+        raise argparse.ArgumentTypeError(f"{obis_id} in publishing rule {spec} is not a valid OBIS ID!")
+    values = {"deadband": "0", "min-interval": "0", "heartbeat": ""}
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator or key not in values:
+            raise argparse.ArgumentTypeError(
+                f"Invalid option {option} in publishing rule {spec}! "
+                "Please use deadband=VALUE[%], min-interval=SECONDS or heartbeat=SECONDS."
+            )
+        values[key] = value
+    relative = values["deadband"].endswith("%")
+    try:
+        deadband = float(values["deadband"].rstrip("%"))
+        min_interval = float(values["min-interval"])
+        heartbeat = float(values["heartbeat"]) if values["heartbeat"] else None
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"Invalid value in publishing rule {spec}: {exception}") from exception
+    if deadband < 0.0 or min_interval < 0.0 or (heartbeat is not None and heartbeat <= 0.0):
+        raise argparse.ArgumentTypeError(f"Invalid deadband or interval in publishing rule {spec}!")
+    return PublishRule(obis_code, deadband / 100.0 if relative else deadband, relative, min_interval, heartbeat)
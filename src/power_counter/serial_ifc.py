@@ -14,9 +14,13 @@ Copyright:
 # -----------------------------------------------------------------------------
 # Module Import
 # -----------------------------------------------------------------------------
+import argparse
+import asyncio
 import atexit
 import logging
-from typing import Any, BinaryIO, Optional, Union
+import os
+import time
+from typing import Any, BinaryIO, Callable, List, NamedTuple, Optional, Union
 
 import serial
 
@@ -26,14 +30,86 @@ import serial
 LOGGER = logging.getLogger()
 
 
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Time in seconds to collect the following bytes after the first byte of a
+# serial port read arrived. At 9600 baud, about 10 bytes are read at once.
+SERIAL_READ_HOLD_OFF = 0.01
+
+# Number of bytes read at once from an input file
+FILE_READ_SIZE = 4096
+
+DEFAULT_DEVICE = "/dev/ttyUSB0"
+
+
+# -----------------------------------------------------------------------------
+# Types
+# -----------------------------------------------------------------------------
+class DeviceSpec(NamedTuple):
+    """Serial device of a meter with its label and MQTT topic prefix."""
+
+    port: str
+    label: str
+    prefix: str
+
+
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
-def get_serial(args: Any, close_on_exit: bool = True) -> Optional[serial.Serial]:
-    """Get a serial.Serial() object.
+def parse_device_spec(spec: str) -> DeviceSpec:
+    """Parse a device specification of the --device option.
+
+    The specification has the format PORT[,label=LABEL][,prefix=PREFIX]. The
+    label defaults to the base name of the port and the topic prefix defaults
+    to an empty string.
+
+    Args:
+        spec (str) - The device specification, e.g., "/dev/ttyUSB1,label=heatpump,prefix=heatpump/".
+
+    Return:
+        Returns the DeviceSpec object.
+
+    Raises:
+        argparse.ArgumentTypeError if the specification is invalid.
+    """
+    port, *options = spec.split(",")
+    if not port:
+        raise argparse.ArgumentTypeError(f"Missing serial port in device specification {spec}!")
+    values = {"label": os.path.basename(port), "prefix": ""}
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator or key not in values:
+            raise argparse.ArgumentTypeError(
+                f"Invalid option {option} in device specification {spec}! Please use label=LABEL or prefix=PREFIX."
+            )
+        values[key] = value
+    return DeviceSpec(port, values["label"], values["prefix"])
+
+
+def get_devices(args: Any) -> List[DeviceSpec]:
+    """Get the serial devices specified by the --device options.
+
+    Args:
+        args (obj) - The arguments object.
+
+    Return:
+        Returns the list of DeviceSpec objects or an empty list if the labels
+        of the devices are not unique.
+    """
+    devices = args.device or [parse_device_spec(DEFAULT_DEVICE)]
+    labels = [device.label for device in devices]
+    if len(set(labels)) != len(labels):
+        LOGGER.critical("The labels of the serial devices %s are not unique!", ", ".join(labels))
+        return []
+    return devices
+
+
+def open_serial(port: str, close_on_exit: bool = True) -> Optional[serial.Serial]:
+    """Open a serial port at baud rate 9600 and 8N1.
 
     Args:
-        args (obj)           - The arguments object.
+        port (str)           - The serial port device.
         close_on_exit (bool) - If set to True, the serial handle is closed
                                automatically on exit.
 
@@ -42,9 +118,9 @@ def get_serial(args: Any, close_on_exit: bool = True) -> Optional[serial.Serial]
         device could not be opened.
     """
     try:
-        LOGGER.debug("Opening serial port %s at baud rate 9600 and 8N1.", args.device)
+        LOGGER.debug("Opening serial port %s at baud rate 9600 and 8N1.", port)
         handle = serial.Serial(
-            port=args.device,
+            port=port,
             baudrate=9600,
             parity=serial.PARITY_NONE,
             stopbits=serial.STOPBITS_ONE,
@@ -55,7 +131,7 @@ def get_serial(args: Any, close_on_exit: bool = True) -> Optional[serial.Serial]
         handle.reset_output_buffer()
         LOGGER.debug("Serial port opened.")
     except serial.serialutil.SerialException:
-        LOGGER.critical("Can't open serial device %s!", args.device)
+        LOGGER.critical("Can't open serial device %s!", port)
         handle = None
 
     if close_on_exit and handle:
@@ -65,31 +141,92 @@ def get_serial(args: Any, close_on_exit: bool = True) -> Optional[serial.Serial]
     return handle
 
 
-def get_input_file_or_serial(args: Any, close_on_exit: bool = True) -> Optional[Union[BinaryIO, serial.Serial]]:
-    """Get a file handle or a serial.Serial() object.
+def read_serial(handle: serial.SerialBase) -> bytes:
+    """Read the next chunk of data from a serial port.
+
+    If bytes are waiting in the input buffer, they are returned immediately.
+    Otherwise the function blocks until a byte is received and returns it
+    together with the bytes received within the hold-off time. So a call
+    returns a burst of bytes instead of a single byte, and the end of an SML
+    file is handled shortly after it arrived.
 
     Args:
-        args (obj)           - The arguments object.
-        close_on_exit (bool) - If set to True, the file or serial file handle is
-                               closed automatically on exit.
+        handle (obj) - The serial port object opened without a timeout.
 
     Return:
-        Returns an instance of the serial port object or None if the serial
-        device could not be opened.
+        Returns the read bytes.
     """
-    if args.input_file:
+    num_waiting = handle.in_waiting
+    if num_waiting:
+        return handle.read(min(num_waiting, FILE_READ_SIZE))
+    data = handle.read(1)
+    time.sleep(SERIAL_READ_HOLD_OFF)
+    return data + handle.read(min(handle.in_waiting, FILE_READ_SIZE - 1))
+
+
+def get_read_function(input_fh: Union[BinaryIO, serial.SerialBase]) -> Callable[[], bytes]:
+    """Get the function used to read the next chunk of data from an input handle.
+
+    Serial ports are read using read_serial(), input files are read in large
+    blocks.
+
+    Args:
+        input_fh (obj) - The input file handle or serial port object.
+
+    Return:
+        Returns a function without arguments returning the read bytes. An empty
+        result indicates the end of an input file.
+    """
+    if isinstance(input_fh, serial.SerialBase):
+        return lambda: read_serial(input_fh)  # type: ignore
+
+    def read_file() -> bytes:
+        return input_fh.read(FILE_READ_SIZE)  # type: ignore
+
+    return read_file
+
+
+def open_fd_reader(fd: int) -> asyncio.StreamReader:
+    """Get an asyncio stream reader of a file descriptor, e.g., of a serial port or a pipe.
+
+    The file descriptor is switched to the non-blocking mode and watched by the
+    running event loop using loop.add_reader(). The watch ends at the end of
+    the file, on a read error or by calling close_fd_reader(). This function
+    must be called from within a running event loop.
+
+    Args:
+        fd (int) - The file descriptor, e.g., serial.Serial().fileno().
+
+    Return:
+        Returns the asyncio.StreamReader object receiving the data.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    os.set_blocking(fd, False)
+
+    def on_readable() -> None:
         try:
-            LOGGER.debug("Opening specified input file %s.", args.input_file)
-            # pylint: disable=consider-using-with
-            input_fh = open(args.input_file, "rb")
-
-            if close_on_exit:
-                LOGGER.debug("Registering at exit handler to close the file in the end.")
-                atexit.register(input_fh.close)
-        except OSError:
-            LOGGER.critical("Can't open input file %s!", args.input_file)
-            input_fh = None
-    else:
-        input_fh = get_serial(args, close_on_exit=close_on_exit)
-
-    return input_fh
+            data = os.read(fd, FILE_READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as exception:
+            loop.remove_reader(fd)
+            reader.set_exception(exception)
+            return
+        if data:
+            reader.feed_data(data)
+        else:
+            loop.remove_reader(fd)
+            reader.feed_eof()
+
+    loop.add_reader(fd, on_readable)
+    return reader
+
+
+def close_fd_reader(fd: int) -> None:
+    """Stop watching a file descriptor opened using open_fd_reader().
+
+    Args:
+        fd (int) - The file descriptor.
+    """
+    asyncio.get_running_loop().remove_reader(fd)
@@ -15,10 +15,18 @@ Copyright:
 # Module Imports
 # -----------------------------------------------------------------------------
 import logging
-from typing import List, Tuple
+from typing import AbstractSet, Dict, List, Optional, Set, Tuple
 
-from .crc import crc16_x25
-from .sml_message import SmlMessageType, SmlRawMessageData, get_message
+from .crc import Crc16X25, crc16_x25
+from .sml_file_extractor import SmlFrame
+from .sml_message import (
+    MESSAGE_TAG_GET_LIST_RESPONSE,
+    SmlListEntry,
+    SmlMessageGetListResponse,
+    SmlMessageType,
+    SmlRawMessageData,
+    get_message,
+)
 from .sml_types import FieldType
 
 # -----------------------------------------------------------------------------
@@ -36,6 +44,9 @@ TYPE_INTEGER = 0x50
 TYPE_UNSIGNED = 0x60
 TYPE_LIST = 0x70
 
+# Type field, length field and the "another TL byte follows" flag of every possible TL byte
+TL_BYTE_TABLE = tuple((tl_byte & 0x70, tl_byte & 0x0F, tl_byte & 0x80 != 0) for tl_byte in range(256))
+
 
 # -----------------------------------------------------------------------------
 # Byte Sequences
@@ -43,25 +54,260 @@ TYPE_LIST = 0x70
 ESCAPE_SEQUENCE = b"\x1b\x1b\x1b\x1b"
 
 
+# -----------------------------------------------------------------------------
+# Types
+# -----------------------------------------------------------------------------
+# Path of a field within a message: The indices of the field in the enclosing lists
+FieldPath = Tuple[int, ...]
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def _replace_fields(fields: List[FieldType], changes: List[Tuple[FieldPath, FieldType]]) -> List[FieldType]:
+    """Return a copy of a list of fields with some of the (nested) fields replaced.
+
+    Only the lists on the paths to the replaced fields are copied, all other
+    lists are shared with the original list.
+
+    Args:
+        fields (list):  The list of fields.
+        changes (list): List of tuples (path, value) of the fields to replace.
+
+    Return:
+        Returns the new list of fields.
+    """
+    root = list(fields)
+    copied_lists: Dict[FieldPath, List[FieldType]] = {(): root}
+    for path, value in changes:
+        node = root
+        for depth in range(1, len(path)):
+            prefix = path[:depth]
+            child = copied_lists.get(prefix)
+            if child is None:
+                child = list(node[path[depth - 1]])  # type: ignore
+                node[path[depth - 1]] = child
+                copied_lists[prefix] = child
+            node = child
+        node[path[-1]] = value
+    return root
+
+
 # -----------------------------------------------------------------------------
 # Classes
 # -----------------------------------------------------------------------------
+# pylint: disable=too-many-instance-attributes
+class SmlFileTemplate:
+    """Structure of a parsed SML file used to parse SML files of the same structure faster.
+
+    The template records the position, type and value of every decoded field
+    (leaf) of the messages. Leaves that changed between two files of the same
+    structure are considered volatile. All other bytes of the file form the
+    static segments that must match for the template to be applicable.
+    """
+
+    def __init__(self, data: bytes, obis_codes: Optional[AbstractSet[bytes]]) -> None:
+        """Construct a new, empty SmlFileTemplate object.
+
+        Args:
+            data (bytes):     The unescaped data of the SML file.
+            obis_codes (set): The set of object names of interest used to parse the file.
+        """
+        self.data = data
+        self.obis_codes = obis_codes
+        # Elements: data index, end index and type field of the leaves
+        self.leaf_spans: List[Tuple[int, int, int]] = []
+        # Elements: message number and path within the message of the leaves
+        self.leaf_paths: List[Tuple[int, FieldPath]] = []
+        self.leaf_values: List[FieldType] = []
+        # Elements: data index and end index of the skipped list entries
+        self.skipped: List[Tuple[int, int]] = []
+        # Elements: start index and end index of the messages
+        self.message_spans: List[Tuple[int, int]] = []
+        self.raw_messages: List[FieldType] = []
+        self.messages: List[Optional[SmlMessageType]] = []
+        # Converted list entries of GetListResponse messages by the id() of the raw list entries
+        self.list_entries: Dict[int, SmlListEntry] = {}
+        self.valid = True
+        self.volatile_leaves: List[int] = []
+        # Elements: start index and data of the static segments
+        self.segments: List[Tuple[int, bytes]] = []
+
+    def add_leaf(self, data_index: int, end_index: int, type_field: int, path: FieldPath, value: FieldType) -> None:
+        """Record a decoded field of the current message.
+
+        Args:
+            data_index (int): The first byte of the value.
+            end_index (int):  The first byte after the value.
+            type_field (int): The type of the field.
+            path (tuple):     The path of the field within the current message.
+            value (obj):      The decoded value.
+        """
+        self.leaf_spans.append((data_index, end_index, type_field))
+        self.leaf_paths.append((len(self.raw_messages), path))
+        self.leaf_values.append(value)
+
+    def add_message(self, start_index: int, end_index: int, raw_message: FieldType, valid: bool, message) -> None:
+        """Record a decoded message.
+
+        Args:
+            start_index (int): The first byte of the message.
+            end_index (int):   The first byte after the message.
+            raw_message (obj): The decoded fields of the message.
+            valid (bool):      True if the message was converted without errors.
+            message (obj):     The converted message object or None.
+        """
+        if not valid:
+            self.valid = False
+            return
+        self.message_spans.append((start_index, end_index))
+        self.raw_messages.append(raw_message)
+        self.messages.append(message)
+        if isinstance(message, SmlMessageGetListResponse):
+            raw_entries = raw_message[3][1][4]  # type: ignore
+            if len(raw_entries) == len(message.list_entries):
+                for raw_entry, list_entry in zip(raw_entries, message.list_entries):
+                    self.list_entries[id(raw_entry)] = list_entry
+
+    def has_same_structure(self, other: "SmlFileTemplate") -> bool:
+        """Check if the other template describes a file of the same structure.
+
+        Args:
+            other (SmlFileTemplate): The other template.
+
+        Return:
+            Returns True if both files consist of the same fields at the same positions.
+        """
+        return (
+            len(self.data) == len(other.data)
+            and self.obis_codes == other.obis_codes
+            and self.message_spans == other.message_spans
+            and self.leaf_spans == other.leaf_spans
+            and self.leaf_paths == other.leaf_paths
+            and self.skipped == other.skipped
+        )
+
+    def set_volatile_leaves(self, volatile_leaves: Set[int]) -> None:
+        """Set the volatile leaves and determine the static segments.
+
+        Args:
+            volatile_leaves (set): The indices of the volatile leaves.
+        """
+        self.volatile_leaves = sorted(volatile_leaves)
+        data = self.data
+        # The checksum of the file is checked separately
+        excluded = [self.leaf_spans[idx][:2] for idx in self.volatile_leaves] + self.skipped
+        excluded.append((len(data) - 2, len(data)))
+        excluded.sort()
+        self.segments = []
+        start_index = 0
+        for end_index, next_start_index in excluded:
+            if end_index > start_index:
+                self.segments.append((start_index, data[start_index:end_index]))
+            start_index = max(start_index, next_start_index)
+
+
+class SmlTemplateCache:
+    """Cache of the template of the last parsed SML file.
+
+    Pass the same cache object to all SmlFile objects created for a data
+    stream to parse files of unchanged structure faster.
+    """
+
+    def __init__(self) -> None:
+        """Construct a new, empty SmlTemplateCache object."""
+        self.template: Optional[SmlFileTemplate] = None
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, template: SmlFileTemplate) -> None:
+        """Replace the cached template by a new one.
+
+        If the new template describes a file of the same structure as the
+        cached one, the leaves that differ between both files are marked as
+        volatile in addition to the already known volatile leaves.
+
+        Args:
+            template (SmlFileTemplate): The template of the last fully parsed file.
+        """
+        if not template.valid:
+            self.template = None
+            return
+        volatile_leaves: Set[int] = set()
+        if self.template is not None and self.template.has_same_structure(template):
+            volatile_leaves.update(self.template.volatile_leaves)
+            for idx, (old_value, new_value) in enumerate(zip(self.template.leaf_values, template.leaf_values)):
+                if old_value != new_value:
+                    volatile_leaves.add(idx)
+        template.set_volatile_leaves(volatile_leaves)
+        self.template = template
+
+
 # pylint: disable=too-few-public-methods
 class SmlFile:
     """Representation of an SML-file."""
 
-    def __init__(self, data: bytes) -> None:
-        """Construct a new SmlFile object."""
+    def __init__(
+        self,
+        data: bytes,
+        obis_codes: Optional[AbstractSet[bytes]] = None,
+        template_cache: Optional[SmlTemplateCache] = None,
+    ) -> None:
+        """Construct a new SmlFile object.
+
+        Args:
+            data (bytes):      The raw data of the SML file. If it is a SmlFrame object,
+                               the unescaped data and the checksum determined by the
+                               SmlFileExtractor are used instead of processing the data again.
+            obis_codes (set):  Optional set of raw 6-byte object names of interest. If given,
+                               the list entries of GetListResponse messages with other object
+                               names are skipped without decoding them.
+            template_cache (obj):  Optional SmlTemplateCache object. If the file has the same
+                               structure as the cached template, only the volatile fields
+                               are decoded. Otherwise, the file is parsed completely and
+                               the cache is updated.
+        """
         LOGGER.debug("Initializing SmlFile class on %d bytes buffer to extract the raw messages.", len(data))
-        self.data = data.replace(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE, ESCAPE_SEQUENCE)
+        self._crc: Optional[Crc16X25] = None
+        if isinstance(data, SmlFrame):
+            self.data = data.data
+            self._crc = data.crc
+        else:
+            self.data = data.replace(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE, ESCAPE_SEQUENCE)
+        self._obis_codes = obis_codes
+        self._view = memoryview(self.data)
         self.messages: List[SmlMessageType] = []
+        self.message_offsets: List[int] = []
         self._check_crc()
         if self.valid_crc:
-            self._extract_messages()
+            if template_cache is None:
+                self._extract_messages()
+            elif not self._apply_template(template_cache):
+                template_cache.misses += 1
+                template = SmlFileTemplate(self.data, obis_codes)
+                self._extract_messages(template)
+                template_cache.update(template)
+
+    def _calculate_crc(self, start_index: int, end_index: int) -> int:
+        """Calculate the CRC of a part of the data.
+
+        Args:
+            start_index (int): The first byte of the data.
+            end_index (int):   The first byte after the data.
+
+        Return:
+            Returns the CRC16 X25 checksum (byte swapped).
+        """
+        if self._crc is not None:
+            return self._crc.range_digest(self.data, start_index, end_index)
+        return crc16_x25(self.data[start_index:end_index])
 
     def _check_crc(self) -> None:
         """Check the CRC of the data."""
-        calculated_crc = crc16_x25(self.data[:-2])
+        if self._crc is not None:
+            calculated_crc = self._crc.digest()
+        else:
+            calculated_crc = crc16_x25(self.data[:-2])
         provided_crc = (self.data[-2] << 8) | self.data[-1]
         self.valid_crc = calculated_crc == provided_crc
 
@@ -70,85 +316,308 @@ class SmlFile:
                 "SML File has invalid CRC! Calculated: 0x%04x, Provided: 0x%04x!", calculated_crc, provided_crc
             )
 
-    def _get_next_field(self, read_index: int, debug_log_indent: int = 0) -> Tuple[int, FieldType]:
+    def _skip_fields(self, read_index: int, num_fields: int) -> int:
+        """Skip a number of fields without decoding them.
+
+        Args:
+            read_index (int): The first byte of the first field to skip.
+            num_fields (int): The number of fields to skip. Lists count as
+                              a single field.
+
+        Return:
+            Returns the index of the first byte after the skipped fields.
+        """
+        data = self.data
+        while num_fields:
+            num_fields -= 1
+            type_field, length_field, another_tl = TL_BYTE_TABLE[data[read_index]]
+            while another_tl:
+                read_index += 1
+                length_field = (length_field << 4) | (data[read_index] & 0x0F)
+                another_tl = data[read_index] & 0x80
+
+            if length_field == 0:
+                length_field = 1
+
+            if type_field == TYPE_LIST:
+                num_fields += length_field
+                read_index += 1
+            else:
+                read_index += length_field
+        return read_index
+
+    def _is_skipped_list_entry(self, stack: List[Tuple[List[FieldType], int]], data_index: int) -> bool:
+        """Check if a list is an uninteresting entry of a GetListResponse message.
+
+        Args:
+            stack (list):     The stack of incomplete lists of _get_next_field(). The
+                              list to check is a child of the top-most list.
+            data_index (int): The first byte of the first field of the list to check.
+
+        Return:
+            Returns True if the list is a list entry of a GetListResponse message
+            and its object name is not in the set of interesting object names.
+        """
+        if self._obis_codes is None or len(stack) != 4:
+            return False
+        # The message is a list of 6 fields, the message body is the fourth field and
+        # consists of the tag and the content. The list entries are in the fifth field
+        # of the GetListResponse content.
+        message, body, content = stack[0][0], stack[1][0], stack[2][0]
+        if len(message) != 3 or len(body) != 1 or body[0] != MESSAGE_TAG_GET_LIST_RESPONSE or len(content) != 4:
+            return False
+        return self._is_uninteresting_entry(data_index)
+
+    def _is_uninteresting_entry(self, data_index: int) -> bool:
+        """Check the object name of a list entry against the set of interesting object names.
+
+        Args:
+            data_index (int): The first byte of the first field of the list entry.
+
+        Return:
+            Returns True if the object name is not in the set of interesting object names.
+        """
+        data = self.data
+        name_start = data_index + 1
+        name_end = data_index + 7
+        return data[data_index] != 0x07 or data[name_start:name_end] not in self._obis_codes  # type: ignore
+
+    # pylint: disable=too-many-branches,too-many-statements
+    def _get_next_field(
+        self, read_index: int, debug: Optional[bool] = None, template: Optional[SmlFileTemplate] = None
+    ) -> Tuple[int, FieldType]:
         """Extract the next field and return it.
 
+        Nested lists are decoded using an explicit stack of the lists that are
+        not complete yet. If a set of interesting object names is given, the
+        other list entries of GetListResponse messages are skipped.
+
         Args:
             read_index (int): The first byte to analyze in the data buffer.
+            debug (bool):     Log the extracted fields. If not given, the
+                              log level is checked.
+            template (obj):   Optional SmlFileTemplate object to record the
+                              decoded fields and the skipped list entries.
 
         Return:
             Returns the tuple (next_read_index, data) with data converted to
             the corresponding python data type.
         """
-        type_field = self.data[read_index] & 0x70
-        length_field = self.data[read_index] & 0x0F
-        while self.data[read_index] & 0x80:
-            read_index += 1
-            length_field = (length_field << 4) | (self.data[read_index] & 0x0F)
+        if debug is None:
+            debug = LOGGER.isEnabledFor(logging.DEBUG)
+        data = self.data
+        view = self._view
+        # Elements: list, number of fields of the list
+        stack: List[Tuple[List[FieldType], int]] = []
+
+        while True:
+            type_field, length_field, another_tl = TL_BYTE_TABLE[data[read_index]]
+            while another_tl:
+                read_index += 1
+                length_field = (length_field << 4) | (data[read_index] & 0x0F)
+                another_tl = data[read_index] & 0x80
+
+            if length_field == 0:
+                length_field = 1
+
+            next_read_index = read_index + length_field
+            data_index = read_index + 1
+            value: FieldType
+            if type_field == TYPE_LIST:
+                if length_field != 7 or not self._is_skipped_list_entry(stack, data_index):
+                    if debug:
+                        LOGGER.debug("%sFound list of %d fields.", " " * 2 * len(stack), length_field)
+                    stack.append(([], length_field))
+                    read_index = data_index
+                    continue
+                if debug:
+                    LOGGER.debug("%sSkipping list entry of %d fields.", " " * 2 * len(stack), length_field)
+                next_read_index = self._skip_fields(data_index, length_field)
+                if template is not None:
+                    template.skipped.append((data_index, next_read_index))
+
+                # The skipped entry reduces the number of fields of the enclosing list
+                parent, num_fields = stack.pop()
+                num_fields -= 1
+                if len(parent) < num_fields:
+                    stack.append((parent, num_fields))
+                    read_index = next_read_index
+                    continue
+                value = parent
+                if debug:
+                    LOGGER.debug("%sDone extracting list of %d fields.", " " * 2 * len(stack), num_fields)
+            elif type_field == TYPE_OCTET_STRING:
+                if debug:
+                    LOGGER.debug("%sFound octet string field of length %d bytes.", " " * 2 * len(stack), length_field)
+                value = data[data_index:next_read_index]
+            elif type_field == TYPE_UNSIGNED:
+                if debug:
+                    LOGGER.debug("%sFound unsigned integer field of %d bytes.", " " * 2 * len(stack), length_field)
+                value = int.from_bytes(view[data_index:next_read_index], byteorder="big", signed=False)
+            elif type_field == TYPE_INTEGER:
+                if debug:
+                    LOGGER.debug("%sFound signed integer field of %d bytes.", " " * 2 * len(stack), length_field)
+                value = int.from_bytes(view[data_index:next_read_index], byteorder="big", signed=True)
+            elif type_field == TYPE_BOOLEAN:
+                if debug:
+                    LOGGER.debug("%sFound binary field (1 byte).", " " * 2 * len(stack))
+                value = data[data_index] != 0x00
+            else:
+                LOGGER.error("%sUnknown type field 0x%x at index %d!", " " * 2 * len(stack), type_field, read_index)
+                value = None
+            if template is not None and type_field != TYPE_LIST:
+                template.add_leaf(
+                    data_index, next_read_index, type_field, tuple(len(parent) for parent, _ in stack), value
+                )
+            read_index = next_read_index
 
-        if length_field == 0:
-            length_field = 1
+            # Add the value to the enclosing list and close all complete lists
+            while stack:
+                parent, num_fields = stack[-1]
+                parent.append(value)
+                if len(parent) < num_fields:
+                    break
+                stack.pop()
+                value = parent
+                if debug:
+                    LOGGER.debug("%sDone extracting list of %d fields.", " " * 2 * len(stack), num_fields)
+            else:
+                return (read_index, value)
 
-        next_read_index = read_index + length_field
-        data_index = read_index + 1
+    def _decode_value(self, type_field: int, data_index: int, end_index: int) -> FieldType:
+        """Decode the value of a field that is not a list.
+
+        Args:
+            type_field (int): The type of the field.
+            data_index (int): The first byte of the value.
+            end_index (int):  The first byte after the value.
+
+        Return:
+            Returns the value converted to the corresponding python data type.
+        """
         if type_field == TYPE_OCTET_STRING:
-            LOGGER.debug("%sFound octet string field of length %d bytes.", " " * debug_log_indent, length_field)
-            return (next_read_index, self.data[data_index:next_read_index])
-        if type_field == TYPE_BOOLEAN:
-            LOGGER.debug("%sFound binary field (1 byte).", " " * debug_log_indent)
-            return (next_read_index, self.data[data_index] != 0x00)
-        if type_field == TYPE_INTEGER:
-            LOGGER.debug("%sFound signed integer field of %d bytes.", " " * debug_log_indent, length_field)
-            return (
-                next_read_index,
-                int.from_bytes(self.data[data_index:next_read_index], byteorder="big", signed=True),
-            )
+            return self.data[data_index:end_index]
         if type_field == TYPE_UNSIGNED:
-            LOGGER.debug("%sFound unsigned integer field of %d bytes.", " " * debug_log_indent, length_field)
-            return (
-                next_read_index,
-                int.from_bytes(self.data[data_index:next_read_index], byteorder="big", signed=False),
-            )
-        if type_field == TYPE_LIST:
-            LOGGER.debug("%sFound list of %d fields.", " " * debug_log_indent, length_field)
-            next_read_index = data_index
-            data = []
-            for _ in range(length_field):
-                next_read_index, field_data = self._get_next_field(
-                    next_read_index, debug_log_indent=debug_log_indent + 2
+            return int.from_bytes(self._view[data_index:end_index], byteorder="big", signed=False)
+        if type_field == TYPE_INTEGER:
+            return int.from_bytes(self._view[data_index:end_index], byteorder="big", signed=True)
+        if type_field == TYPE_BOOLEAN:
+            return self.data[data_index] != 0x00
+        return None
+
+    def _apply_template(self, template_cache: SmlTemplateCache) -> bool:
+        """Extract the messages using the cached template.
+
+        Args:
+            template_cache (obj): The SmlTemplateCache object.
+
+        Return:
+            Returns True if the file has the structure of the cached template
+            and the messages were extracted. Returns False if the file must
+            be parsed completely.
+        """
+        template = template_cache.template
+        data = self.data
+        if (
+            template is None
+            or len(data) != len(template.data)
+            or template.obis_codes != self._obis_codes
+            or LOGGER.isEnabledFor(logging.DEBUG)
+        ):
+            return False
+        for start_index, segment in template.segments:
+            if not data.startswith(segment, start_index):
+                return False
+        for data_index, end_index in template.skipped:
+            if self._skip_fields(data_index, 7) != end_index or not self._is_uninteresting_entry(data_index):
+                return False
+
+        # Decode the volatile leaves and collect the changed ones by message
+        changes: Dict[int, List[Tuple[FieldPath, FieldType]]] = {}
+        for idx in template.volatile_leaves:
+            data_index, end_index, type_field = template.leaf_spans[idx]
+            value = self._decode_value(type_field, data_index, end_index)
+            if value != template.leaf_values[idx]:
+                message_number, path = template.leaf_paths[idx]
+                changes.setdefault(message_number, []).append((path, value))
+
+        # Unchanged messages are shared with the template
+        for message_number, (start_index, end_index) in enumerate(template.message_spans):
+            self.message_offsets.append(start_index)
+            if message_number in changes:
+                raw_message = template.raw_messages[message_number]
+                if isinstance(raw_message, list):
+                    raw_message = _replace_fields(raw_message, changes[message_number])
+                message_obj = self._convert_message(start_index, end_index, raw_message, template.list_entries)[1]
+            else:
+                message_obj = template.messages[message_number]
+            if message_obj:
+                self.messages.append(message_obj)
+        template_cache.hits += 1
+        return True
+
+    def _convert_message(
+        self,
+        start_index: int,
+        end_index: int,
+        message: FieldType,
+        known_entries: Optional[Dict[int, SmlListEntry]] = None,
+    ) -> Tuple[bool, Optional[SmlMessageType]]:
+        """Check the CRC of a message and convert it into a message object.
+
+        Args:
+            start_index (int):     The first byte of the message.
+            end_index (int):       The first byte after the message.
+            message (obj):         The decoded fields of the message.
+            known_entries (dict):  Optional mapping of the id() of raw list entries to
+                                   already converted SmlListEntry objects.
+
+        Return:
+            Returns the tuple (valid, message_obj) with valid set to False if
+            the fields do not form a valid message. The message_obj is None
+            if the message is invalid, the message type is not supported or
+            the fields are not a list (e.g., the padding at the end of the file).
+        """
+        if not isinstance(message, list):
+            return (True, None)
+        sml_message = SmlRawMessageData.from_field_list(message)
+        if not sml_message:
+            return (False, None)
+        if sml_message.crc16:
+            crc_end_index = end_index - 4
+            calculated_crc = self._calculate_crc(start_index, crc_end_index)
+            if calculated_crc != sml_message.crc16:
+                LOGGER.error(
+                    "Calculated message CRC is 0x%04x, but provided is 0x%04x!",
+                    calculated_crc,
+                    sml_message.crc16,
                 )
-                data.append(field_data)
-            LOGGER.debug("%sDone extracting list of %d fields.", " " * debug_log_indent, length_field)
-            return (next_read_index, data)
+                return (False, None)
+        else:
+            LOGGER.warning("No message CRC provided!")
+        return (True, get_message(sml_message, known_entries))
 
-        LOGGER.error("%sUnknown type field 0x%x at index %d!", " " * debug_log_indent, type_field, read_index)
-        return (next_read_index, None)
+    def _extract_messages(self, template: Optional[SmlFileTemplate] = None) -> None:
+        """Extract the SML-messages from the data.
 
-    def _extract_messages(self) -> None:
-        """Extract the SML-messages from the data."""
-        LOGGER.debug("Extracting the messages from the SML File.")
+        Args:
+            template (obj): Optional SmlFileTemplate object to record the
+                            structure of the file.
+        """
+        debug = LOGGER.isEnabledFor(logging.DEBUG)
+        if debug:
+            LOGGER.debug("Extracting the messages from the SML File.")
         read_index = 8  # Skip escape sequence and version
         end_index = len(self.data) - 8
 
         while read_index < end_index:
             start_index = read_index
-            read_index, message = self._get_next_field(read_index)
-            LOGGER.debug("Extracted fields from buffer index %d to %d.", start_index, read_index)
-            if isinstance(message, list):
-                sml_message = SmlRawMessageData.from_field_list(message)
-                if sml_message:
-                    if sml_message.crc16:
-                        crc_end_index = read_index - 4
-                        calculated_crc = crc16_x25(self.data[start_index:crc_end_index])
-                        if calculated_crc != sml_message.crc16:
-                            LOGGER.error(
-                                "Calculated message CRC is 0x%04x, but provided is 0x%04x!",
-                                calculated_crc,
-                                sml_message.crc16,
-                            )
-                            continue
-                    else:
-                        LOGGER.warning("No message CRC provided!")
-                    message_obj = get_message(sml_message)
-                    if message_obj:
-                        self.messages.append(message_obj)
+            self.message_offsets.append(start_index)
+            read_index, message = self._get_next_field(read_index, debug, template)
+            if debug:
+                LOGGER.debug("Extracted fields from buffer index %d to %d.", start_index, read_index)
+            valid, message_obj = self._convert_message(start_index, read_index, message)
+            if template is not None:
+                template.add_message(start_index, read_index, message, valid, message_obj)
+            if message_obj:
+                self.messages.append(message_obj)
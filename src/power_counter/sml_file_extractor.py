@@ -1,6 +1,11 @@
 """
 SML file extractor.
 
+The extractor scans the incoming byte stream only once: While searching for
+the end of an SML file, it already removes the doubled escape sequences and
+updates the checksum of the SML file. The results are provided together with
+the raw bytes as :class:`SmlFrame` objects.
+
 Copyright:
     2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
 
@@ -17,6 +22,8 @@ Copyright:
 import logging
 from typing import List, Optional
 
+from .crc import Crc16X25
+
 # -----------------------------------------------------------------------------
 # Logger
 # -----------------------------------------------------------------------------
@@ -38,33 +45,221 @@ VERSION_SEQUENCE = b"\x01\x01\x01\x01"
 END_START = b"\x1a"
 
 
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+DEFAULT_BUFFER_SIZE = 4096
+DEFAULT_MAX_FRAME_SIZE = 16384
+DEFAULT_BUFFER_BUDGET = 32768
+
+# Minimum number of bytes to add to the checksum at once while the SML file is incomplete
+FEED_BLOCK_SIZE = 64
+
+
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
-def find_at_four_bytes(buffer: bytes, sequence: bytes, start: Optional[int]) -> int:
-    """Find a sequence starting only at multiple of 4 bytes."""
-    idx = buffer.find(sequence, start)
-    offset = idx % 4
+def find_at_four_bytes(
+    buffer: bytes, sequence: bytes, start: Optional[int], end: Optional[int] = None, base: int = 0
+) -> int:
+    """Find a sequence starting only at multiple of 4 bytes.
+
+    Args:
+        buffer (bytes):   The buffer to search in.
+        sequence (bytes): The sequence to search.
+        start (int):      The index to start the search at.
+        end (int):        The index to end the search at (exclusive).
+        base (int):       The index the multiples of 4 bytes are relative to.
+
+    Return:
+        Returns the index of the sequence or -1 if it was not found.
+    """
+    idx = buffer.find(sequence, start, end)
+    offset = (idx - base) % 4
     while (offset != 0) and (idx >= 0):
-        idx = buffer.find(sequence, idx + (4 - offset))  # start at next 4 bytes
-        offset = idx % 4
+        idx = buffer.find(sequence, idx + (4 - offset), end)  # start at next 4 bytes
+        offset = (idx - base) % 4
     return idx
 
 
 # -----------------------------------------------------------------------------
 # Classes
 # -----------------------------------------------------------------------------
-# pylint: disable=too-few-public-methods
+class SmlFrame(bytes):
+    """Raw data of an extracted SML file together with the results of the scan.
+
+    The object compares equal to the raw bytes, so it can be used wherever the
+    raw bytes are expected.
+
+    Attributes:
+        data (bytes):    The data with the doubled escape sequences removed.
+        crc (Crc16X25):  The checksum over ``data`` without the last two bytes
+                         (the provided checksum). Checkpoints are enabled to
+                         allow the calculation of the message checksums.
+    """
+
+    data: bytes
+    crc: Crc16X25
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
 class SmlFileExtractor:
-    """Extractor for SML-Files from byte stream."""
+    """Extractor for SML-Files from byte stream.
+
+    The pending bytes are kept in a preallocated buffer between a read and a
+    write index. Extracted SML files just advance the read index, the pending
+    bytes are only moved to the start of the buffer if there is no more space
+    left at its end.
 
-    def __init__(self):
-        """Construct a new SmlFileExtractor worker."""
+    The memory usage is bounded: While waiting for a start marker, only the
+    last bytes that might be the beginning of a start marker are kept. An SML
+    file exceeding the maximum frame size is dropped and the extractor searches
+    for the next start marker after the start of the dropped file. A start
+    marker at any position within an SML file, e.g., after a transmission
+    was interrupted, drops the truncated file and starts the next one. The
+    number of all dropped bytes is counted in :attr:`dropped_bytes`.
+
+    The search for escape sequences continues at the position the previous
+    call stopped at, so every byte of an SML file is checked only once, no
+    matter in how many chunks the file arrives.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        buffer_budget: int = DEFAULT_BUFFER_BUDGET,
+    ):
+        """Construct a new SmlFileExtractor worker.
+
+        Args:
+            buffer_size (int):    The initial size of the internal buffer. The buffer
+                                  grows if more bytes are pending.
+            max_frame_size (int): The maximum size of an SML file in bytes.
+            buffer_budget (int):  The maximum size of the internal buffer in bytes.
+                                  Must be larger than the maximum frame size.
+        """
         LOGGER.debug("Initialize SmlFileExtractor worker.")
+        if buffer_budget <= max_frame_size:
+            raise ValueError("The buffer budget must be larger than the maximum frame size!")
+        self.state = WAIT_FOR_START
+        self.max_frame_size = max_frame_size
+        self.buffer_budget = buffer_budget
+        self.dropped_bytes = 0
+        self._buffer = bytearray(min(buffer_size, buffer_budget))
+        self._view = memoryview(self._buffer)
+        self._read_index = 0
+        self._write_index = 0
+        self._reset_frame(0)
+
+    def reset(self) -> None:
+        """Discard all pending bytes, e.g., after the input was reconnected.
+
+        The discarded bytes are counted as dropped bytes.
+        """
+        self.dropped_bytes += self._write_index - self._read_index
         self.state = WAIT_FOR_START
-        self.buffer = b""
+        self._read_index = 0
+        self._write_index = 0
+        self._reset_frame(0)
 
-    def add_bytes(self, new_bytes: bytes) -> List[bytes]:
+    @property
+    def buffer(self) -> bytes:
+        """Get a copy of the pending bytes."""
+        return bytes(self._pending())
+
+    def _pending(self) -> memoryview:
+        """Get a view on the pending bytes."""
+        read_index = self._read_index
+        write_index = self._write_index
+        return self._view[read_index:write_index]
+
+    def _reset_frame(self, start_index: int) -> None:
+        """Reset the unescaped data and the checksum of the current SML file.
+
+        Args:
+            start_index (int): The index of the start of the SML file.
+        """
+        self._unescaped = bytearray()
+        self._crc = Crc16X25(checkpoints=True)
+        self._fed_index = start_index
+        self._scan_index = start_index + len(ESCAPE_SEQUENCE + VERSION_SEQUENCE)
+        self._resync_index = self._scan_index
+
+    def _append(self, new_bytes: bytes) -> None:
+        """Append the given bytes to the internal buffer.
+
+        Args:
+            new_bytes (bytes): The bytes to add.
+        """
+        num_bytes = len(new_bytes)
+        if self._write_index + num_bytes > len(self._buffer):
+            num_pending = self._write_index - self._read_index
+            if num_pending + num_bytes > len(self._buffer) // 2:
+                new_size = min(self.buffer_budget, max(2 * len(self._buffer), 2 * (num_pending + num_bytes)))
+                LOGGER.debug("Growing internal buffer to %d bytes.", new_size)
+                new_buffer = bytearray(new_size)
+                new_buffer[:num_pending] = self._pending()
+                self._buffer = new_buffer
+                self._view = memoryview(new_buffer)
+            else:
+                LOGGER.debug("Moving %d pending bytes to the start of the internal buffer.", num_pending)
+                self._buffer[:num_pending] = bytes(self._pending())
+            self._fed_index -= self._read_index
+            self._scan_index -= self._read_index
+            self._resync_index -= self._read_index
+            self._read_index = 0
+            self._write_index = num_pending
+
+        write_index = self._write_index
+        end_index = write_index + num_bytes
+        self._buffer[write_index:end_index] = new_bytes
+        self._write_index = end_index
+
+    def _feed(self, end_index: int) -> None:
+        """Add the buffer up to the given index to the unescaped data and the checksum.
+
+        Args:
+            end_index (int): The index of the first byte not to add.
+        """
+        start_index = self._fed_index
+        if end_index > start_index:
+            chunk = self._view[start_index:end_index]
+            self._unescaped += chunk
+            self._crc.update(chunk)
+            self._fed_index = end_index
+
+    def _get_frame(self, end_index: int) -> SmlFrame:
+        """Finish the current SML file that ends with the end marker right before the given index.
+
+        Args:
+            end_index (int): The index of the first byte after the end marker.
+
+        Return:
+            Returns the SmlFrame object.
+        """
+        # The last two bytes contain the checksum, so they are not part of the checksum
+        crc_index = end_index - 2
+        self._feed(crc_index)
+        self._unescaped += self._view[crc_index:end_index]
+        read_index = self._read_index
+        frame = SmlFrame(self._view[read_index:end_index])
+        frame.data = bytes(self._unescaped)
+        frame.crc = self._crc
+        self._reset_frame(end_index)
+        return frame
+
+    def _drop(self, end_index: int) -> None:
+        """Drop all pending bytes before the given index.
+
+        Args:
+            end_index (int): The index of the first byte to keep.
+        """
+        if end_index > self._read_index:
+            self.dropped_bytes += end_index - self._read_index
+            self._read_index = end_index
+
+    def add_bytes(self, new_bytes: bytes) -> List[SmlFrame]:
         """Add the given bytes to the internal buffer and check for complete SML-files.
 
         Args:
@@ -74,57 +269,122 @@ class SmlFileExtractor:
             Returns a list of extracted SML files. This list might be empty.
         """
         LOGGER.debug("Adding %d bytes to the internal buffer.", len(new_bytes))
-        self.buffer += new_bytes
-        sml_files: List[bytes] = []
+        sml_files: List[SmlFrame] = []
+        # Large inputs are processed in steps to keep the buffer within its budget
+        step = self.buffer_budget - self.max_frame_size
+        if len(new_bytes) <= step:
+            self._append(new_bytes)
+            self._extract(sml_files)
+        else:
+            new_bytes_view = memoryview(new_bytes)
+            for start in range(0, len(new_bytes_view), step):
+                end = start + step
+                self._append(new_bytes_view[start:end])
+                self._extract(sml_files)
+
+        if self._read_index == self._write_index:
+            self._read_index = 0
+            self._write_index = 0
+            self._fed_index = 0
+            self._scan_index = 0
+            self._resync_index = 0
+
+        LOGGER.debug(
+            "Returning %d SML messages encoded as bytes. %d bytes remain in the internal buffer.",
+            len(sml_files),
+            self._write_index - self._read_index,
+        )
+        return sml_files
+
+    def _extract(self, sml_files: List[SmlFrame]) -> None:
+        """Extract all complete SML-files from the internal buffer.
+
+        Args:
+            sml_files (list): The list to append the extracted SML files to.
+        """
+        buffer = self._buffer
         sml_extracted = True
 
         while sml_extracted:
             sml_extracted = False
 
             if self.state == WAIT_FOR_START:
-                start_index = self.buffer.find(ESCAPE_SEQUENCE + VERSION_SEQUENCE)
+                start_index = buffer.find(ESCAPE_SEQUENCE + VERSION_SEQUENCE, self._read_index, self._write_index)
                 if start_index >= 0:
-                    self.buffer = self.buffer[start_index:]
-                    self.state = WAIT_FOR_END
                     LOGGER.debug(
-                        "Found start of a message at index %d. Shrinking buffer to start with the start marker.",
-                        start_index,
+                        "Found start of a message at index %d. Dropping all bytes before the start marker.",
+                        start_index - self._read_index,
                     )
+                    self._drop(start_index)
+                    self._reset_frame(start_index)
+                    self.state = WAIT_FOR_END
+                else:
+                    # Keep only the bytes that might be the beginning of a start marker
+                    self._drop(self._write_index - len(ESCAPE_SEQUENCE + VERSION_SEQUENCE) + 1)
 
             if self.state == WAIT_FOR_END:
-                cand_idx = find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, 8)
+                frame_index = self._read_index
+                write_index = self._write_index
+                # A start marker at any position ends a truncated SML file. It is searched
+                # unaligned, as the new SML file is not aligned to the truncated one.
+                restart_index = buffer.find(ESCAPE_SEQUENCE + VERSION_SEQUENCE, self._resync_index, write_index)
+                if restart_index < 0:
+                    self._resync_index = max(self._resync_index, write_index - 7)
+                    scan_end = write_index
+                else:
+                    scan_end = restart_index
+                cand_idx = find_at_four_bytes(buffer, ESCAPE_SEQUENCE, self._scan_index, scan_end, frame_index)
                 # Ensure the full end marker is part of the buffer
-                while (cand_idx >= 0) and ((cand_idx + 8) <= len(self.buffer)):
-                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE):
-                        LOGGER.debug("Skipping double escape sequence found at index %d.", cand_idx)
-                        cand_idx = self.buffer.find(ESCAPE_SEQUENCE, cand_idx + 8)
+                while (cand_idx >= 0) and ((cand_idx + 8) <= scan_end):
+                    if buffer.startswith(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE, cand_idx):
+                        LOGGER.debug("Skipping double escape sequence found at index %d.", cand_idx - frame_index)
+                        self._feed(cand_idx + 4)
+                        self._fed_index = max(self._fed_index, cand_idx + 8)
+                        cand_idx = find_at_four_bytes(buffer, ESCAPE_SEQUENCE, cand_idx + 8, scan_end, frame_index)
                         continue
-                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + END_START):
+                    if buffer.startswith(ESCAPE_SEQUENCE + END_START, cand_idx):
                         LOGGER.debug(
-                            "End marker found at index %d. Extracting message of %d bytes.", cand_idx, cand_idx + 8
+                            "End marker found at index %d. Extracting message of %d bytes.",
+                            cand_idx - frame_index,
+                            cand_idx + 8 - frame_index,
                         )
                         after_end_idx = cand_idx + 8
-                        sml_files.append(self.buffer[:after_end_idx])
-                        self.buffer = self.buffer[after_end_idx:]
+                        sml_files.append(self._get_frame(after_end_idx))
+                        self._read_index = after_end_idx
                         self.state = WAIT_FOR_START
                         sml_extracted = True
                         break
-                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + VERSION_SEQUENCE):
-                        LOGGER.error("Expected end marker but found message start marker at index %d!", cand_idx)
-                        self.buffer = self.buffer[cand_idx:]
-                        cand_idx = find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, 8)
-                        continue
 
                     LOGGER.error(
                         "Found escape sequence at index %d that is not followed "
                         "by another escape sequence, an end marker or a start marker!",
-                        cand_idx,
+                        cand_idx - frame_index,
                     )
-                    cand_idx = find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, cand_idx + 4)
+                    cand_idx = find_at_four_bytes(buffer, ESCAPE_SEQUENCE, cand_idx + 4, scan_end, frame_index)
 
-        LOGGER.debug(
-            "Returning %d SML messages encoded as bytes. %d bytes remain in the internal buffer.",
-            len(sml_files),
-            len(self.buffer),
-        )
-        return sml_files
+                if not sml_extracted and restart_index >= 0:
+                    LOGGER.error(
+                        "Expected end marker but found message start marker at index %d!", restart_index - frame_index
+                    )
+                    self._drop(restart_index)
+                    self._reset_frame(restart_index)
+                    sml_extracted = True
+                    continue
+
+                # Everything before a possible escape sequence is data of the SML file
+                # and the next search continues at the possible escape sequence
+                if not sml_extracted:
+                    if cand_idx < 0:
+                        cand_idx = write_index - (write_index - frame_index) % 4
+                    if cand_idx - self._fed_index >= FEED_BLOCK_SIZE:
+                        self._feed(cand_idx)
+                    self._scan_index = cand_idx
+
+                if not sml_extracted and write_index - frame_index > self.max_frame_size:
+                    LOGGER.error(
+                        "SML file exceeds the maximum size of %d bytes! Searching for the next start marker.",
+                        self.max_frame_size,
+                    )
+                    self._drop(frame_index + 1)
+                    self.state = WAIT_FOR_START
+                    sml_extracted = True
@@ -17,8 +17,9 @@ Copyright:
 import logging
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, List, Optional, Tuple, Union, get_args, get_origin
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union, get_args, get_origin
 
+from .obis import get_obis_id, get_unit_name
 from .sml_types import FieldType
 
 # -----------------------------------------------------------------------------
@@ -31,9 +32,23 @@ LOGGER = logging.getLogger()
 # Types
 # -----------------------------------------------------------------------------
 TimeType = Union[int, datetime]
+# Raw SML_Time field: Either a list of the time type and the value or directly the seconds
+RawTimeType = Union[int, List[FieldType]]
 # Elements: Name, Status, Time, Unit, Scaler, Value, ValueSignature
 ListEntryType = Tuple[str, Optional[int], TimeType, str, int, int, bytes]
 SmlMessageType = Union["SmlMessageOpenResponse", "SmlMessageCloseResponse", "SmlMessageGetListResponse"]
+# Compatible python types of the message fields for each field of a dataclass
+SchemaType = Tuple[FrozenSet[type], ...]
+# Decoder taking the list of fields and the optional mapping of known list entries
+DecoderType = Callable[..., Any]
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+MESSAGE_TAG_OPEN_RESPONSE = 0x00000101
+MESSAGE_TAG_CLOSE_RESPONSE = 0x00000201
+MESSAGE_TAG_GET_LIST_RESPONSE = 0x00000701
 
 
 # -----------------------------------------------------------------------------
@@ -72,20 +87,31 @@ def _convert_time(time_field: FieldType) -> Optional[TimeType]:
     return None
 
 
-# -----------------------------------------------------------------------------
-# Helper Functions for Messages in Dataclasses
-# -----------------------------------------------------------------------------
-def _is_sml_optional_none(field: FieldType) -> bool:
-    """Check the given (optional) field whether it is None.
+def _convert_list_entries(list_field: List[FieldType], known_entries: Optional[Dict[int, Any]]) -> List[Any]:
+    """Convert the list entries of a GetListResponse message.
 
     Args:
-        field (FieldType): The optional field.
+        list_field (list):     The list of list entries.
+        known_entries (dict):  Optional mapping of the id() of raw list entries to
+                               already converted SmlListEntry objects.
     Return:
-        Returns True if the optional field is marked as None.
+        Returns the list of SmlListEntry objects. Entries that do not match the
+        definition are omitted.
     """
-    return isinstance(field, bytes) and len(field) == 0
+    decode_list_entry = DECODERS[SmlListEntry]
+    list_entries = []
+    for item in list_field:
+        list_entry = known_entries.get(id(item)) if known_entries else None
+        if list_entry is None:
+            list_entry = decode_list_entry(item)
+        if list_entry:
+            list_entries.append(list_entry)
+    return list_entries
 
 
+# -----------------------------------------------------------------------------
+# Helper Functions for Messages in Dataclasses
+# -----------------------------------------------------------------------------
 def _get_matching_msg_types(dataclass_type):
     """Determine the compatible types of the message fields for a given dataclass type.
 
@@ -120,43 +146,46 @@ def _get_matching_msg_types(dataclass_type):
     return set()
 
 
-def _input_matches_fields(cls, data: FieldType) -> bool:
-    """Check the input to match the dataclass definition.
+def _compile_schema(cls) -> SchemaType:
+    """Determine the compatible types of the message fields for all fields of a dataclass.
+
+    Args:
+        cls (class) - The dataclass.
+    Returns:
+        Returns a tuple with a frozenset of compatible python types for each field.
+    """
+    return tuple(frozenset(_get_matching_msg_types(field_obj.type)) for field_obj in cls.__dataclass_fields__.values())
+
+
+def _log_mismatches(cls, data: FieldType, schema: SchemaType) -> None:
+    """Log the reasons why the input does not match the dataclass definition.
 
     Args:
         cls (class)      - The dataclass.
         data (FieldType) - The input data.
-    Returns:
-        Returns True if the input matches.
+        schema (tuple)   - The compiled schema of the dataclass.
     """
-    if isinstance(data, list):
-        if len(data) == len(cls.__dataclass_fields__):
-            mismatches = []
-            for idx, field_obj in enumerate(cls.__dataclass_fields__.values()):
-                matching_types = _get_matching_msg_types(field_obj.type)
-                if type(data[idx]) not in matching_types:
-                    mismatches.append(
-                        f"Data field {field_obj.name:<20} (#{idx}) has type {str(type(data[idx])):<20} "
-                        f"but spec expects one of {matching_types}"
-                    )
-            if mismatches:
-                LOGGER.error(
-                    "Data for %s does not match field definition. The following mismatches were identified:",
-                    cls.__name__,
-                )
-                for mismatch in mismatches:
-                    LOGGER.error(" - %s", mismatch)
-                return False
-            return True
+    if not isinstance(data, list):
+        LOGGER.error("Data for %s must be of type list, but the given input type was %s.", cls.__name__, type(data))
+    elif len(data) != len(schema):
         LOGGER.error(
             "Data for %s must be encoded as a list of %d elements, but data consists of %d elements.",
             cls.__name__,
-            len(cls.__dataclass_fields__),
+            len(schema),
             len(data),
         )
     else:
-        LOGGER.error("Data for %s must be of type list, but the given input type was %s.", cls.__name__, type(data))
-    return False
+        LOGGER.error(
+            "Data for %s does not match field definition. The following mismatches were identified:",
+            cls.__name__,
+        )
+        for idx, (field_obj, matching_types) in enumerate(zip(cls.__dataclass_fields__.values(), schema)):
+            if type(data[idx]) not in matching_types:
+                LOGGER.error(
+                    " - %s",
+                    f"Data field {field_obj.name:<20} (#{idx}) has type {str(type(data[idx])):<20} "
+                    f"but spec expects one of {set(matching_types)}",
+                )
 
 
 # -----------------------------------------------------------------------------
@@ -166,6 +195,7 @@ def _input_matches_fields(cls, data: FieldType) -> bool:
 class SmlRawMessageData:
     """Raw message data extracted from an SML file."""
 
+    __slots__ = ("transaction_id", "group_number", "abort_on_error", "message_body", "crc16", "end_of_sml_msg")
     transaction_id: bytes
     group_number: int
     abort_on_error: int
@@ -182,23 +212,19 @@ class SmlRawMessageData:
         Returns:
             Returns a new SmlRawMessageData object or None if the fields do not match.
         """
-        if _input_matches_fields(SmlRawMessageData, message):
-            return SmlRawMessageData(
-                message[0], message[1], message[2], message[3], message[4], message[5]  # type: ignore
-            )
-
-        return None
+        return DECODERS[SmlRawMessageData](message)
 
 
 @dataclass
 class SmlMessageOpenResponse:
     """Representation of the open response message."""
 
+    __slots__ = ("codepage", "client_id", "req_file_id", "server_id", "ref_time_raw", "sml_version")
     codepage: Optional[str]
     client_id: Optional[bytes]
     req_file_id: bytes
     server_id: bytes
-    ref_time: Optional[TimeType]
+    ref_time_raw: Optional[RawTimeType]
     sml_version: Union[int, bytes]  # Spec requires int, but some implementations use bytes
 
     def __str__(self) -> str:
@@ -215,6 +241,11 @@ class SmlMessageOpenResponse:
         ret += f"SmlVersion={self.sml_version!r}"
         return ret
 
+    @property
+    def ref_time(self) -> Optional[TimeType]:
+        """Return the reference time as seconds or as a datetime."""
+        return None if self.ref_time_raw is None else _convert_time(self.ref_time_raw)
+
     @staticmethod
     def from_raw_message(message: SmlRawMessageData) -> Optional["SmlMessageOpenResponse"]:
         """Convert the given SmlRawMessageData into a SmlMessageOpenResponse object.
@@ -224,30 +255,14 @@ class SmlMessageOpenResponse:
         Returns:
             Returns a new SmlMessageOpenResponse object or None if the fields do not match.
         """
-        if _input_matches_fields(SmlMessageOpenResponse, message.message_body[1]):
-            fields = message.message_body[1]
-            assert isinstance(fields, list)
-            if fields[0]:
-                assert isinstance(fields[0], bytes)
-                codepage = fields[0].decode(encoding="iso-8859-15", errors="ignore")
-            else:
-                codepage = "iso-8859-15"
-            # Note: Type checking already done in _input_matches_fields!
-            return SmlMessageOpenResponse(
-                codepage=codepage,
-                client_id=None if _is_sml_optional_none(fields[1]) else fields[1],  # type: ignore
-                req_file_id=fields[2],  # type: ignore
-                server_id=fields[3],  # type: ignore
-                ref_time=None if _is_sml_optional_none(fields[4]) else _convert_time(fields[4]),  # type: ignore
-                sml_version=1 if _is_sml_optional_none(fields[5]) else int(fields[5]),  # type: ignore
-            )
-        return None
+        return DECODERS[SmlMessageOpenResponse](message.message_body[1])
 
 
 @dataclass
 class SmlMessageCloseResponse:
     """Representation of the close response message."""
 
+    __slots__ = ("global_signature",)
     global_signature: Optional[bytes]
 
     def __str__(self) -> str:
@@ -266,27 +281,31 @@ class SmlMessageCloseResponse:
         Returns:
             Returns a new SmlMessageCloseResponse object or None if the fields do not match.
         """
-        if _input_matches_fields(SmlMessageCloseResponse, message.message_body[1]):
-            fields = message.message_body[1]
-            return SmlMessageCloseResponse(
-                global_signature=None if _is_sml_optional_none(fields[0]) else fields[0]  # type: ignore
-            )
-
-        return None
+        return DECODERS[SmlMessageCloseResponse](message.message_body[1])
 
 
 @dataclass
 class SmlListEntry:
-    """Element of the SmlMessageGetListResponse message."""
+    """Element of the SmlMessageGetListResponse message.
+
+    The object name, the unit code and the time are stored as received. The
+    unit string is determined on construction, the OBIS ID string and the
+    time are converted on access.
+    """
 
-    obj_name: str
+    __slots__ = ("obj_code", "status", "val_time_raw", "unit_raw", "scaler", "value", "value_signature", "unit")
+    obj_code: bytes
     status: Optional[int]
-    val_time: Optional[TimeType]
+    val_time_raw: Optional[RawTimeType]
     unit_raw: Optional[int]
     scaler: Optional[int]
     value: Union[int, bytes]
     value_signature: Optional[bytes]
 
+    def __post_init__(self) -> None:
+        """Determine the unit string."""
+        self.unit: Optional[str] = get_unit_name(self.unit_raw)
+
     def __str__(self) -> str:
         """Return the string representation of this object."""
         ret = f"ObjName={self.obj_name}, "
@@ -304,15 +323,14 @@ class SmlListEntry:
         return ret
 
     @property
-    def unit(self) -> Optional[str]:
-        """Return the unit as a string."""
-        if self.unit_raw is None:
-            return None
-        if self.unit_raw == 30:
-            return "Wh"
-        if self.unit_raw == 27:
-            return "W"
-        return str(self.unit_raw)
+    def obj_name(self) -> str:
+        """Return the object name as OBIS ID string."""
+        return get_obis_id(self.obj_code)
+
+    @property
+    def val_time(self) -> Optional[TimeType]:
+        """Return the time of the value as seconds or as a datetime."""
+        return None if self.val_time_raw is None else _convert_time(self.val_time_raw)
 
     @staticmethod
     def from_fields(list_item: FieldType) -> Optional["SmlListEntry"]:
@@ -323,35 +341,29 @@ class SmlListEntry:
         Returns:
             Returns a new SmlListEntry object or None if the fields do not match.
         """
-        if _input_matches_fields(SmlListEntry, list_item):
-            if len(list_item[0]) == 6:  # type: ignore
-                obj = list_item[0]  # type: ignore
-                obj_name = f"{obj[0]}-{obj[1]}:{obj[2]}.{obj[3]}.{obj[4]}*{obj[5]}"  # type: ignore
-            else:
-                obj_name = str(list_item[0])  # type: ignore
-            return SmlListEntry(
-                obj_name=obj_name,
-                status=None if _is_sml_optional_none(list_item[1]) else list_item[1],  # type: ignore
-                val_time=(None if _is_sml_optional_none(list_item[2]) else _convert_time(list_item[2])),  # type: ignore
-                unit_raw=None if _is_sml_optional_none(list_item[3]) else list_item[3],  # type: ignore
-                scaler=None if _is_sml_optional_none(list_item[4]) else list_item[4],  # type: ignore
-                value=list_item[5],  # type: ignore
-                value_signature=None if _is_sml_optional_none(list_item[6]) else list_item[6],  # type: ignore
-            )
-        return None
+        return DECODERS[SmlListEntry](list_item)
 
 
 @dataclass
 class SmlMessageGetListResponse:
-    """Representation of the close response message."""
-
+    """Representation of the get list response message."""
+
+    __slots__ = (
+        "client_id",
+        "server_id",
+        "list_name",
+        "act_sensor_time_raw",
+        "list_entries",
+        "list_signature",
+        "act_gateway_time_raw",
+    )
     client_id: Optional[bytes]
     server_id: bytes
     list_name: Optional[bytes]
-    act_sensor_time: Optional[TimeType]
+    act_sensor_time_raw: Optional[RawTimeType]
     list_entries: List[SmlListEntry]
     list_signature: Optional[bytes]
-    act_gateway_time: Optional[TimeType]
+    act_gateway_time_raw: Optional[RawTimeType]
 
     def __str__(self) -> str:
         """Return the string representation of this object."""
@@ -371,43 +383,141 @@ class SmlMessageGetListResponse:
             ret += "\n" + str(item)
         return ret
 
-    # pylint: disable=too-many-branches
+    @property
+    def act_sensor_time(self) -> Optional[TimeType]:
+        """Return the sensor time as seconds or as a datetime."""
+        return None if self.act_sensor_time_raw is None else _convert_time(self.act_sensor_time_raw)
+
+    @property
+    def act_gateway_time(self) -> Optional[TimeType]:
+        """Return the gateway time as seconds or as a datetime."""
+        return None if self.act_gateway_time_raw is None else _convert_time(self.act_gateway_time_raw)
+
     @staticmethod
-    def from_raw_message(message: SmlRawMessageData) -> Optional["SmlMessageGetListResponse"]:
+    def from_raw_message(
+        message: SmlRawMessageData, known_entries: Optional[Dict[int, SmlListEntry]] = None
+    ) -> Optional["SmlMessageGetListResponse"]:
         """Convert the given SmlRawMessageData into a SmlMessageGetListResponse object.
 
         Args:
             message (SmlRawMessageData): Raw message object.
+            known_entries (dict):        Optional mapping of the id() of raw list entries to
+                                         already converted SmlListEntry objects.
         Returns:
             Returns a new SmlMessageGetListResponse object or None if the fields do not match.
         """
-        if _input_matches_fields(SmlMessageGetListResponse, message.message_body[1]):
-            fields = message.message_body[1]
-            list_entries = []
-            for item in fields[4]:  # type: ignore
-                list_entry = SmlListEntry.from_fields(item)
-                if list_entry:
-                    list_entries.append(list_entry)
-            return SmlMessageGetListResponse(
-                client_id=None if _is_sml_optional_none(fields[0]) else fields[0],  # type: ignore
-                server_id=fields[1],  # type: ignore
-                list_name=None if _is_sml_optional_none(fields[2]) else fields[2],  # type: ignore
-                act_sensor_time=None if _is_sml_optional_none(fields[3]) else _convert_time(fields[3]),  # type: ignore
-                list_entries=list_entries,
-                list_signature=None if _is_sml_optional_none(fields[5]) else fields[5],  # type: ignore
-                act_gateway_time=None if _is_sml_optional_none(fields[6]) else _convert_time(fields[6]),  # type: ignore
-            )
-        return None
+        return DECODERS[SmlMessageGetListResponse](message.message_body[1], known_entries)
+
+
+# -----------------------------------------------------------------------------
+# Decoder Generation
+# -----------------------------------------------------------------------------
+# Expressions converting a message field into the value of a dataclass field that
+# can't be derived from the type of the dataclass field. The placeholder {field}
+# is replaced by the name of the variable holding the message field.
+FIELD_CONVERSIONS: Dict[Tuple[type, str], str] = {
+    (SmlMessageOpenResponse, "codepage"): (
+        '{field}.decode(encoding="iso-8859-15", errors="ignore") if {field} else "iso-8859-15"'
+    ),
+    (SmlMessageOpenResponse, "sml_version"): '1 if {field} == b"" else int({field})',
+    (SmlMessageGetListResponse, "list_entries"): "_convert_list_entries({field}, known_entries)",
+}
+
+
+def _get_conversion(cls, field_obj, field: str) -> str:
+    """Get the expression converting a message field into the value of a dataclass field.
+
+    Args:
+        cls (class)      - The dataclass.
+        field_obj (obj)  - The dataclass field.
+        field (str)      - The name of the variable holding the message field.
+    Returns:
+        Returns the python expression.
+    """
+    conversion = FIELD_CONVERSIONS.get((cls, field_obj.name))
+    if conversion is not None:
+        return conversion.format(field=field)
+    field_type = field_obj.type
+    sub_types = get_args(field_type) if get_origin(field_type) is Union else (field_type,)
+    expression = field
+    if all(time_subtype in sub_types for time_subtype in get_args(TimeType)):
+        expression = f"_convert_time({field})"
+    if type(None) in sub_types:
+        # An optional field is marked as None by an empty octet string
+        expression = f'None if {field} == b"" else {expression}'
+    return expression
+
+
+def _generate_decoder(cls) -> DecoderType:
+    """Generate a function that validates a list of message fields and converts it into a dataclass object.
+
+    Args:
+        cls (class) - The dataclass.
+    Returns:
+        Returns the decoder function taking the list of fields and the optional
+        mapping of known list entries. It returns the new object or None if the
+        fields do not match the definition.
+    """
+    field_objs = list(cls.__dataclass_fields__.values())
+    schema = COMPILED_SCHEMAS[cls]
+    names = [f"field_{idx}" for idx in range(len(field_objs))]
+    checks = " and ".join(f"type({name}) in types_{idx}" for idx, name in enumerate(names))
+    values = ", ".join(_get_conversion(cls, field_obj, name) for field_obj, name in zip(field_objs, names))
+    function_name = f"decode_{cls.__name__}"
+    source = "\n".join(
+        [
+            f"def {function_name}(fields, known_entries=None):",
+            f"    if isinstance(fields, list) and len(fields) == {len(names)}:",
+            f"        {', '.join(names)}, = fields",
+            f"        if {checks}:",
+            f"            return cls({values})",
+            "    _log_mismatches(cls, fields, schema)",
+            "    return None",
+        ]
+    )
+    namespace: Dict[str, Any] = {
+        "cls": cls,
+        "schema": schema,
+        "_log_mismatches": _log_mismatches,
+        "_convert_time": _convert_time,
+        "_convert_list_entries": _convert_list_entries,
+    }
+    namespace.update((f"types_{idx}", matching_types) for idx, matching_types in enumerate(schema))
+    exec(compile(source, f"<decoder of {cls.__name__}>", "exec"), namespace)  # pylint: disable=exec-used
+    return namespace[function_name]
+
+
+COMPILED_SCHEMAS: Dict[type, SchemaType] = {
+    cls: _compile_schema(cls)
+    for cls in (
+        SmlRawMessageData,
+        SmlMessageOpenResponse,
+        SmlMessageCloseResponse,
+        SmlListEntry,
+        SmlMessageGetListResponse,
+    )
+}
+DECODERS: Dict[type, DecoderType] = {cls: _generate_decoder(cls) for cls in COMPILED_SCHEMAS}
+MESSAGE_DECODERS: Dict[int, DecoderType] = {
+    MESSAGE_TAG_OPEN_RESPONSE: DECODERS[SmlMessageOpenResponse],
+    MESSAGE_TAG_CLOSE_RESPONSE: DECODERS[SmlMessageCloseResponse],
+    MESSAGE_TAG_GET_LIST_RESPONSE: DECODERS[SmlMessageGetListResponse],
+}
 
 
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
-def get_message(raw_message: SmlRawMessageData) -> Optional[SmlMessageType]:
+def get_message(
+    raw_message: SmlRawMessageData, known_entries: Optional[Dict[int, SmlListEntry]] = None
+) -> Optional[SmlMessageType]:
     """Get a new SmlMessage object or None if the message type is unknown.
 
     Args:
         raw_message (SmlRawMessageData): An extracted raw SML message data object.
+        known_entries (dict):            Optional mapping of the id() of raw list entries
+                                         to already converted SmlListEntry objects. The
+                                         raw list entries must be kept alive by the caller.
 
     Return:
         Returns the corresponding SmlMessage object or None if the message
@@ -415,10 +525,7 @@ def get_message(raw_message: SmlRawMessageData) -> Optional[SmlMessageType]:
     """
     if len(raw_message.message_body) > 1:
         message_type = raw_message.message_body[0]
-        if message_type == 0x00000101:
-            return SmlMessageOpenResponse.from_raw_message(raw_message)
-        if message_type == 0x00000201:
-            return SmlMessageCloseResponse.from_raw_message(raw_message)
-        if message_type == 0x00000701:
-            return SmlMessageGetListResponse.from_raw_message(raw_message)
+        decoder = MESSAGE_DECODERS.get(message_type) if isinstance(message_type, int) else None
+        if decoder is not None:
+            return decoder(raw_message.message_body[1], known_entries)
     return None
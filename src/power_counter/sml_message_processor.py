@@ -14,12 +14,19 @@ Copyright:
 # -----------------------------------------------------------------------------
 # Module Import
 # -----------------------------------------------------------------------------
+import asyncio
 import logging
-from typing import Any, BinaryIO, Callable, Optional, Union
+import time
+from collections import OrderedDict
+from typing import AbstractSet, Any, AsyncIterator, BinaryIO, Callable, Dict, NamedTuple, Optional, Tuple, Union
 
 import serial
 
-from .sml_file import SmlFile
+from .input_source import InputSource
+from .obis import UNIT_W, UNIT_WH
+from .pipeline import DEFAULT_QUEUE_SIZE, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, SmlPipeline
+from .serial_ifc import FILE_READ_SIZE, get_read_function
+from .sml_file import SmlFile, SmlTemplateCache
 from .sml_file_extractor import SmlFileExtractor
 from .sml_message import SmlMessageGetListResponse
 
@@ -29,63 +36,396 @@ from .sml_message import SmlMessageGetListResponse
 LOGGER = logging.getLogger()
 
 
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+DEFAULT_FILE_CACHE_SIZE = 16
+
+# Interval in seconds to log the statistics of the pipeline queues while running
+STATISTICS_INTERVAL = 60.0
+
+# Scale factors of all scalers (signed 8 bit integers)
+SCALE_FACTORS: Dict[Optional[int], Union[int, float]] = {scaler: pow(10, scaler) for scaler in range(-128, 128)}
+SCALE_FACTORS[None] = 1
+
+
 # -----------------------------------------------------------------------------
 # Types
 # -----------------------------------------------------------------------------
 SmlFileCallbackType = Callable[[bytes, SmlFile], None]
 ObisDataCallbackType = Callable[[str, float, str], None]
+ReadingBatchCallbackType = Callable[["SmlReadingBatch"], None]
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class SmlReading(NamedTuple):
+    """Scaled energy or power reading of an SML file or a statistic of the readings of a window."""
+
+    obis_code: bytes
+    obj_name: str
+    value: float
+    unit: str
+    statistic: str = ""
+
+
+class SmlReadingBatch(NamedTuple):
+    """All readings of an SML file together with the time the file was received and the label of the meter."""
+
+    timestamp: float
+    monotonic: float
+    readings: Tuple[SmlReading, ...]
+    label: str = ""
+
+
+class SmlFileCache:
+    """Least recently used cache of processed SML files keyed by the raw data of the files.
+
+    Meters often send exactly the same SML file if nothing has changed. The
+    cache avoids parsing such files again. The cached results depend on the
+    set of interesting object names, so use a cache only with one set.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_FILE_CACHE_SIZE) -> None:
+        """Construct a new, empty SmlFileCache object.
+
+        Args:
+            max_size (int): The maximum number of cached SML files.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[SmlFile, Tuple[SmlReading, ...]]]" = OrderedDict()
+
+    def get(self, file_data: bytes) -> Optional[Tuple[SmlFile, Tuple[SmlReading, ...]]]:
+        """Get the cached SmlFile object and readings of an SML file.
+
+        Args:
+            file_data (bytes): The raw data of the SML file.
+
+        Return:
+            Returns the tuple (sml_file, readings) or None if the file is not cached.
+        """
+        entry = self._entries.get(file_data)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(file_data)
+        return entry
+
+    def add(self, file_data: bytes, sml_file: SmlFile, readings: Tuple[SmlReading, ...]) -> None:
+        """Add the results of processing an SML file to the cache.
+
+        Args:
+            file_data (bytes): The raw data of the SML file.
+            sml_file (obj):    The SmlFile object.
+            readings (tuple):  The readings of the SML file.
+        """
+        self._entries[bytes(file_data)] = (sml_file, readings)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class LatencyStatistics:
+    """Statistics of the latency between receiving the end of an SML file and calling the callbacks.
+
+    The latency is measured from the return of the read call that delivered
+    the end of the file until all callbacks of the file returned.
+    """
+
+    def __init__(self) -> None:
+        """Construct a new, empty LatencyStatistics object."""
+        self.count = 0
+        self.total = 0.0
+        self.minimum = 0.0
+        self.maximum = 0.0
+
+    def add(self, latency: float) -> None:
+        """Add the latency of a processed SML file.
+
+        Args:
+            latency (float): The latency in seconds.
+        """
+        if self.count == 0 or latency < self.minimum:
+            self.minimum = latency
+        if latency > self.maximum:
+            self.maximum = latency
+        self.count += 1
+        self.total += latency
+
+    @property
+    def mean(self) -> float:
+        """Get the mean latency in seconds or 0.0 if no latency was recorded."""
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        """Get the statistics as a human readable string."""
+        return (
+            f"{self.count} SML files with a latency of min {self.minimum * 1000.0:.3f} ms, "
+            f"mean {self.mean * 1000.0:.3f} ms, max {self.maximum * 1000.0:.3f} ms"
+        )
 
 
 # -----------------------------------------------------------------------------
 # Functions
 # -----------------------------------------------------------------------------
-def process_sml_file(
-    file_data: bytes, sml_file_cb: Optional[SmlFileCallbackType], obis_data_cb: Optional[ObisDataCallbackType]
+def get_readings(sml_file: SmlFile) -> Tuple[SmlReading, ...]:
+    """Get the scaled energy and power readings of an SML file.
+
+    Args:
+        sml_file (obj): The SmlFile object.
+
+    Return:
+        Returns a tuple of SmlReading objects.
+    """
+    readings = []
+    for message in sml_file.messages:
+        if isinstance(message, SmlMessageGetListResponse):
+            for item in message.list_entries:
+                if item.unit_raw in (UNIT_WH, UNIT_W):
+                    scale_factor = SCALE_FACTORS.get(item.scaler)
+                    if scale_factor is None:
+                        scale_factor = pow(10, item.scaler)  # type: ignore
+                    scaled_value = float(item.value) * scale_factor  # type: ignore
+                    readings.append(SmlReading(item.obj_code, item.obj_name, scaled_value, item.unit))  # type: ignore
+    return tuple(readings)
+
+
+def parse_sml_file(
+    file_data: bytes,
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+    template_cache: Optional[SmlTemplateCache] = None,
+    file_cache: Optional[SmlFileCache] = None,
+) -> Tuple[SmlFile, Tuple[SmlReading, ...]]:
+    """Parse a SML file and get its readings.
+
+    Args:
+        file_data (bytes): The raw data of the SML file.
+        obis_codes (set):  Optional set of raw 6-byte object names of interest. List
+                           entries of other object names are skipped.
+        template_cache:    Optional SmlTemplateCache object to speed up parsing files
+                           of the same structure.
+        file_cache:        Optional SmlFileCache object to reuse the results of
+                           identical SML files.
+
+    Return:
+        Returns the tuple (sml_file, readings) with the SmlFile object and the
+        SmlReading objects.
+    """
+    cached = file_cache.get(file_data) if file_cache is not None else None
+    if cached is not None:
+        return cached
+    sml_file = SmlFile(file_data, obis_codes, template_cache)
+    readings = get_readings(sml_file)
+    if file_cache is not None:
+        file_cache.add(file_data, sml_file, readings)
+    return (sml_file, readings)
+
+
+# pylint: disable=too-many-arguments
+def call_callbacks(
+    file_data: bytes,
+    sml_file: SmlFile,
+    readings: Tuple[SmlReading, ...],
+    sml_file_cb: Optional[SmlFileCallbackType],
+    obis_data_cb: Optional[ObisDataCallbackType],
+    reading_batch_cb: Optional[ReadingBatchCallbackType] = None,
+    arrival_time: Optional[Tuple[float, float]] = None,
 ) -> None:
-    """Process a SML file and call the callbacks.
+    """Call the callbacks with the results of a parsed SML file.
 
     Args:
         file_data (bytes): The raw data of the SML file.
+        sml_file (obj):    The SmlFile object.
+        readings (tuple):  The readings of the SML file.
         sml_file_cb:       Callback function taking the arguments (file_data, sml_file).
         obis_data_cb:      Callback function taking the arguments (obj_name, value, unit).
+        reading_batch_cb:  Callback function taking a SmlReadingBatch object with all
+                           readings of the file.
+        arrival_time:      Optional tuple (timestamp, monotonic) of the time.time() and
+                           time.monotonic() values when the file was received. If not
+                           given, the current time is used.
     """
-    sml_file = SmlFile(file_data)
     if sml_file_cb:
         sml_file_cb(file_data, sml_file)
-
-    # pylint: disable=too-many-nested-blocks
     if obis_data_cb:
-        for message in sml_file.messages:
-            if isinstance(message, SmlMessageGetListResponse):
-                for item in message.list_entries:
-                    if item.unit in ["Wh", "W"]:
-                        if item.scaler is not None:
-                            scaled_value = float(item.value) * pow(10, item.scaler)
-                        else:
-                            scaled_value = float(item.value)
-                        obis_data_cb(item.obj_name, scaled_value, item.unit)
+        for reading in readings:
+            obis_data_cb(reading.obj_name, reading.value, reading.unit)
+    if reading_batch_cb:
+        if arrival_time is None:
+            arrival_time = (time.time(), time.monotonic())
+        reading_batch_cb(SmlReadingBatch(arrival_time[0], arrival_time[1], readings))
+
+
+# pylint: disable=too-many-arguments
+def process_sml_file(
+    file_data: bytes,
+    sml_file_cb: Optional[SmlFileCallbackType],
+    obis_data_cb: Optional[ObisDataCallbackType],
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+    template_cache: Optional[SmlTemplateCache] = None,
+    file_cache: Optional[SmlFileCache] = None,
+    reading_batch_cb: Optional[ReadingBatchCallbackType] = None,
+    arrival_time: Optional[Tuple[float, float]] = None,
+) -> Tuple[SmlFile, Tuple[SmlReading, ...]]:
+    """Process a SML file and call the callbacks.
+
+    Args:
+        file_data (bytes): The raw data of the SML file.
+        sml_file_cb:       Callback function taking the arguments (file_data, sml_file).
+        obis_data_cb:      Callback function taking the arguments (obj_name, value, unit).
+        obis_codes (set):  Optional set of raw 6-byte object names of interest. List
+                           entries of other object names are skipped.
+        template_cache:    Optional SmlTemplateCache object to speed up parsing files
+                           of the same structure.
+        file_cache:        Optional SmlFileCache object to reuse the results of
+                           identical SML files.
+        reading_batch_cb:  Callback function taking a SmlReadingBatch object with all
+                           readings of the file.
+        arrival_time:      Optional tuple (timestamp, monotonic) of the time.time() and
+                           time.monotonic() values when the file was received. If not
+                           given, the current time is used.
+
+    Return:
+        Returns the tuple (sml_file, readings) with the SmlFile object and the
+        SmlReading objects.
+    """
+    sml_file, readings = parse_sml_file(file_data, obis_codes, template_cache, file_cache)
+    call_callbacks(file_data, sml_file, readings, sml_file_cb, obis_data_cb, reading_batch_cb, arrival_time)
+    return (sml_file, readings)
 
 
 def process(
     args: Any,
-    input_fh: Union[BinaryIO, serial.Serial],
+    input_fh: Union[InputSource, BinaryIO, serial.Serial],
     sml_file_cb: Optional[SmlFileCallbackType] = None,
     obis_data_cb: Optional[ObisDataCallbackType] = None,
-):
-    """Read from an input file handle and process all SML files by calling the callbacks.
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+    reading_batch_cb: Optional[ReadingBatchCallbackType] = None,
+    latency_stats: Optional[LatencyStatistics] = None,
+) -> bool:
+    """Read from an input source or file handle and process all SML files by calling the callbacks.
+
+    The input is read by a reader thread, the SML files are parsed by a parser
+    thread and the callbacks are called by a sink thread, so a slow callback
+    does not stop reading the serial port. The threads are connected by bounded
+    queues of the size args.queue_size using the overflow policy
+    args.overflow_policy. By default, finite sources like input files use the
+    block policy and serial ports or network sources the drop-oldest policy.
+    The statistics of the queues are logged periodically at debug level.
+
+    Serial ports are read in bursts of the bytes received within a short
+    hold-off time to handle the end of an SML file shortly after it arrives,
+    input files are read in large blocks.
 
     Args:
         args (obj):        The command line arguments.
-        input_fh (obj):    The input file handle.
+        input_fh (obj):    The InputSource object, a file handle or a serial port.
         sml_file_cb:       Callback function taking the arguments (file_data, sml_file).
         obis_data_cb:      Callback function taking the arguments (obj_name, value, unit).
+        obis_codes (set):  Optional set of raw 6-byte object names of interest. List
+                           entries of other object names are skipped.
+        reading_batch_cb:  Callback function taking a SmlReadingBatch object with all
+                           readings of a file.
+        latency_stats:     Optional LatencyStatistics object recording the latency
+                           between receiving the end of a file and calling the callbacks.
+
+    Return:
+        Returns True on success or False if reading the input failed.
+    """
+    LOGGER.debug("Starting processing the Sml data stream.")
+    template_cache = SmlTemplateCache()
+    file_cache = SmlFileCache()
+    if latency_stats is None:
+        latency_stats = LatencyStatistics()
+
+    def parse(file_data: bytes, arrival_time: Tuple[float, float]) -> Tuple[Any, ...]:
+        return (file_data, arrival_time) + parse_sml_file(file_data, obis_codes, template_cache, file_cache)
+
+    def sink(item: Tuple[Any, ...]) -> None:
+        file_data, arrival_time, sml_file, readings = item
+        call_callbacks(file_data, sml_file, readings, sml_file_cb, obis_data_cb, reading_batch_cb, arrival_time)
+        latency = time.monotonic() - arrival_time[1]
+        latency_stats.add(latency)  # type: ignore
+        LOGGER.debug("Processed SML file %.3f ms after receiving its end.", latency * 1000.0)
+
+    if isinstance(input_fh, InputSource):
+        source = input_fh
+        connection_count = source.connection_count
+
+        def read() -> bytes:
+            # Discard a partial SML file of a previous connection
+            nonlocal connection_count
+            data = source.read()
+            if source.connection_count != connection_count:
+                connection_count = source.connection_count
+                pipeline.extractor.reset()
+            return data
+
+        # An input source returns no data only if it is finished
+        finite, stop_on_eof = source.finite, True
+    else:
+        read, finite, stop_on_eof = get_read_function(input_fh), bool(args.input_file), bool(args.input_file)
+    overflow_policy = getattr(args, "overflow_policy", None)
+    if overflow_policy is None:
+        overflow_policy = OVERFLOW_BLOCK if finite else OVERFLOW_DROP_OLDEST
+    pipeline = SmlPipeline(
+        read,
+        parse,
+        [("callbacks", sink)],
+        getattr(args, "queue_size", DEFAULT_QUEUE_SIZE),
+        overflow_policy,
+        stop_on_eof=stop_on_eof,
+    )
+    success = pipeline.run(STATISTICS_INTERVAL)
+    LOGGER.debug("Dropped %d bytes that were not part of an SML file.", pipeline.extractor.dropped_bytes)
+    LOGGER.debug(
+        "Parsed %d SML files using the template of the previous file, %d SML files completely.",
+        template_cache.hits,
+        template_cache.misses,
+    )
+    LOGGER.debug("Reused the results of %d identical SML files.", file_cache.hits)
+    LOGGER.debug("Processed %s.", latency_stats)
+    pipeline.log_statistics()
+    return success
+
+
+async def process_async(
+    reader: asyncio.StreamReader,
+    sml_file_cb: Optional[SmlFileCallbackType] = None,
+    obis_codes: Optional[AbstractSet[bytes]] = None,
+) -> AsyncIterator[SmlReadingBatch]:
+    """Read from an asyncio stream and yield the readings of all SML files.
+
+    The SML files are extracted and parsed within the event loop, so a single
+    event loop can serve several meters without a thread per device. Use
+    open_fd_reader() of the serial_ifc module to get a stream reader of a
+    serial port, or asyncio.open_connection() for a socket.
+
+    Args:
+        reader (obj):      The asyncio.StreamReader object.
+        sml_file_cb:       Callback function taking the arguments (file_data, sml_file).
+        obis_codes (set):  Optional set of raw 6-byte object names of interest. List
+                           entries of other object names are skipped.
+
+    Return:
+        Returns an asynchronous iterator of the SmlReadingBatch objects of all
+        SML files. The iterator ends at the end of the stream.
     """
     LOGGER.debug("Starting processing the Sml data stream.")
     extractor = SmlFileExtractor()
+    template_cache = SmlTemplateCache()
+    file_cache = SmlFileCache()
     while True:
-        buffer = input_fh.read(128)
-        if not buffer and args.input_file:
+        data = await reader.read(FILE_READ_SIZE)
+        if not data:
             break
-        files = extractor.add_bytes(buffer)
-        for file_data in files:
-            process_sml_file(file_data, sml_file_cb, obis_data_cb)
+        arrival_time = (time.time(), time.monotonic())
+        for file_data in extractor.add_bytes(data):
+            sml_file, readings = parse_sml_file(file_data, obis_codes, template_cache, file_cache)
+            if sml_file_cb:
+                sml_file_cb(file_data, sml_file)
+            yield SmlReadingBatch(arrival_time[0], arrival_time[1], readings)
+    LOGGER.debug("Dropped %d bytes that were not part of an SML file.", extractor.dropped_bytes)
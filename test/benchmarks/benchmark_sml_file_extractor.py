@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Benchmark of the power_counter.sml_file_extractor module.
+
+Compares the throughput of the SmlFileExtractor with the previous extractor,
+which searched the whole pending buffer again for each added chunk, when
+feeding the data in chunks of different sizes. As the SmlFileExtractor also
+unescapes and checksums the SML files, the previous extractor is followed by
+the former unescaping and byte-wise checksum calculation of the SmlFile class.
+
+Usage:
+    python3 test/benchmarks/benchmark_sml_file_extractor.py
+"""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+sys.path.insert(0, str(BASE_DIR / "test" / "unittests"))
+
+# pylint: disable=wrong-import-position
+import sml_test_data  # noqa: E402
+from power_counter.crc import CRC16_X25_TABLE  # noqa: E402
+from power_counter.sml_file_extractor import (  # noqa: E402
+    END_START,
+    ESCAPE_SEQUENCE,
+    VERSION_SEQUENCE,
+    SmlFileExtractor,
+)
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+LIBSML_TESTING_DIR = BASE_DIR / "test" / "libsml-testing"
+CHUNK_SIZES = (1, 16, 128, 4096)
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+# pylint: disable=too-few-public-methods
+class RescanningExtractor:
+    """The previous extractor searching the whole pending buffer on each call."""
+
+    def __init__(self) -> None:
+        """Construct a new, empty RescanningExtractor object."""
+        self.buffer = b""
+        self.waiting_for_end = False
+
+    @staticmethod
+    def _find_at_four_bytes(buffer: bytes, sequence: bytes, start: int) -> int:
+        """Find a sequence starting only at multiple of 4 bytes."""
+        idx = buffer.find(sequence, start)
+        offset = idx % 4
+        while (offset != 0) and (idx >= 0):
+            idx = buffer.find(sequence, idx + (4 - offset))
+            offset = idx % 4
+        return idx
+
+    @staticmethod
+    def _check(sml_file: bytes) -> bytes:
+        """Unescape the SML file and calculate its checksum byte-wise like the former SmlFile class."""
+        data = sml_file.replace(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE, ESCAPE_SEQUENCE)
+        crcsum = 0xFFFF
+        for byte in data[:-2]:
+            crcsum = CRC16_X25_TABLE[(byte ^ crcsum) & 0xFF] ^ (crcsum >> 8 & 0xFF)
+        return sml_file
+
+    def add_bytes(self, new_bytes: bytes) -> List[bytes]:
+        """Add the given bytes and return the extracted SML files."""
+        self.buffer += new_bytes
+        sml_files: List[bytes] = []
+        sml_extracted = True
+        while sml_extracted:
+            sml_extracted = False
+            if not self.waiting_for_end:
+                start_index = self.buffer.find(ESCAPE_SEQUENCE + VERSION_SEQUENCE)
+                if start_index >= 0:
+                    self.buffer = self.buffer[start_index:]
+                    self.waiting_for_end = True
+
+            if self.waiting_for_end:
+                cand_idx = self._find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, 8)
+                while (cand_idx >= 0) and ((cand_idx + 8) <= len(self.buffer)):
+                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + ESCAPE_SEQUENCE):
+                        cand_idx = self.buffer.find(ESCAPE_SEQUENCE, cand_idx + 8)
+                        continue
+                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + END_START):
+                        sml_files.append(self._check(self.buffer[: cand_idx + 8]))
+                        self.buffer = self.buffer[cand_idx + 8 :]  # noqa: E203
+                        self.waiting_for_end = False
+                        sml_extracted = True
+                        break
+                    if self.buffer[cand_idx:].startswith(ESCAPE_SEQUENCE + VERSION_SEQUENCE):
+                        self.buffer = self.buffer[cand_idx:]
+                        cand_idx = self._find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, 8)
+                        continue
+                    cand_idx = self._find_at_four_bytes(self.buffer, ESCAPE_SEQUENCE, cand_idx + 4)
+        return sml_files
+
+
+# -----------------------------------------------------------------------------
+# Functions
+# -----------------------------------------------------------------------------
+def get_corpus() -> List[bytes]:
+    """Get the benchmark data consisting of long generated SML files and the libsml test files."""
+    long_entries = [(sml_test_data.OBIS_TOTAL, 30, -1, idx * 1000) for idx in range(60)]
+    corpus = [sml_test_data.default_sml_file(long_entries, transaction_id=idx) for idx in range(20)]
+    corpus.extend(filename.read_bytes() for filename in sorted(LIBSML_TESTING_DIR.glob("*.bin")))
+    return corpus
+
+
+def extract_in_chunks(extractor_class: Callable, data: bytes, chunk_size: int) -> List[bytes]:
+    """Feed the data in chunks of the given size into a new extractor and return the extracted files."""
+    extractor = extractor_class()
+    files = []
+    for start in range(0, len(data), chunk_size):
+        end = start + chunk_size
+        files.extend(bytes(sml_file) for sml_file in extractor.add_bytes(data[start:end]))
+    return files
+
+
+def benchmark(extractor_class: Callable, corpus: List[bytes], chunk_size: int) -> float:
+    """Get the throughput in kB/s of extracting the corpus in chunks of the given size."""
+    num_bytes = sum(len(data) for data in corpus)
+    start_time = time.perf_counter()
+    for data in corpus:
+        extract_in_chunks(extractor_class, data, chunk_size)
+    return num_bytes / (time.perf_counter() - start_time) / 1e3
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    corpus = get_corpus()
+    for data in corpus:
+        if extract_in_chunks(SmlFileExtractor, data, 1) != extract_in_chunks(RescanningExtractor, data, len(data)):
+            raise RuntimeError("The extractors extract different SML files!")
+
+    print(f"Extracting {sum(len(data) for data in corpus)} bytes:")
+    for chunk_size in CHUNK_SIZES:
+        rescanning = benchmark(RescanningExtractor, corpus, chunk_size)
+        current = benchmark(SmlFileExtractor, corpus, chunk_size)
+        print(
+            f"  chunks of {chunk_size:4d} bytes: rescanning {rescanning:9.1f} kB/s, "
+            f"SmlFileExtractor {current:9.1f} kB/s ({current / rescanning:.1f}x)"
+        )
+
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Helper functions to generate SML files for the unit tests."""
+
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+from typing import List, Optional, Sequence, Tuple
+
+from power_counter.crc import crc16_x25
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+ESCAPE_SEQUENCE = b"\x1b\x1b\x1b\x1b"
+VERSION_SEQUENCE = b"\x01\x01\x01\x01"
+OPTIONAL_NONE = b"\x01"
+
+OBIS_TOTAL = bytes([1, 0, 1, 8, 0, 255])
+OBIS_FEED_TOTAL = bytes([1, 0, 2, 8, 0, 255])
+OBIS_POWER = bytes([1, 0, 16, 7, 0, 255])
+OBIS_MANUFACTURER = bytes([129, 129, 199, 130, 3, 255])
+
+# Elements: OBIS code, unit, scaler, value
+ListEntryData = Tuple[bytes, Optional[int], Optional[int], int]
+
+DEFAULT_ENTRIES: List[ListEntryData] = [
+    (OBIS_MANUFACTURER, None, None, 0x454D48),
+    (OBIS_TOTAL, 30, -1, 123456789),
+    (OBIS_FEED_TOTAL, 30, -1, 4711),
+    (OBIS_POWER, 27, 0, -250),
+]
+
+
+# -----------------------------------------------------------------------------
+# Field Encoding
+# -----------------------------------------------------------------------------
+def octet_string(value: bytes) -> bytes:
+    """Encode an octet string (up to 14 bytes)."""
+    return bytes([len(value) + 1]) + value
+
+
+def unsigned(value: int, num_bytes: int = 1) -> bytes:
+    """Encode an unsigned integer."""
+    return bytes([0x60 | (num_bytes + 1)]) + value.to_bytes(num_bytes, byteorder="big", signed=False)
+
+
+def signed(value: int, num_bytes: int = 1) -> bytes:
+    """Encode a signed integer."""
+    return bytes([0x50 | (num_bytes + 1)]) + value.to_bytes(num_bytes, byteorder="big", signed=True)
+
+
+def sml_list(items: Sequence[bytes]) -> bytes:
+    """Encode a list of already encoded fields (up to 255 fields)."""
+    if len(items) > 15:
+        return bytes([0xF0 | (len(items) >> 4), len(items) & 0x0F]) + b"".join(items)
+    return bytes([0x70 | len(items)]) + b"".join(items)
+
+
+def sml_time(seconds: int) -> bytes:
+    """Encode a SML_Time field of type secIndex."""
+    return sml_list([unsigned(1), unsigned(seconds, 4)])
+
+
+# -----------------------------------------------------------------------------
+# Message Encoding
+# -----------------------------------------------------------------------------
+def message(transaction_id: bytes, tag: int, content: bytes) -> bytes:
+    """Encode a SML message including the message checksum."""
+    # List of six elements: The checksum and the end of message are added after calculating the checksum
+    data = b"\x76" + octet_string(transaction_id) + unsigned(0) + unsigned(0) + sml_list([unsigned(tag, 2), content])
+    return data + unsigned(crc16_x25(data), 2) + b"\x00"
+
+
+def open_response(transaction_id: bytes = b"\x01", req_file_id: bytes = b"\x10\x20") -> bytes:
+    """Encode an OpenResponse message."""
+    content = sml_list(
+        [
+            OPTIONAL_NONE,
+            OPTIONAL_NONE,
+            octet_string(req_file_id),
+            octet_string(b"\x0a\x01EMH\x00\x00\x01\x02\x03"),
+            OPTIONAL_NONE,
+            OPTIONAL_NONE,
+        ]
+    )
+    return message(transaction_id, 0x0101, content)
+
+
+def list_entry(entry: ListEntryData) -> bytes:
+    """Encode a list entry of the GetListResponse message."""
+    obj_name, unit, scaler, value = entry
+    return sml_list(
+        [
+            octet_string(obj_name),
+            unsigned(0x1C0104, 4) if unit is not None else OPTIONAL_NONE,
+            OPTIONAL_NONE,
+            unsigned(unit) if unit is not None else OPTIONAL_NONE,
+            signed(scaler) if scaler is not None else OPTIONAL_NONE,
+            signed(value, 8) if value < 0 else unsigned(value, 8),
+            OPTIONAL_NONE,
+        ]
+    )
+
+
+def get_list_response(
+    entries: Sequence[ListEntryData] = tuple(DEFAULT_ENTRIES), transaction_id: bytes = b"\x02", seconds: int = 1000
+) -> bytes:
+    """Encode a GetListResponse message."""
+    content = sml_list(
+        [
+            OPTIONAL_NONE,
+            octet_string(b"\x0a\x01EMH\x00\x00\x01\x02\x03"),
+            octet_string(bytes([1, 0, 98, 0, 0, 255])),
+            sml_time(seconds),
+            sml_list([list_entry(entry) for entry in entries]),
+            OPTIONAL_NONE,
+            OPTIONAL_NONE,
+        ]
+    )
+    return message(transaction_id, 0x0701, content)
+
+
+def close_response(transaction_id: bytes = b"\x03") -> bytes:
+    """Encode a CloseResponse message."""
+    return message(transaction_id, 0x0201, sml_list([OPTIONAL_NONE]))
+
+
+# -----------------------------------------------------------------------------
+# File Encoding
+# -----------------------------------------------------------------------------
+def escape(data: bytes) -> bytes:
+    """Double all escape sequences found at multiples of four bytes."""
+    chunks = [data[idx : idx + 4] for idx in range(0, len(data), 4)]  # noqa: E203
+    return b"".join(chunk + chunk if chunk == ESCAPE_SEQUENCE else chunk for chunk in chunks)
+
+
+def sml_file(messages: Sequence[bytes]) -> bytes:
+    """Encode a complete SML file consisting of the given encoded messages."""
+    data = ESCAPE_SEQUENCE + VERSION_SEQUENCE + b"".join(messages)
+    num_padding = -len(data) % 4
+    data += b"\x00" * num_padding + ESCAPE_SEQUENCE + bytes([0x1A, num_padding])
+    data += crc16_x25(data).to_bytes(2, byteorder="big")
+    return data[:8] + escape(data[8:-8]) + data[-8:]
+
+
+def default_sml_file(
+    entries: Sequence[ListEntryData] = tuple(DEFAULT_ENTRIES), transaction_id: int = 1, seconds: int = 1000
+) -> bytes:
+    """Encode a typical SML file with an OpenResponse, a GetListResponse and a CloseResponse message."""
+    return sml_file(
+        [
+            open_response(bytes([transaction_id, 1])),
+            get_list_response(entries, bytes([transaction_id, 2]), seconds),
+            close_response(bytes([transaction_id, 3])),
+        ]
+    )
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.aggregation module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+from argparse import Namespace
+from unittest import TestCase
+
+import power_counter.aggregation
+import sml_test_data
+from power_counter.aggregation import WindowAggregator
+from power_counter.sml_message_processor import SmlReading, SmlReadingBatch
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def get_batch(timestamp: float, power: float, label: str = "") -> SmlReadingBatch:
+    """Get a batch with a power reading arriving at the given time."""
+    return SmlReadingBatch(
+        timestamp, timestamp, (SmlReading(sml_test_data.OBIS_POWER, "1-0:16.7.0*255", power, "W"),), label
+    )
+
+
+def get_statistics(batch: SmlReadingBatch) -> dict:
+    """Get the statistics of a batch by name."""
+    return {reading.statistic: reading.value for reading in batch.readings}
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class WindowAggregatorTest(TestCase):
+    """Test the :class:`power_counter.aggregation.WindowAggregator` class."""
+
+    def test_tumbling(self) -> None:
+        """power_counter.aggregation.WindowAggregator: Emit the statistics of each closed tumbling window."""
+        batches = []
+        aggregator = WindowAggregator(batches.append, 10.0)
+        for timestamp, power in [(1.0, 100.0), (4.0, 300.0), (9.5, 200.0), (12.0, 50.0), (35.0, 10.0)]:
+            aggregator(get_batch(timestamp, power))
+        self.assertEqual([10.0, 20.0], [batch.timestamp for batch in batches])
+        self.assertEqual(
+            {"min": 100.0, "max": 300.0, "mean": 200.0, "last": 200.0, "count": 3.0}, get_statistics(batches[0])
+        )
+        self.assertEqual(
+            {"min": 50.0, "max": 50.0, "mean": 50.0, "last": 50.0, "count": 1.0}, get_statistics(batches[1])
+        )
+        self.assertEqual(("W", "W", "W", "W", ""), tuple(reading.unit for reading in batches[0].readings))
+
+        # The empty windows are skipped, the current window is closed by flush()
+        aggregator.flush()
+        self.assertEqual([10.0, 20.0, 40.0], [batch.timestamp for batch in batches])
+        self.assertEqual(10.0, get_statistics(batches[2])["mean"])
+
+    def test_sliding(self) -> None:
+        """power_counter.aggregation.WindowAggregator: Emit the statistics of overlapping windows."""
+        batches = []
+        aggregator = WindowAggregator(batches.append, 30.0, 10.0)
+        for timestamp in range(0, 60, 5):
+            aggregator(get_batch(float(timestamp), float(timestamp)))
+        self.assertEqual([10.0, 20.0, 30.0, 40.0, 50.0], [batch.timestamp for batch in batches])
+        self.assertEqual([2.0, 4.0, 6.0, 6.0, 6.0], [get_statistics(batch)["count"] for batch in batches])
+        self.assertEqual([0.0, 0.0, 0.0, 10.0, 20.0], [get_statistics(batch)["min"] for batch in batches])
+        self.assertEqual([2.5, 7.5, 12.5, 22.5, 32.5], [round(get_statistics(batch)["mean"], 6) for batch in batches])
+
+        # The windows containing the readings before a gap are still emitted
+        aggregator(get_batch(200.0, 1.0))
+        self.assertEqual([60.0, 70.0, 80.0], [batch.timestamp for batch in batches[5:]])
+        self.assertEqual([6.0, 4.0, 2.0], [get_statistics(batch)["count"] for batch in batches[5:]])
+
+    def test_meters_and_raw(self) -> None:
+        """power_counter.aggregation.WindowAggregator: Aggregate per meter and pass the raw readings."""
+        batches = []
+        aggregator = WindowAggregator(batches.append, 10.0, raw=True)
+        aggregator(get_batch(1.0, 100.0, "house"))
+        aggregator(get_batch(2.0, 500.0, "heatpump"))
+        aggregator(get_batch(11.0, 200.0, "house"))
+        self.assertEqual(4, len(batches))
+        self.assertEqual(("house", ""), (batches[3].label, batches[3].readings[0].statistic))
+        self.assertEqual(("house", 100.0), (batches[2].label, get_statistics(batches[2])["mean"]))
+        aggregator.flush()
+        self.assertEqual(
+            [("house", 200.0), ("heatpump", 500.0)],
+            [(batch.label, get_statistics(batch)["mean"]) for batch in batches[4:]],
+        )
+
+    def test_get_window_aggregator(self) -> None:
+        """power_counter.aggregation.get_window_aggregator: Create the aggregator of the --window options."""
+        get_window_aggregator = power_counter.aggregation.get_window_aggregator
+        self.assertIsNone(get_window_aggregator(Namespace(window=None, window_step=None, window_raw=False), print))
+        aggregator = get_window_aggregator(Namespace(window=60.0, window_step=25.0, window_raw=False), print)
+        self.assertEqual((25.0, 3), (aggregator.step, aggregator.num_panes))
+        aggregator = get_window_aggregator(Namespace(window=10.0, window_step=None, window_raw=True), print)
+        self.assertEqual((10.0, 1, True), (aggregator.step, aggregator.num_panes, aggregator.raw))
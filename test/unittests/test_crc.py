@@ -12,11 +12,25 @@
 # -----------------------------------------------------------------------------
 # Module Import
 # -----------------------------------------------------------------------------
+import os
 from unittest import TestCase
 
 import power_counter.crc
 
 
+# -----------------------------------------------------------------------------
+# Reference Implementation
+# -----------------------------------------------------------------------------
+def crc16_x25_bytewise(buffer: bytes) -> int:
+    """Calculate the CRC16 X25 checksum using the classic byte-wise table loop."""
+    crcsum = 0xFFFF
+    for byte in buffer:
+        crcsum = power_counter.crc.CRC16_X25_TABLE[(byte ^ crcsum) & 0xFF] ^ (crcsum >> 8 & 0xFF)
+    crcsum ^= 0xFFFF
+    crcsum = ((crcsum & 0xFF00) >> 8) | ((crcsum & 0x00FF) << 8)
+    return crcsum
+
+
 # -----------------------------------------------------------------------------
 # Test Class
 # -----------------------------------------------------------------------------
@@ -38,6 +52,41 @@ class CrcTest(TestCase):
         buffer = b"123456789"
         self.assertEqual(power_counter.crc.crc16_x25(buffer), 0x6E90)
 
+    def test_reference(self):
+        """power_counter.crc.crc16_x25: Same result as the byte-wise reference for all lengths."""
+        buffer = os.urandom(100)
+        for length in range(len(buffer)):
+            self.assertEqual(
+                power_counter.crc.crc16_x25(buffer[:length]), crc16_x25_bytewise(buffer[:length]), msg=f"{length=}"
+            )
+
+
+class Crc16X25Test(TestCase):
+    """Test the :class:`power_counter.crc.Crc16X25` class."""
+
+    def test_initial(self):
+        """power_counter.crc.Crc16X25: Initial data given to the constructor."""
+        self.assertEqual(power_counter.crc.Crc16X25(b"123456789").digest(), 0x6E90)
+        self.assertEqual(power_counter.crc.Crc16X25().digest(), 0)
+
+    def test_incremental(self):
+        """power_counter.crc.Crc16X25: Data added in chunks of different sizes."""
+        buffer = os.urandom(257)
+        expected = crc16_x25_bytewise(buffer)
+        for chunk_size in [1, 3, 7, 8, 13, 64, 300]:
+            crc = power_counter.crc.Crc16X25()
+            for start in range(0, len(buffer), chunk_size):
+                end = start + chunk_size
+                crc.update(buffer[start:end])
+            self.assertEqual(crc.digest(), expected, msg=f"{chunk_size=}")
+            self.assertEqual(crc.length, len(buffer))
+
+    def test_buffer_types(self):
+        """power_counter.crc.Crc16X25: Data given as bytearray or memoryview."""
+        buffer = os.urandom(33)
+        self.assertEqual(power_counter.crc.Crc16X25(bytearray(buffer)).digest(), crc16_x25_bytewise(buffer))
+        self.assertEqual(power_counter.crc.Crc16X25(memoryview(buffer)[3:]).digest(), crc16_x25_bytewise(buffer[3:]))
+
 
 # -----------------------------------------------------------------------------
 # EOF
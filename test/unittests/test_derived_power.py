@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.derived_power module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import argparse
+from unittest import TestCase
+
+import power_counter.derived_power
+import sml_test_data
+from power_counter.derived_power import DerivedPowerRule, PowerDeriver
+from power_counter.obis import parse_obis_id
+from power_counter.sml_message_processor import SmlReading, SmlReadingBatch
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+OBIS_POWER_IMPORT = parse_obis_id("1-0:1.7.0*255")
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def get_batch(monotonic: float, total: float, label: str = "") -> SmlReadingBatch:
+    """Get a batch with an energy counter reading arriving at the given time."""
+    return SmlReadingBatch(
+        monotonic, monotonic, (SmlReading(sml_test_data.OBIS_TOTAL, "1-0:1.8.0*255", total, "Wh"),), label
+    )
+
+
+def get_power(batches: list) -> list:
+    """Get the times and values of the derived power readings."""
+    return [
+        (batch.monotonic, round(reading.value, 6), reading.unit)
+        for batch in batches
+        for reading in batch.readings
+        if reading.obis_code == OBIS_POWER_IMPORT
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class DerivedPowerTest(TestCase):
+    """Test the functions and classes of the :mod:`power_counter.derived_power` module."""
+
+    def test_parse_derived_power_rule(self) -> None:
+        """power_counter.derived_power.parse_derived_power_rule: Parse the rule options."""
+        parse = power_counter.derived_power.parse_derived_power_rule
+        self.assertEqual(DerivedPowerRule(sml_test_data.OBIS_TOTAL, OBIS_POWER_IMPORT), parse("1-0:1.8.0*255"))
+        self.assertEqual(
+            DerivedPowerRule(sml_test_data.OBIS_FEED_TOTAL, sml_test_data.OBIS_POWER, 10.0, 1e8),
+            parse("1-0:2.8.0*255,power=1-0:16.7.0*255,interval=10,wrap=100000000"),
+        )
+        for spec in [
+            "1-0:1.8.0",
+            "1-0:16.7.0*255",
+            "1-0:1.8.0*255,power=1-0:1.7.0",
+            "1-0:1.8.0*255,period=10",
+            "1-0:1.8.0*255,interval=0",
+            "1-0:1.8.0*255,wrap=x",
+        ]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse(spec)
+
+    def test_resolution(self) -> None:
+        """power_counter.derived_power.PowerDeriver: Average the power between the changes of the counter."""
+        batches = []
+        deriver = PowerDeriver(batches.append, [DerivedPowerRule(sml_test_data.OBIS_TOTAL, OBIS_POWER_IMPORT, 30.0)])
+        # 360 W with a counter resolution of 1 Wh changes the counter every 10 seconds
+        for now in range(101):
+            deriver(get_batch(float(now), 1000.0 + (now * 36) // 360))
+        self.assertEqual(101, len(batches))
+        self.assertEqual([(40.0, 360.0, "W"), (70.0, 360.0, "W"), (100.0, 360.0, "W")], get_power(batches))
+
+        # No change of the counter within the interval
+        for now in range(101, 200, 10):
+            deriver(get_batch(float(now), 1009.0))
+        self.assertEqual([(131.0, 0.0, "W"), (161.0, 0.0, "W"), (191.0, 0.0, "W")], get_power(batches[101:]))
+
+    def test_wrap(self) -> None:
+        """power_counter.derived_power.PowerDeriver: Handle the wrap-around and the reset of the counter."""
+        batches = []
+        rule = DerivedPowerRule(sml_test_data.OBIS_TOTAL, OBIS_POWER_IMPORT, 10.0, 10000.0)
+        deriver = PowerDeriver(batches.append, [rule])
+        for now, total in [(0.0, 9990.0), (1.0, 9995.0), (6.0, 0.0), (11.0, 5.0)]:
+            deriver(get_batch(now, total))
+        self.assertEqual([(11.0, 3600.0, "W")], get_power(batches))
+
+        with self.assertLogs(level="WARNING"):
+            deriver(get_batch(12.0, 4.0))
+        for now, total in [(13.0, 4.0), (22.0, 6.0), (23.0, 6.0)]:
+            deriver(get_batch(now, total))
+        self.assertEqual([(22.0, 720.0, "W")], get_power(batches[4:]))
+
+    def test_meters(self) -> None:
+        """power_counter.derived_power.PowerDeriver: Keep the state of the counters per meter."""
+        batches = []
+        deriver = PowerDeriver(batches.append, [DerivedPowerRule(sml_test_data.OBIS_TOTAL, OBIS_POWER_IMPORT, 1.0)])
+        for now in range(4):
+            deriver(get_batch(float(now), 100.0 * now, "house"))
+            deriver(get_batch(float(now), 10.0 * now, "heatpump"))
+        self.assertEqual(
+            [("house", 360000.0), ("heatpump", 36000.0), ("house", 360000.0), ("heatpump", 36000.0)],
+            [(batch.label, reading.value) for batch in batches for reading in batch.readings[1:]],
+        )
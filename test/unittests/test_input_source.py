@@ -0,0 +1,180 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.input_source module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import power_counter.input_source
+import power_counter.multi_device
+import sml_test_data
+from power_counter.serial_ifc import DeviceSpec
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def serve(server: socket.socket, connections, delay: float = 0.0) -> None:
+    """Accept a connection for each list of chunks, send the chunks and close the connection."""
+    time.sleep(delay)
+    server.listen()
+    for chunks in connections:
+        connection, _ = server.accept()
+        with connection:
+            for chunk in chunks:
+                connection.sendall(chunk)
+                time.sleep(0.01)
+    server.close()
+
+
+def tcp_source(server: socket.socket) -> power_counter.input_source.TcpSource:
+    """Get an opened TcpSource object connecting to the server with a short reconnect delay."""
+    host, port = server.getsockname()
+    source = power_counter.input_source.TcpSource(f"tcp://{host}:{port}", host, port, reconnect_delay=0.05)
+    source.open()
+    return source
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class InputSourceTest(TestCase):
+    """Test the classes and functions of the :mod:`power_counter.input_source` module."""
+
+    def setUp(self) -> None:
+        """Create a server socket bound to a free port."""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.addCleanup(self.server.close)
+
+    def test_open_source(self) -> None:
+        """power_counter.input_source.open_source: Open the sources of the URLs."""
+        data = sml_test_data.default_sml_file()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "capture.dat")
+            with open(path, "wb") as output_fh:
+                output_fh.write(data)
+            for url, scheme in [(f"file://{path}", "serial"), (path, "file")]:
+                source = power_counter.input_source.open_source(url, scheme, close_on_exit=False)
+                self.assertIsInstance(source, power_counter.input_source.FileSource)
+                self.assertTrue(source.finite)
+                self.assertEqual(data, source.read())
+                self.assertEqual(b"", source.read())
+                self.assertTrue(source.finished)
+                source.close()
+            self.assertIsNone(power_counter.input_source.open_source(os.path.join(tmp_dir, "missing"), "file"))
+
+        source = power_counter.input_source.open_source("tcp://localhost:4711", close_on_exit=False)
+        self.assertIsInstance(source, power_counter.input_source.TcpSource)
+        self.assertEqual(("localhost", 4711), (source.host, source.port))
+        self.assertFalse(source.finite)
+        source.close()
+        for url in ["tcp://localhost", "tcp://:4711", "udp://localhost:4711"]:
+            self.assertIsNone(power_counter.input_source.open_source(url))
+
+    def test_stdin_source(self) -> None:
+        """power_counter.input_source.StdinSource: Read the standard input until the end of the pipe."""
+        data = sml_test_data.default_sml_file()
+        read_fd, write_fd = os.pipe()
+        with io.TextIOWrapper(os.fdopen(read_fd, "rb")) as stdin:
+            os.write(write_fd, data)
+            os.close(write_fd)
+            with patch.object(sys, "stdin", stdin):
+                source = power_counter.input_source.open_source("-", close_on_exit=False)
+            self.assertIsInstance(source, power_counter.input_source.StdinSource)
+            self.assertTrue(source.finite)
+            received = b""
+            while not source.finished:
+                received += source.read()
+            source.close()
+        self.assertEqual(data, received)
+
+    def test_tcp_reconnect(self) -> None:
+        """power_counter.input_source.TcpSource: Reconnect after the server closed the connection."""
+        data = sml_test_data.default_sml_file()
+        # The server starts listening after the first connection attempt failed
+        server_thread = threading.Thread(target=serve, args=(self.server, [[data[:30]], [data[30:60], data[60:]]], 0.1))
+        server_thread.start()
+        source = tcp_source(self.server)
+        # Stop reading if the data is not received in time
+        watchdog = threading.Timer(10.0, source.close)
+        watchdog.start()
+        received = b""
+        while len(received) < len(data) and not source.finished:
+            received += source.read()
+        watchdog.cancel()
+        server_thread.join()
+        source.close()
+        # The second connection continues where the first one stopped
+        self.assertEqual(data, received)
+        self.assertGreaterEqual(source.connection_count, 3)
+
+    def test_tcp_idle_timeout(self) -> None:
+        """power_counter.input_source.TcpSource: Reconnect if no data is received for the idle timeout."""
+        data = sml_test_data.default_sml_file()
+        idle_connections = []
+
+        def serve_after_idle_connection() -> None:
+            # The first connection stays open without sending any data
+            idle_connections.append(self.server.accept()[0])
+            serve(self.server, [[data]])
+
+        self.server.listen()
+        server_thread = threading.Thread(target=serve_after_idle_connection)
+        server_thread.start()
+        host, port = self.server.getsockname()
+        source = power_counter.input_source.TcpSource(f"tcp://{host}:{port}", host, port, 0.05, idle_timeout=0.2)
+        source.open()
+        watchdog = threading.Timer(10.0, source.close)
+        watchdog.start()
+        received = b""
+        while len(received) < len(data) and not source.finished:
+            received += source.read()
+        watchdog.cancel()
+        server_thread.join()
+        source.close()
+        for connection in idle_connections:
+            connection.close()
+        self.assertEqual(data, received)
+        self.assertEqual(2, source.connection_count)
+
+    def test_tcp_device(self) -> None:
+        """power_counter.multi_device.process_devices: Multiplex a TCP source and a file source."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(3)]
+        server_thread = threading.Thread(target=serve, args=(self.server, [frames[:2], frames[2:]]))
+        server_thread.start()
+        source = tcp_source(self.server)
+        batches = []
+
+        def reading_batch_cb(batch):
+            batches.append(batch)
+            if len([batch for batch in batches if batch.label == "remote"]) == 3:
+                source.close()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "capture.dat")
+            with open(path, "wb") as output_fh:
+                output_fh.write(b"".join(frames))
+            file_source = power_counter.input_source.open_source(path, "file", close_on_exit=False)
+            power_counter.multi_device.process_devices(
+                [(DeviceSpec(source.url, "remote", ""), source), (DeviceSpec(path, "local", ""), file_source)],
+                reading_batch_cb=reading_batch_cb,
+            )
+        server_thread.join()
+        self.assertEqual(["local"] * 3, [batch.label for batch in batches if batch.label == "local"])
+        self.assertEqual(6, len(batches))
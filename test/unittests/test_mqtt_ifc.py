@@ -0,0 +1,334 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.mqtt_ifc module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import asyncio
+import json
+import socket
+import threading
+import time
+from argparse import Namespace
+from typing import Optional
+from unittest import TestCase
+
+import paho.mqtt.client as mqtt
+
+import power_counter.mqtt_ifc
+import power_counter.publish_rules
+import sml_test_data
+from power_counter.sml_message_processor import SmlReading, SmlReadingBatch
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Port without a MQTT broker
+UNUSED_PORT = 1
+
+TOPICS = "1-0:1.8.0*255=power/total,1-0:16.7.0*255=power/rate"
+
+# MQTT packet types and the responses of the stand-in broker
+CONNECT = 1
+PUBLISH = 3
+PINGREQ = 12
+DISCONNECT = 14
+CONNACK_PACKET = b"\x20\x02\x00\x00"
+PINGRESP_PACKET = b"\xd0\x00"
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def get_args(
+    port: int, connect_timeout: float, queue_size: int = 10, payload: str = "topic", rules: Optional[list] = None
+) -> Namespace:
+    """Get the arguments of a MqttInterface object connecting to the given port."""
+    return Namespace(
+        mqtt_topics=TOPICS,
+        mqtt_host="127.0.0.1",
+        mqtt_port=port,
+        mqtt_username="",
+        mqtt_password="",
+        mqtt_connect_timeout=connect_timeout,
+        mqtt_queue_size=queue_size,
+        mqtt_payload=payload,
+        mqtt_meter_topic="power/meter",
+        mqtt_rule=rules,
+    )
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    """Wait until the condition function returns True."""
+    end_time = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end_time:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# -----------------------------------------------------------------------------
+# Stand-In Broker
+# -----------------------------------------------------------------------------
+class StandInBroker:
+    """Minimal MQTT 3.1.1 broker accepting all connections and recording the QoS 0 messages."""
+
+    def __init__(self) -> None:
+        """Start listening on a free port."""
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.server.settimeout(0.05)
+        self.port = self.server.getsockname()[1]
+        self.messages: list = []
+        self.connections: list = []
+        self._closed = False
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self) -> None:
+        """Stop the broker."""
+        self._closed = True
+        self.drop_connections()
+        self.server.close()
+
+    def drop_connections(self) -> None:
+        """Close all client connections to simulate an outage."""
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connections = []
+
+    def _serve(self) -> None:
+        """Accept the connections of the clients."""
+        while not self._closed:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Handle the packets of a client connection."""
+        with conn:
+            try:
+                while True:
+                    packet_type, body = self._read_packet(conn)
+                    if packet_type == CONNECT:
+                        conn.sendall(CONNACK_PACKET)
+                    elif packet_type == PUBLISH:
+                        topic_end = 2 + int.from_bytes(body[:2], "big")
+                        self.messages.append((body[2:topic_end].decode(), body[topic_end:].decode()))
+                    elif packet_type == PINGREQ:
+                        conn.sendall(PINGRESP_PACKET)
+                    elif packet_type == DISCONNECT:
+                        return
+            except (OSError, EOFError):
+                return
+
+    @classmethod
+    def _read_packet(cls, conn: socket.socket) -> tuple:
+        """Read the next packet and return the packet type and the variable header with payload."""
+        header = cls._recv(conn, 1)[0]
+        length = 0
+        multiplier = 1
+        while True:
+            byte = cls._recv(conn, 1)[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if byte < 0x80:
+                break
+        return header >> 4, cls._recv(conn, length)
+
+    @staticmethod
+    def _recv(conn: socket.socket, size: int) -> bytes:
+        """Receive exactly size bytes."""
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class MqttInterfaceTest(TestCase):
+    """Test the :class:`power_counter.mqtt_ifc.MqttInterface` class."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Create a MqttInterface object that is not connected to a broker."""
+        cls.mqtt = power_counter.mqtt_ifc.MqttInterface(get_args(UNUSED_PORT, 0.1))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Close the MqttInterface object."""
+        cls.mqtt.close()
+
+    def _replace_publish(self, on_publish_thread: bool) -> list:
+        """Replace client.publish by a function confirming the message in the same or another thread."""
+        published = []
+
+        def publish(topic, payload):
+            info = mqtt.MQTTMessageInfo(len(published) + 1)
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+            published.append((topic, payload))
+            args = (self.mqtt.client, None, info.mid, None, None)
+            if on_publish_thread:
+                threading.Timer(0.01, self.mqtt.client.on_publish, args).start()
+            else:
+                self.mqtt.client.on_publish(*args)
+            return info
+
+        self.mqtt.client.publish = publish
+        self.addCleanup(vars(self.mqtt.client).pop, "publish", None)
+        return published
+
+    def test_publish_async_not_connected(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_async: Report a failed publish."""
+        self.assertFalse(self.mqtt.connected.is_set())
+        self.addCleanup(self.mqtt._offline_queue.clear)  # pylint: disable=protected-access
+        self.assertFalse(asyncio.run(self.mqtt.publish_async("1-0:1.8.0*255", 1.0)))
+        self.assertFalse(asyncio.run(self.mqtt.publish_async("1-0:2.8.0*255", 1.0)))
+
+    def test_publish_async(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_async: Wait for the on_publish callback."""
+        for on_publish_thread in [False, True]:
+            published = self._replace_publish(on_publish_thread)
+            self.assertTrue(asyncio.run(self.mqtt.publish_async(sml_test_data.OBIS_TOTAL, 1.5)))
+            self.assertEqual([("power/total", 1.5)], published)
+
+    def test_publish_batch_async(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_batch_async: Publish all mapped readings."""
+        published = self._replace_publish(True)
+        batch = SmlReadingBatch(
+            0.0,
+            0.0,
+            (
+                SmlReading(sml_test_data.OBIS_TOTAL, "1-0:1.8.0*255", 100.0, "Wh"),
+                SmlReading(sml_test_data.OBIS_FEED_TOTAL, "1-0:2.8.0*255", 10.0, "Wh"),
+                SmlReading(sml_test_data.OBIS_POWER, "1-0:16.7.0*255", -5.0, "W"),
+            ),
+        )
+        self.assertTrue(asyncio.run(self.mqtt.publish_batch_async(batch)))
+        self.assertEqual([("power/total", 100.0), ("power/rate", -5.0)], published)
+
+    def test_encode_batch(self) -> None:
+        """power_counter.mqtt_ifc.encode_batch: Encode all mapped readings with the timestamp."""
+        batch = SmlReadingBatch(
+            1600000000.5,
+            0.0,
+            (
+                SmlReading(sml_test_data.OBIS_TOTAL, "1-0:1.8.0*255", 1234.5, "Wh"),
+                SmlReading(sml_test_data.OBIS_FEED_TOTAL, "1-0:2.8.0*255", 10.0, "Wh"),
+                SmlReading(sml_test_data.OBIS_POWER, "1-0:16.7.0*255", -5.0, "W"),
+            ),
+        )
+        encode_batch = power_counter.mqtt_ifc.encode_batch
+        self.assertEqual(
+            {"time": 1600000000.5, "power/total": 1234.5, "power/rate": -5.0},
+            json.loads(encode_batch(batch, self.mqtt.topics, power_counter.mqtt_ifc.PAYLOAD_JSON)),
+        )
+        self.assertEqual(
+            "time=1600000000.5,power/total=1234.5,power/rate=-5.0",
+            encode_batch(batch, self.mqtt.topics, power_counter.mqtt_ifc.PAYLOAD_COMPACT),
+        )
+        self.assertIsNone(encode_batch(batch._replace(readings=batch.readings[1:2]), self.mqtt.topics, "json"))
+
+    def test_publish_async_timeout(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_async: Give up if the message is not confirmed."""
+
+        def publish(topic, payload):
+            info = mqtt.MQTTMessageInfo(4711)
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+            return info
+
+        self.mqtt.client.publish = publish
+        self.addCleanup(vars(self.mqtt.client).pop, "publish", None)
+        self.assertFalse(asyncio.run(self.mqtt.publish_async(sml_test_data.OBIS_TOTAL, 1.5, timeout=0.05)))
+
+
+class MqttBrokerTest(TestCase):
+    """Test the connection handling of the :class:`power_counter.mqtt_ifc.MqttInterface` class."""
+
+    def setUp(self) -> None:
+        """Start a stand-in broker."""
+        self.broker = StandInBroker()
+        self.addCleanup(self.broker.close)
+
+    def test_connect(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface: Finish the startup when the broker accepts the connection."""
+        mqtt_ifc = power_counter.mqtt_ifc.MqttInterface(get_args(self.broker.port, 10.0))
+        self.addCleanup(mqtt_ifc.close)
+        self.assertTrue(mqtt_ifc.connected.is_set())
+        mqtt_ifc.publish(sml_test_data.OBIS_TOTAL, 1.5)
+        self.assertTrue(wait_for(lambda: self.broker.messages == [("power/total", "1.5")]))
+
+    def test_outage(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface: Keep the readings while disconnected and send them in order."""
+        mqtt_ifc = power_counter.mqtt_ifc.MqttInterface(get_args(self.broker.port, 10.0, queue_size=3))
+        self.addCleanup(mqtt_ifc.close)
+        self.assertTrue(mqtt_ifc.connected.is_set())
+
+        with self.assertLogs(level="WARNING") as logs:
+            self.broker.drop_connections()
+            self.assertTrue(wait_for(lambda: not mqtt_ifc.connected.is_set()))
+            for value in range(5):
+                mqtt_ifc.publish(sml_test_data.OBIS_TOTAL, value)
+        self.assertEqual(2, mqtt_ifc.dropped)
+        self.assertIn("2 messages dropped in total", logs.output[-1])
+
+        self.assertTrue(wait_for(mqtt_ifc.connected.is_set))
+        mqtt_ifc.publish(sml_test_data.OBIS_POWER, 5)
+        expected = [("power/total", "2"), ("power/total", "3"), ("power/total", "4"), ("power/rate", "5")]
+        self.assertTrue(wait_for(lambda: self.broker.messages == expected))
+
+    def test_meter_payload(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_batch: Publish a single message per SML file."""
+        mqtt_ifc = power_counter.mqtt_ifc.MqttInterface(get_args(self.broker.port, 10.0, payload="compact"))
+        self.addCleanup(mqtt_ifc.close)
+        batch = SmlReadingBatch(
+            1600000000.5,
+            0.0,
+            (
+                SmlReading(sml_test_data.OBIS_TOTAL, "1-0:1.8.0*255", 1234.5, "Wh"),
+                SmlReading(sml_test_data.OBIS_POWER, "1-0:16.7.0*255", -5.0, "W"),
+            ),
+        )
+        mqtt_ifc.publish_batch(batch, "house/")
+        expected = [("house/power/meter", "time=1600000000.5,power/total=1234.5,power/rate=-5.0")]
+        self.assertTrue(wait_for(lambda: self.broker.messages == expected))
+
+    def test_publish_rules(self) -> None:
+        """power_counter.mqtt_ifc.MqttInterface.publish_batch: Leave out the readings suppressed by the rules."""
+        rules = [power_counter.publish_rules.parse_publish_rule("1-0:1.8.0*255,deadband=1")]
+        mqtt_ifc = power_counter.mqtt_ifc.MqttInterface(get_args(self.broker.port, 10.0, payload="json", rules=rules))
+        self.addCleanup(mqtt_ifc.close)
+        for idx, total in enumerate([100.0, 100.5, 101.5]):
+            batch = SmlReadingBatch(
+                float(idx),
+                float(idx),
+                (
+                    SmlReading(sml_test_data.OBIS_TOTAL, "1-0:1.8.0*255", total, "Wh"),
+                    SmlReading(sml_test_data.OBIS_POWER, "1-0:16.7.0*255", 5.0, "W"),
+                ),
+            )
+            mqtt_ifc.publish_batch(batch)
+        expected = [
+            ("power/meter", '{"time":0.0,"power/total":100.0,"power/rate":5.0}'),
+            ("power/meter", '{"time":1.0,"power/rate":5.0}'),
+            ("power/meter", '{"time":2.0,"power/total":101.5,"power/rate":5.0}'),
+        ]
+        self.assertTrue(wait_for(lambda: self.broker.messages == expected))
@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.multi_device module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import os
+import pty
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+import power_counter.input_source
+import power_counter.multi_device
+import power_counter.serial_ifc
+import sml_test_data
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class MultiDeviceTest(TestCase):
+    """Test the functions of the :mod:`power_counter.multi_device` module."""
+
+    def test_process_devices(self) -> None:
+        """power_counter.multi_device.process_devices: Multiplex several serial devices."""
+        num_devices = 3
+        sources = []
+        masters = []
+        for idx in range(num_devices):
+            master_fd, slave_fd = pty.openpty()
+            device = power_counter.serial_ifc.parse_device_spec(f"{os.ttyname(slave_fd)},label=meter{idx}")
+            source = power_counter.input_source.open_source(device.port, close_on_exit=False)
+            os.close(slave_fd)
+            self.assertIsInstance(source, power_counter.input_source.SerialSource)
+            sources.append((device, source))
+            masters.append(master_fd)
+
+        def send_files():
+            for transaction_id in range(4):
+                for idx, master_fd in enumerate(masters):
+                    frame = sml_test_data.default_sml_file(transaction_id=transaction_id, seconds=1000 + idx)
+                    # Interleave the data of the devices
+                    os.write(master_fd, frame[:40])
+                    time.sleep(0.002)
+                    os.write(master_fd, frame[40:])
+                time.sleep(0.01)
+            time.sleep(0.1)
+            for master_fd in masters:
+                os.close(master_fd)
+
+        batches = []
+        sender = threading.Thread(target=send_files)
+        sender.start()
+        power_counter.multi_device.process_devices(
+            sources, reading_batch_cb=batches.append, obis_codes=frozenset([sml_test_data.OBIS_TOTAL])
+        )
+        sender.join()
+
+        self.assertEqual(4 * num_devices, len(batches))
+        for idx in range(num_devices):
+            device_batches = [batch for batch in batches if batch.label == f"meter{idx}"]
+            self.assertEqual(4, len(device_batches))
+            for batch in device_batches:
+                self.assertEqual([sml_test_data.OBIS_TOTAL], [reading.obis_code for reading in batch.readings])
+        for _, source in sources:
+            self.assertTrue(source.finished)
+            self.assertFalse(source.handle.is_open)
+
+    def test_callback_error(self) -> None:
+        """power_counter.multi_device.process_devices: Continue processing if a callback fails."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(3)]
+        batches = []
+
+        def reading_batch_cb(batch):
+            batches.append(batch)
+            if len(batches) == 1:
+                raise ValueError("Broken callback")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "capture.dat")
+            with open(path, "wb") as output_fh:
+                output_fh.write(b"".join(frames))
+            device = power_counter.serial_ifc.DeviceSpec(path, "local", "")
+            source = power_counter.input_source.open_source(path, "file", close_on_exit=False)
+            with self.assertLogs(level="ERROR") as logs:
+                power_counter.multi_device.process_devices([(device, source)], reading_batch_cb=reading_batch_cb)
+        self.assertEqual(3, len(batches))
+        self.assertIn("Processing an SML file of local failed", logs.output[0])
@@ -0,0 +1,53 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.obis module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+
+import power_counter.obis
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class ObisTest(TestCase):
+    """Test the functions of the :mod:`power_counter.obis` module."""
+
+    def test_parse_obis_id(self) -> None:
+        """power_counter.obis.parse_obis_id: Conversion of OBIS ID strings."""
+        self.assertEqual(bytes([1, 0, 1, 8, 0, 255]), power_counter.obis.parse_obis_id("1-0:1.8.0*255"))
+        self.assertEqual(bytes([129, 129, 199, 130, 3, 255]), power_counter.obis.parse_obis_id("129-129:199.130.3*255"))
+        self.assertIsNone(power_counter.obis.parse_obis_id("1-0:1.8.0"))
+        self.assertIsNone(power_counter.obis.parse_obis_id("1-0:1.8.0*256"))
+        self.assertIsNone(power_counter.obis.parse_obis_id("power/total"))
+
+    def test_get_obis_codes(self) -> None:
+        """power_counter.obis.get_obis_codes: Invalid OBIS IDs are ignored."""
+        with self.assertLogs(level="ERROR"):
+            obis_codes = power_counter.obis.get_obis_codes(["1-0:1.8.0*255", "1-0:16.7.0*255", "invalid"])
+        self.assertEqual(frozenset([bytes([1, 0, 1, 8, 0, 255]), bytes([1, 0, 16, 7, 0, 255])]), obis_codes)
+
+    def test_get_obis_id(self) -> None:
+        """power_counter.obis.get_obis_id: Interned OBIS ID strings."""
+        obis_id = power_counter.obis.get_obis_id(bytes([1, 0, 2, 8, 0, 255]))
+        self.assertEqual("1-0:2.8.0*255", obis_id)
+        self.assertIs(obis_id, power_counter.obis.get_obis_id(bytes([1, 0, 2, 8, 0, 255])))
+        self.assertEqual(bytes([1, 0, 2, 8, 0, 255]), power_counter.obis.parse_obis_id(obis_id))
+        self.assertEqual(str(b"\x81\x81"), power_counter.obis.get_obis_id(b"\x81\x81"))
+
+    def test_get_unit_name(self) -> None:
+        """power_counter.obis.get_unit_name: Names of the DLMS unit codes."""
+        self.assertEqual("W", power_counter.obis.get_unit_name(power_counter.obis.UNIT_W))
+        self.assertEqual("Wh", power_counter.obis.get_unit_name(power_counter.obis.UNIT_WH))
+        self.assertEqual("V", power_counter.obis.get_unit_name(35))
+        self.assertEqual("count", power_counter.obis.get_unit_name(255))
+        self.assertEqual("58", power_counter.obis.get_unit_name(58))
+        self.assertIsNone(power_counter.obis.get_unit_name(None))
@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.offline module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import io
+import os
+import tempfile
+from argparse import Namespace
+from unittest import TestCase
+
+import power_counter.offline
+import power_counter.sml_message_processor
+import sml_test_data
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class OfflineTest(TestCase):
+    """Test the functions of the :mod:`power_counter.offline` module."""
+
+    def test_split_at_start_markers(self) -> None:
+        """power_counter.offline.split_at_start_markers: Split only before start markers."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(10)]
+        data = b"\x00" * 5 + b"".join(frames)
+        chunks = power_counter.offline.split_at_start_markers(data, 500)
+        self.assertEqual(0, chunks[0][0])
+        self.assertEqual(len(data), chunks[-1][1])
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+            self.assertTrue(data.startswith(power_counter.offline.START_MARKER, start))
+        self.assertEqual([(0, len(data))], power_counter.offline.split_at_start_markers(data, len(data)))
+
+    def test_process_file_parallel(self) -> None:
+        """power_counter.offline.process_file_parallel: Same readings in the same order as the sequential parser."""
+        frames = [
+            sml_test_data.default_sml_file(
+                [(sml_test_data.OBIS_TOTAL, 30, -1, 1000 + idx), (sml_test_data.OBIS_POWER, 27, 0, idx)],
+                transaction_id=idx,
+            )
+            for idx in range(50)
+        ]
+        # A truncated SML file and some noise between the files
+        data = b"".join(frames[:20]) + frames[20][:101] + b"".join(frames[21:40]) + b"\x00" * 7 + b"".join(frames[40:])
+        expected = []
+        with self.assertLogs(level="ERROR"):
+            power_counter.sml_message_processor.process(
+                Namespace(input_file=True),
+                io.BytesIO(data),
+                reading_batch_cb=lambda batch: expected.append(batch.readings),
+            )
+        self.assertEqual(49, len(expected))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "capture.dat")
+            with open(path, "wb") as output_fh:
+                output_fh.write(data)
+            batches = []
+            self.assertTrue(power_counter.offline.process_file_parallel(path, batches.append, jobs=2, chunk_size=1000))
+            self.assertEqual(expected, [batch.readings for batch in batches])
+
+            empty_path = os.path.join(tmp_dir, "empty.dat")
+            open(empty_path, "wb").close()  # pylint: disable=consider-using-with
+            self.assertTrue(power_counter.offline.process_file_parallel(empty_path, batches.append))
+            self.assertFalse(power_counter.offline.process_file_parallel(os.path.join(tmp_dir, "missing.dat"), print))
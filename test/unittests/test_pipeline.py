@@ -0,0 +1,122 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.pipeline module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import io
+import threading
+from unittest import TestCase
+
+import power_counter.pipeline
+import sml_test_data
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class PipelineTest(TestCase):
+    """Test the classes of the :mod:`power_counter.pipeline` module."""
+
+    def test_overflow_policies(self) -> None:
+        """power_counter.pipeline.BoundedQueue: Handle full queues according to the overflow policy."""
+        with self.assertRaises(ValueError):
+            power_counter.pipeline.BoundedQueue("test", 2, "unknown")
+
+        drop_newest = power_counter.pipeline.BoundedQueue("test", 2, power_counter.pipeline.OVERFLOW_DROP_NEWEST)
+        drop_oldest = power_counter.pipeline.BoundedQueue("test", 2, power_counter.pipeline.OVERFLOW_DROP_OLDEST)
+        for item in range(5):
+            self.assertEqual(item < 2, drop_newest.put(item))
+            self.assertTrue(drop_oldest.put(item))
+        for bounded_queue, expected in [(drop_newest, [0, 1]), (drop_oldest, [3, 4])]:
+            self.assertEqual(2, bounded_queue.depth)
+            self.assertEqual(2, bounded_queue.max_depth)
+            self.assertEqual(3, bounded_queue.dropped)
+            self.assertEqual(expected, [bounded_queue.get(), bounded_queue.get()])
+            self.assertIn("dropped 3 items", str(bounded_queue))
+
+        block = power_counter.pipeline.BoundedQueue("test", 1, power_counter.pipeline.OVERFLOW_BLOCK)
+        block.put(0)
+        thread = threading.Thread(target=block.put, args=(1,))
+        thread.start()
+        thread.join(0.05)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(0, block.get())
+        thread.join()
+        self.assertEqual(1, block.get())
+        self.assertEqual(0, block.dropped)
+
+    def test_pipeline(self) -> None:
+        """power_counter.pipeline.SmlPipeline: Pass the parsed SML files to all sinks."""
+        data = b"".join(sml_test_data.default_sml_file(transaction_id=idx) for idx in range(5))
+        results = {"first": [], "second": []}
+        pipeline = power_counter.pipeline.SmlPipeline(
+            io.BytesIO(data).read,
+            lambda file_data, arrival_time: None if file_data[-1] & 1 else file_data,
+            [(name, items.append) for name, items in results.items()],
+        )
+        pipeline.run()
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(5)]
+        expected = [frame for frame in frames if not frame[-1] & 1]
+        self.assertEqual(expected, results["first"])
+        self.assertEqual(expected, results["second"])
+        self.assertEqual(["files", "first", "second"], [bounded_queue.name for bounded_queue in pipeline.queues])
+
+    def test_slow_sink(self) -> None:
+        """power_counter.pipeline.SmlPipeline: Keep reading while a sink is blocked."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(10)]
+        chunks = iter(frames)
+        all_read = threading.Event()
+        release_sink = threading.Event()
+        results = []
+
+        def read():
+            chunk = next(chunks, b"")
+            if not chunk:
+                all_read.set()
+            return chunk
+
+        def sink(item):
+            release_sink.wait()
+            results.append(item)
+
+        pipeline = power_counter.pipeline.SmlPipeline(
+            read,
+            lambda file_data, arrival_time: file_data,
+            [("slow", sink)],
+            queue_size=2,
+            overflow_policy=power_counter.pipeline.OVERFLOW_DROP_OLDEST,
+        )
+        pipeline.start()
+        self.assertTrue(all_read.wait(5.0))
+        release_sink.set()
+        self.assertTrue(pipeline.join(5.0))
+        self.assertEqual(frames[-2:], results[-2:])
+        self.assertEqual(10, len(results) + sum(bounded_queue.dropped for bounded_queue in pipeline.queues))
+        self.assertLess(len(results), 10)
+
+    def test_read_error(self) -> None:
+        """power_counter.pipeline.SmlPipeline: Stop and report the failure if reading the input fails."""
+        frame = sml_test_data.default_sml_file()
+        chunks = iter([frame])
+        results = []
+
+        def read():
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise OSError("Device disconnected")
+            return chunk
+
+        pipeline = power_counter.pipeline.SmlPipeline(
+            read, lambda file_data, arrival_time: file_data, [("sink", results.append)]
+        )
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(pipeline.run(statistics_interval=1.0))
+        self.assertIsInstance(pipeline.error, OSError)
+        self.assertEqual([frame], results)
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.publish_rules module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import argparse
+from unittest import TestCase
+
+import power_counter.publish_rules
+import sml_test_data
+from power_counter.publish_rules import PublishFilter, PublishRule
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class PublishRulesTest(TestCase):
+    """Test the functions and classes of the :mod:`power_counter.publish_rules` module."""
+
+    def test_parse_publish_rule(self) -> None:
+        """power_counter.publish_rules.parse_publish_rule: Parse the rule options."""
+        parse = power_counter.publish_rules.parse_publish_rule
+        self.assertEqual(PublishRule(sml_test_data.OBIS_TOTAL), parse("1-0:1.8.0*255"))
+        self.assertEqual(
+            PublishRule(sml_test_data.OBIS_TOTAL, 10.0, False, 5.0, 300.0),
+            parse("1-0:1.8.0*255,deadband=10,min-interval=5,heartbeat=300"),
+        )
+        self.assertEqual(PublishRule(sml_test_data.OBIS_POWER, 0.05, True), parse("1-0:16.7.0*255,deadband=5%"))
+        for spec in [
+            "1-0:1.8.0",
+            "1-0:1.8.0*255,deadband",
+            "1-0:1.8.0*255,interval=5",
+            "1-0:1.8.0*255,deadband=x",
+            "1-0:1.8.0*255,min-interval=-1",
+            "1-0:1.8.0*255,heartbeat=0",
+        ]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse(spec)
+
+    def test_deadband(self) -> None:
+        """power_counter.publish_rules.PublishFilter.check: Publish only changes larger than the deadband."""
+        publish_filter = PublishFilter([PublishRule(sml_test_data.OBIS_TOTAL, 1.0)])
+        values = [100.0, 100.5, 101.0, 101.5, 99.0, 99.0]
+        results = [
+            publish_filter.check("power/total", sml_test_data.OBIS_TOTAL, value, float(idx))
+            for idx, value in enumerate(values)
+        ]
+        self.assertEqual([True, False, False, True, True, False], results)
+        self.assertEqual(3, publish_filter.suppressed)
+
+        # Readings of other OBIS IDs are always published, the table is kept per topic
+        self.assertTrue(publish_filter.check("power/rate", sml_test_data.OBIS_POWER, 5.0, 6.0))
+        self.assertTrue(publish_filter.check("power/rate", sml_test_data.OBIS_POWER, 5.0, 7.0))
+        self.assertTrue(publish_filter.check("heatpump/power/total", sml_test_data.OBIS_TOTAL, 99.0, 8.0))
+
+    def test_relative_deadband(self) -> None:
+        """power_counter.publish_rules.PublishFilter.check: Deadband relative to the last published value."""
+        publish_filter = PublishFilter([PublishRule(sml_test_data.OBIS_POWER, 0.1, True)])
+        results = [
+            publish_filter.check("power/rate", sml_test_data.OBIS_POWER, value, float(idx))
+            for idx, value in enumerate([200.0, 215.0, 225.0, 240.0, -240.0])
+        ]
+        self.assertEqual([True, False, True, False, True], results)
+
+    def test_intervals(self) -> None:
+        """power_counter.publish_rules.PublishFilter.check: Apply the minimum interval and the heartbeat."""
+        publish_filter = PublishFilter([PublishRule(sml_test_data.OBIS_POWER, 0.0, False, 2.0, 5.0)])
+        values = [1.0, 2.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0]
+        results = [
+            publish_filter.check("power/rate", sml_test_data.OBIS_POWER, value, float(idx))
+            for idx, value in enumerate(values)
+        ]
+        # Changes at 1 s are suppressed by the minimum interval, the heartbeat repeats the value after 5 s
+        self.assertEqual([True, False, True, False, False, False, False, True, False], results)
@@ -0,0 +1,45 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.serial_ifc module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import argparse
+from unittest import TestCase
+
+import power_counter.serial_ifc
+from power_counter.serial_ifc import DeviceSpec
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class SerialInterfaceTest(TestCase):
+    """Test the functions of the :mod:`power_counter.serial_ifc` module."""
+
+    def test_parse_device_spec(self) -> None:
+        """power_counter.serial_ifc.parse_device_spec: Parse the port, label and topic prefix of a device."""
+        parse = power_counter.serial_ifc.parse_device_spec
+        self.assertEqual(DeviceSpec("/dev/ttyUSB1", "ttyUSB1", ""), parse("/dev/ttyUSB1"))
+        self.assertEqual(DeviceSpec("/dev/ttyUSB1", "house", ""), parse("/dev/ttyUSB1,label=house"))
+        self.assertEqual(
+            DeviceSpec("/dev/ttyUSB1", "house", "home/house/"), parse("/dev/ttyUSB1,prefix=home/house/,label=house")
+        )
+        for spec in ["", ",label=house", "/dev/ttyUSB1,house", "/dev/ttyUSB1,name=house"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse(spec)
+
+    def test_get_devices(self) -> None:
+        """power_counter.serial_ifc.get_devices: Get the default device and reject duplicate labels."""
+        self.assertEqual(
+            [DeviceSpec(power_counter.serial_ifc.DEFAULT_DEVICE, "ttyUSB0", "")],
+            power_counter.serial_ifc.get_devices(argparse.Namespace(device=None)),
+        )
+        devices = [DeviceSpec("/dev/ttyUSB0", "meter", ""), DeviceSpec("/dev/ttyUSB1", "meter", "")]
+        self.assertEqual([], power_counter.serial_ifc.get_devices(argparse.Namespace(device=devices)))
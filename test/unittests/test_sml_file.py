@@ -16,6 +16,7 @@ from unittest import TestCase
 
 import power_counter.sml_file
 import power_counter.sml_file_extractor
+import sml_test_data
 from power_counter.crc import crc16_x25
 
 # ----------------------------------------------------------------------------
@@ -135,6 +136,39 @@ class SmlFileTest(TestCase):
         self.assertEqual(next_idx, 2)
         self.assertIsNone(field)
 
+    def test_nested_lists(self) -> None:
+        """power_counter.sml_file.SmlFile: Nested list extraction."""
+        field_data = sml_test_data.sml_list(
+            [
+                sml_test_data.unsigned(1),
+                sml_test_data.sml_list([sml_test_data.octet_string(b"ab"), sml_test_data.signed(-1)]),
+                sml_test_data.sml_list([sml_test_data.unsigned(idx) for idx in range(20)]),
+                sml_test_data.sml_list([sml_test_data.sml_list([b"\x42\x00"])]),
+            ]
+        )
+        file = power_counter.sml_file.SmlFile(field_data + b"\x00\x00")
+        next_idx, field = file._get_next_field(0)  # pylint: disable=protected-access
+        self.assertEqual(next_idx, len(field_data))
+        self.assertEqual(field, [1, [b"ab", -1], list(range(20)), [[False]]])
+
+    def test_debug_log(self) -> None:
+        """power_counter.sml_file.SmlFile: Debug output of the field extraction."""
+        field_data = sml_test_data.sml_list([sml_test_data.unsigned(1), sml_test_data.sml_list([b"\x42\x01"])])
+        file = power_counter.sml_file.SmlFile(field_data + b"\x00\x00")
+        with self.assertLogs(level="DEBUG") as logs:
+            file._get_next_field(0)  # pylint: disable=protected-access
+        self.assertEqual(
+            [
+                "DEBUG:root:Found list of 2 fields.",
+                "DEBUG:root:  Found unsigned integer field of 2 bytes.",
+                "DEBUG:root:  Found list of 1 fields.",
+                "DEBUG:root:    Found binary field (1 byte).",
+                "DEBUG:root:  Done extracting list of 1 fields.",
+                "DEBUG:root:Done extracting list of 2 fields.",
+            ],
+            logs.output,
+        )
+
     def test_on_files(self) -> None:
         """power_counter.sml_file.SmlFileExtractor: Data from libsml-testing files."""
         for filename in LIBSML_TESTING_DIR.glob("*.bin"):
@@ -147,3 +181,88 @@ class SmlFileTest(TestCase):
                 sml_file = power_counter.sml_file.SmlFile(file_data)
                 if sml_file.valid_crc:
                     self.assertTrue(sml_file.messages, msg=f"Testing content of file {filename}")
+
+    def test_on_frame(self) -> None:
+        """power_counter.sml_file.SmlFile: Use the data of the SmlFrame object."""
+        escaped_entry = (sml_test_data.OBIS_TOTAL, 30, -1, 0x1B1B1B1B1B1B1B1B)
+        data = sml_test_data.default_sml_file(list(sml_test_data.DEFAULT_ENTRIES) + [escaped_entry])
+        frames = power_counter.sml_file_extractor.SmlFileExtractor().add_bytes(data)
+        self.assertEqual(1, len(frames))
+
+        sml_file_from_bytes = power_counter.sml_file.SmlFile(bytes(data))
+        sml_file_from_frame = power_counter.sml_file.SmlFile(frames[0])
+        self.assertTrue(sml_file_from_frame.valid_crc)
+        self.assertEqual(3, len(sml_file_from_frame.messages))
+        self.assertEqual(sml_file_from_bytes.data, sml_file_from_frame.data)
+        self.assertEqual(sml_file_from_bytes.messages, sml_file_from_frame.messages)
+        self.assertEqual(sml_file_from_bytes.message_offsets, sml_file_from_frame.message_offsets)
+        self.assertEqual(8, sml_file_from_frame.message_offsets[0])
+
+    def test_message_crc(self) -> None:
+        """power_counter.sml_file.SmlFile: Messages with an invalid CRC are dropped."""
+        data = bytearray(sml_test_data.default_sml_file())
+        # Change the last byte of the value of the last list entry and fix the file CRC
+        value_index = data.rfind(b"\x59\xff") + 8
+        data[value_index] ^= 0x01
+        data[-2:] = crc16_x25(data[:-2]).to_bytes(2, byteorder="big")
+
+        frames = power_counter.sml_file_extractor.SmlFileExtractor().add_bytes(bytes(data))
+        for sml_file in [power_counter.sml_file.SmlFile(bytes(data)), power_counter.sml_file.SmlFile(frames[0])]:
+            self.assertTrue(sml_file.valid_crc)
+            self.assertEqual(2, len(sml_file.messages))
+
+    def test_obis_codes(self) -> None:
+        """power_counter.sml_file.SmlFile: Skip the list entries of uninteresting object names."""
+        data = sml_test_data.default_sml_file()
+        full_file = power_counter.sml_file.SmlFile(data)
+        full_entries = full_file.messages[1].list_entries
+        for obis_codes in [
+            {sml_test_data.OBIS_TOTAL, sml_test_data.OBIS_POWER},
+            {sml_test_data.OBIS_MANUFACTURER},
+            {sml_test_data.OBIS_POWER},
+            set(),
+        ]:
+            sml_file = power_counter.sml_file.SmlFile(data, obis_codes)
+            self.assertTrue(sml_file.valid_crc)
+            self.assertEqual(3, len(sml_file.messages), msg=f"Using {obis_codes}")
+            self.assertEqual(full_file.message_offsets, sml_file.message_offsets)
+            self.assertEqual(full_file.messages[0], sml_file.messages[0])
+            self.assertEqual(full_file.messages[2], sml_file.messages[2])
+            expected_entries = [
+                entry
+                for entry, entry_data in zip(full_entries, sml_test_data.DEFAULT_ENTRIES)
+                if entry_data[0] in obis_codes
+            ]
+            self.assertEqual(expected_entries, sml_file.messages[1].list_entries, msg=f"Using {obis_codes}")
+
+    def test_template_cache(self) -> None:
+        """power_counter.sml_file.SmlFile: Parse files of the same structure using the template cache."""
+        frames = []
+        for idx in range(8):
+            entries = [
+                (sml_test_data.OBIS_MANUFACTURER, None, None, 0x454D48),
+                (sml_test_data.OBIS_TOTAL, 30, -1, 123456789 + idx // 2),
+                (sml_test_data.OBIS_FEED_TOTAL, 30, -1, 4711 + idx),
+                (sml_test_data.OBIS_POWER, 27, 0, -250 + 10 * idx),
+            ]
+            if idx == 5:
+                # Change of the structure
+                entries.append((sml_test_data.OBIS_POWER, 27, 0, 100))
+            frames.append(sml_test_data.default_sml_file(entries, transaction_id=idx, seconds=1000 + idx))
+        # Invalid message CRC within a volatile field
+        data = bytearray(frames[-1])
+        data[data.rfind(b"\x59\xff") + 8] ^= 0x01
+        data[-2:] = crc16_x25(data[:-2]).to_bytes(2, byteorder="big")
+        frames.append(bytes(data))
+
+        for obis_codes in [None, {sml_test_data.OBIS_TOTAL, sml_test_data.OBIS_POWER}]:
+            template_cache = power_counter.sml_file.SmlTemplateCache()
+            for idx, frame in enumerate(frames):
+                expected = power_counter.sml_file.SmlFile(frame, obis_codes)
+                sml_file = power_counter.sml_file.SmlFile(frame, obis_codes, template_cache)
+                self.assertEqual(expected.messages, sml_file.messages, msg=f"Frame {idx} using {obis_codes}")
+                self.assertEqual(expected.message_offsets, sml_file.message_offsets)
+            self.assertEqual(len(frames), template_cache.hits + template_cache.misses)
+            # Misses: First file, first changes of the values (files 1 and 2), change of the structure
+            # (file 5), change back (file 6) and the values after the change back (file 7)
+            self.assertEqual(6, template_cache.misses, msg=f"Using {obis_codes}")
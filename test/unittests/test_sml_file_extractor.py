@@ -12,9 +12,12 @@
 # Module Import
 # -----------------------------------------------------------------------------
 from pathlib import Path
+from typing import List
 from unittest import TestCase
 
 import power_counter.sml_file_extractor
+import sml_test_data
+from power_counter.crc import crc16_x25
 
 # ----------------------------------------------------------------------------
 #  LIBSML-TESTING DIRECTORY
@@ -22,6 +25,19 @@ import power_counter.sml_file_extractor
 LIBSML_TESTING_DIR = Path(__file__).parent.parent / "libsml-testing"
 
 
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def extract_in_chunks(data: bytes, chunk_size: int) -> List[bytes]:
+    """Feed the data in chunks of the given size into a new extractor and return the extracted files."""
+    extractor = power_counter.sml_file_extractor.SmlFileExtractor()
+    files = []
+    for start in range(0, len(data), chunk_size):
+        end = start + chunk_size
+        files.extend(extractor.add_bytes(data[start:end]))
+    return files
+
+
 # -----------------------------------------------------------------------------
 # Test Class
 # -----------------------------------------------------------------------------
@@ -97,3 +113,93 @@ class SmlFileExtractorTest(TestCase):
                 self.assertFalse(files, msg=f"Testing content of file {filename}")
             else:
                 self.assertTrue(files, msg=f"Testing content of file {filename}")
+
+    def test_frame_data(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Unescaped data and checksum of the frames."""
+        escaped_entry = (sml_test_data.OBIS_TOTAL, 30, -1, 0x1B1B1B1B1B1B1B1B)
+        sml_file = sml_test_data.default_sml_file(list(sml_test_data.DEFAULT_ENTRIES) + [escaped_entry])
+        self.assertIn(sml_test_data.ESCAPE_SEQUENCE * 2, sml_file[8:-8])
+        expected_data = sml_file.replace(sml_test_data.ESCAPE_SEQUENCE * 2, sml_test_data.ESCAPE_SEQUENCE)
+
+        for chunk_size in [1, 3, 4, 16, 128, 1024]:
+            extractor = power_counter.sml_file_extractor.SmlFileExtractor()
+            stream = b"\x00\x1b" + sml_file + sml_file + b"\x1b\x1b"
+            files = []
+            for start in range(0, len(stream), chunk_size):
+                end = start + chunk_size
+                files.extend(extractor.add_bytes(stream[start:end]))
+            self.assertEqual(2, len(files), msg=f"{chunk_size=}")
+            for file in files:
+                self.assertEqual(sml_file, file)
+                self.assertEqual(expected_data, file.data)
+                self.assertEqual(crc16_x25(expected_data[:-2]), file.crc.digest())
+                self.assertEqual(crc16_x25(expected_data[10:100]), file.crc.range_digest(file.data, 10, 100))
+
+    def test_buffer_handling(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Moving and growing the internal buffer."""
+        sml_files = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(5)]
+        stream = b"\x00" * 5 + b"".join(sml_files) + sml_files[0][:20]
+        for buffer_size in [16, 64, 1024]:
+            extractor = power_counter.sml_file_extractor.SmlFileExtractor(buffer_size=buffer_size)
+            files = []
+            for start in range(0, len(stream), 7):
+                end = start + 7
+                files.extend(extractor.add_bytes(stream[start:end]))
+            self.assertEqual(sml_files, files, msg=f"{buffer_size=}")
+            self.assertEqual(sml_files[0][:20], extractor.buffer)
+
+    def test_noise(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Bounded memory on data without a start marker."""
+        extractor = power_counter.sml_file_extractor.SmlFileExtractor(buffer_size=256, max_frame_size=512)
+        noise = bytes(range(256)) * 400
+        for start in range(0, len(noise), 128):
+            end = start + 128
+            self.assertFalse(extractor.add_bytes(noise[start:end]))
+            self.assertLess(len(extractor.buffer), 8)
+        self.assertEqual(len(noise) - len(extractor.buffer), extractor.dropped_bytes)
+
+        sml_file = sml_test_data.default_sml_file()
+        self.assertEqual([sml_file], extractor.add_bytes(sml_file))
+
+    def test_max_frame_size(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Resynchronisation after exceeding the maximum size."""
+        extractor = power_counter.sml_file_extractor.SmlFileExtractor(max_frame_size=512, buffer_budget=1024)
+        sml_file = sml_test_data.default_sml_file()
+        broken_file = sml_file[:100] + b"\x00" * 2000
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual([sml_file], extractor.add_bytes(broken_file + b"\x00\x00" + sml_file))
+        self.assertIn("exceeds the maximum size", logs.output[0])
+        self.assertEqual(len(broken_file) + 2, extractor.dropped_bytes)
+        self.assertLessEqual(len(extractor._buffer), 1024)  # pylint: disable=protected-access
+
+    def test_truncated(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Resynchronisation on an unaligned start marker."""
+        sml_files = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(59)]
+        truncated_file = sml_test_data.default_sml_file()[:101]
+        data = truncated_file + b"".join(sml_files)
+        for chunk_size in [1, 7, 64, len(data)]:
+            extractor = power_counter.sml_file_extractor.SmlFileExtractor()
+            extracted = []
+            with self.assertLogs(level="ERROR") as logs:
+                for start in range(0, len(data), chunk_size):
+                    end = start + chunk_size
+                    extracted += extractor.add_bytes(data[start:end])
+            self.assertEqual(sml_files, extracted, msg=f"{chunk_size=}")
+            self.assertIn("found message start marker", logs.output[0])
+            self.assertEqual(len(truncated_file), extractor.dropped_bytes)
+
+    def test_invalid_budget(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Buffer budget smaller than the maximum frame size."""
+        with self.assertRaises(ValueError):
+            power_counter.sml_file_extractor.SmlFileExtractor(max_frame_size=1024, buffer_budget=1024)
+
+    def test_chunk_sizes(self) -> None:
+        """power_counter.sml_file_extractor.SmlFileExtractor: Same SML files when feeding the data in chunks."""
+        long_entries = [(sml_test_data.OBIS_TOTAL, 30, -1, idx * 1000) for idx in range(60)]
+        corpus = [sml_test_data.default_sml_file(long_entries, transaction_id=idx) for idx in range(20)]
+        corpus.extend(filename.read_bytes() for filename in sorted(LIBSML_TESTING_DIR.glob("*.bin")))
+        expected_files = [extract_in_chunks(data, len(data)) for data in corpus]
+
+        for chunk_size in [1, 16, 128]:
+            files = [extract_in_chunks(data, chunk_size) for data in corpus]
+            self.assertEqual(expected_files, files, msg=f"{chunk_size=}")
@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.sml_message module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+from datetime import datetime
+from typing import Optional
+from unittest import TestCase
+
+import power_counter.sml_file
+import power_counter.sml_message
+import sml_test_data
+from power_counter.sml_message import (
+    SmlListEntry,
+    SmlMessageCloseResponse,
+    SmlMessageGetListResponse,
+    SmlMessageOpenResponse,
+)
+from power_counter.sml_types import FieldType
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+LIST_ENTRY_FIELDS = [bytes([1, 0, 1, 8, 0, 255]), 0x1C0104, b"", 30, -1, 123456789, b""]
+
+
+# -----------------------------------------------------------------------------
+# Helper Functions
+# -----------------------------------------------------------------------------
+def list_entry_fields(entry: sml_test_data.ListEntryData) -> FieldType:
+    """Get the decoded fields of a list entry encoded by sml_test_data.list_entry()."""
+    obj_name, unit, scaler, value = entry
+    return [
+        obj_name,
+        0x1C0104 if unit is not None else b"",
+        b"",
+        unit if unit is not None else b"",
+        scaler if scaler is not None else b"",
+        value,
+        b"",
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Reference Implementation
+# -----------------------------------------------------------------------------
+def list_entry_reference(list_item: FieldType) -> Optional[SmlListEntry]:
+    """Convert a list entry by checking the dataclass fields on every call."""
+    if not isinstance(list_item, list) or len(list_item) != len(SmlListEntry.__dataclass_fields__):
+        return None
+    for field, field_obj in zip(list_item, SmlListEntry.__dataclass_fields__.values()):
+        # pylint: disable=protected-access
+        if type(field) not in power_counter.sml_message._get_matching_msg_types(field_obj.type):
+            return None
+
+    def optional(field):
+        return None if isinstance(field, bytes) and len(field) == 0 else field
+
+    return SmlListEntry(
+        obj_code=list_item[0],
+        status=optional(list_item[1]),
+        val_time_raw=optional(list_item[2]),
+        unit_raw=optional(list_item[3]),
+        scaler=optional(list_item[4]),
+        value=list_item[5],
+        value_signature=optional(list_item[6]),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class SmlMessageTest(TestCase):
+    """Test the :mod:`power_counter.sml_message` module."""
+
+    def test_compiled_schema(self) -> None:
+        """power_counter.sml_message.COMPILED_SCHEMAS: Compatible types of the list entry fields."""
+        self.assertEqual(
+            (
+                frozenset({bytes}),
+                frozenset({bytes, int}),
+                frozenset({bytes, int, list}),
+                frozenset({bytes, int}),
+                frozenset({bytes, int}),
+                frozenset({bytes, int}),
+                frozenset({bytes}),
+            ),
+            power_counter.sml_message.COMPILED_SCHEMAS[SmlListEntry],
+        )
+
+    def test_list_entry(self) -> None:
+        """power_counter.sml_message.SmlListEntry: Conversion of the list of fields."""
+        entry = SmlListEntry.from_fields(LIST_ENTRY_FIELDS)
+        self.assertIsNotNone(entry)
+        self.assertEqual("1-0:1.8.0*255", entry.obj_name)
+        self.assertEqual("Wh", entry.unit)
+        self.assertIsNone(entry.val_time)
+        self.assertFalse(hasattr(entry, "__dict__"))
+
+        entry = SmlListEntry.from_fields([b"\x81\x81", b"", [2, 1600000000], 200, b"", b"EMH", b""])
+        self.assertEqual(str(b"\x81\x81"), entry.obj_name)
+        self.assertEqual("200", entry.unit)
+        self.assertEqual(datetime.fromtimestamp(1600000000), entry.val_time)
+        self.assertEqual([2, 1600000000], entry.val_time_raw)
+
+    def test_mismatch_report(self) -> None:
+        """power_counter.sml_message.SmlListEntry: Report of mismatching fields."""
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertIsNone(SmlListEntry.from_fields(LIST_ENTRY_FIELDS[:6] + [True]))
+            self.assertIsNone(SmlListEntry.from_fields(LIST_ENTRY_FIELDS[:6]))
+            self.assertIsNone(SmlListEntry.from_fields(b""))
+        self.assertEqual(4, len(logs.output))
+        self.assertIn("does not match field definition", logs.output[0])
+        self.assertIn("value_signature", logs.output[1])
+        self.assertIn("(#6) has type <class 'bool'>", logs.output[1])
+        self.assertIn("must be encoded as a list of 7 elements, but data consists of 6 elements", logs.output[2])
+        self.assertIn("must be of type list", logs.output[3])
+
+    def test_get_message(self) -> None:
+        """power_counter.sml_message.get_message: Conversion of all supported message types."""
+        sml_file = power_counter.sml_file.SmlFile(sml_test_data.default_sml_file())
+        self.assertEqual(3, len(sml_file.messages))
+        open_response, get_list_response, close_response = sml_file.messages
+        self.assertEqual(
+            SmlMessageOpenResponse(
+                codepage="iso-8859-15",
+                client_id=None,
+                req_file_id=b"\x10\x20",
+                server_id=b"\x0a\x01EMH\x00\x00\x01\x02\x03",
+                ref_time_raw=None,
+                sml_version=1,
+            ),
+            open_response,
+        )
+        self.assertIsInstance(get_list_response, SmlMessageGetListResponse)
+        self.assertEqual(1000, get_list_response.act_sensor_time)
+        self.assertEqual(
+            [list_entry_reference(list_entry_fields(entry)) for entry in sml_test_data.DEFAULT_ENTRIES],
+            get_list_response.list_entries,
+        )
+        self.assertEqual(SmlMessageCloseResponse(global_signature=None), close_response)
+
+    def test_decoder_reference(self) -> None:
+        """power_counter.sml_message.SmlListEntry: Generated decoder gives the same results as the reference."""
+        list_items = [
+            LIST_ENTRY_FIELDS,
+            [bytes([1, 0, 16, 7, 0, 255]), b"", [1, 12345], 27, 0, -250, b"\x01\x02"],
+            [b"\x81\x81", b"", b"", b"", b"", b"EMH", b""],
+        ]
+        for list_item in list_items:
+            self.assertEqual(list_entry_reference(list_item), SmlListEntry.from_fields(list_item))
@@ -0,0 +1,166 @@
+#
+# Copyright (c) 2020 by Clemens Rabe <clemens.rabe@clemensrabe.de>
+# All rights reserved.
+# This file is part of powercounter (https://github.com/seeraven/powercounter)
+# and is released under the "BSD 3-Clause License". Please see the LICENSE file
+# that is included as part of this package.
+#
+"""Unit tests of the power_counter.sml_message_processor module."""
+
+# -----------------------------------------------------------------------------
+# Module Import
+# -----------------------------------------------------------------------------
+import asyncio
+import io
+import os
+import pty
+import threading
+import time
+from argparse import Namespace
+from unittest import TestCase
+
+import power_counter.serial_ifc
+import power_counter.sml_message_processor
+import sml_test_data
+
+
+# -----------------------------------------------------------------------------
+# Test Class
+# -----------------------------------------------------------------------------
+class SmlMessageProcessorTest(TestCase):
+    """Test the functions of the :mod:`power_counter.sml_message_processor` module."""
+
+    def test_readings(self) -> None:
+        """power_counter.sml_message_processor.process: Scaled readings of all SML files."""
+        data = sml_test_data.default_sml_file(transaction_id=1) + sml_test_data.default_sml_file(transaction_id=2)
+        readings = []
+        power_counter.sml_message_processor.process(
+            Namespace(input_file=True), io.BytesIO(data), None, lambda *reading: readings.append(reading)
+        )
+        expected = [
+            ("1-0:1.8.0*255", 12345678.9, "Wh"),
+            ("1-0:2.8.0*255", 471.1, "Wh"),
+            ("1-0:16.7.0*255", -250.0, "W"),
+        ]
+        self.assertEqual(2 * expected, [(name, round(value, 3), unit) for name, value, unit in readings])
+
+    def test_file_cache(self) -> None:
+        """power_counter.sml_message_processor.process_sml_file: Reuse the results of identical files."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(3)]
+        file_cache = power_counter.sml_message_processor.SmlFileCache(max_size=2)
+        sml_files = []
+        readings = []
+
+        def sml_file_cb(_, sml_file):
+            sml_files.append(sml_file)
+
+        def obis_data_cb(*reading):
+            readings.append(reading)
+
+        for frame in [frames[0], frames[1], frames[0], frames[2], frames[1]]:
+            power_counter.sml_message_processor.process_sml_file(
+                frame, sml_file_cb, obis_data_cb, file_cache=file_cache
+            )
+        self.assertEqual(1, file_cache.hits)
+        self.assertEqual(4, file_cache.misses)
+        self.assertIs(sml_files[0], sml_files[2])
+        # frames[1] was dropped as least recently used entry
+        self.assertIsNot(sml_files[1], sml_files[4])
+        self.assertEqual(sml_files[1].messages, sml_files[4].messages)
+        # The callbacks are called for cached files as well
+        self.assertEqual(5, len(sml_files))
+        self.assertEqual(15, len(readings))
+
+        sml_file, file_readings = power_counter.sml_message_processor.process_sml_file(
+            frames[2], None, None, file_cache=file_cache
+        )
+        self.assertIs(sml_files[3], sml_file)
+        self.assertEqual(readings[9:12], [reading[1:4] for reading in file_readings])
+
+    def test_reading_batch(self) -> None:
+        """power_counter.sml_message_processor.process: Readings of each SML file as a batch."""
+        data = sml_test_data.default_sml_file(transaction_id=1) + sml_test_data.default_sml_file(transaction_id=2)
+        batches = []
+        start_time = time.time()
+        power_counter.sml_message_processor.process(
+            Namespace(input_file=True), io.BytesIO(data), reading_batch_cb=batches.append
+        )
+        self.assertEqual(2, len(batches))
+        for batch in batches:
+            self.assertIsInstance(batch, power_counter.sml_message_processor.SmlReadingBatch)
+            self.assertGreaterEqual(batch.timestamp, start_time)
+            self.assertEqual(
+                [sml_test_data.OBIS_TOTAL, sml_test_data.OBIS_FEED_TOTAL, sml_test_data.OBIS_POWER],
+                [reading.obis_code for reading in batch.readings],
+            )
+            self.assertEqual([12345678.9, 471.1, -250.0], [round(reading.value, 3) for reading in batch.readings])
+            self.assertEqual(["Wh", "Wh", "W"], [reading.unit for reading in batch.readings])
+
+    def test_read_function(self) -> None:
+        """power_counter.serial_ifc.get_read_function: Reads of serial ports return bursts, files are read in blocks."""
+        data = sml_test_data.default_sml_file()
+        master_fd, slave_fd = pty.openpty()
+        port = power_counter.serial_ifc.open_serial(os.ttyname(slave_fd), close_on_exit=False)
+        os.close(slave_fd)
+        read = power_counter.serial_ifc.get_read_function(port)
+        # The read returns all waiting bytes, not a fixed number of bytes
+        os.write(master_fd, data)
+        self.assertEqual(data, read())
+        # Block until the next byte is received
+        timer = threading.Timer(0.02, os.write, (master_fd, data[-1:]))
+        timer.start()
+        self.assertEqual(data[-1:], read())
+        timer.join()
+        port.close()
+        os.close(master_fd)
+
+        read = power_counter.serial_ifc.get_read_function(io.BytesIO(3 * data))
+        self.assertEqual(3 * data, read())
+        self.assertEqual(b"", read())
+
+    def test_latency_statistics(self) -> None:
+        """power_counter.sml_message_processor.process: Record the latency of each SML file."""
+        data = sml_test_data.default_sml_file(transaction_id=1) + sml_test_data.default_sml_file(transaction_id=2)
+        latency_stats = power_counter.sml_message_processor.LatencyStatistics()
+        self.assertEqual(0.0, latency_stats.mean)
+        power_counter.sml_message_processor.process(
+            Namespace(input_file=True), io.BytesIO(data), latency_stats=latency_stats
+        )
+        self.assertEqual(2, latency_stats.count)
+        self.assertLessEqual(0.0, latency_stats.minimum)
+        self.assertLessEqual(latency_stats.minimum, latency_stats.mean)
+        self.assertLessEqual(latency_stats.mean, latency_stats.maximum)
+        self.assertIn("2 SML files", str(latency_stats))
+
+    def test_process_async(self) -> None:
+        """power_counter.sml_message_processor.process_async: Iterate over the readings of an asyncio stream."""
+        frames = [sml_test_data.default_sml_file(transaction_id=idx) for idx in range(3)]
+
+        async def collect(reader):
+            return [batch async for batch in power_counter.sml_message_processor.process_async(reader)]
+
+        async def from_stream():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"garbage" + b"".join(frames))
+            reader.feed_eof()
+            return await collect(reader)
+
+        async def from_pipe():
+            read_fd, write_fd = os.pipe()
+            reader = power_counter.serial_ifc.open_fd_reader(read_fd)
+            loop = asyncio.get_running_loop()
+            for idx, frame in enumerate(frames):
+                # Split each frame to receive it in two parts
+                loop.call_later(0.01 * idx, os.write, write_fd, frame[:50])
+                loop.call_later(0.01 * idx + 0.005, os.write, write_fd, frame[50:])
+            loop.call_later(0.05, os.close, write_fd)
+            try:
+                return await collect(reader)
+            finally:
+                os.close(read_fd)
+
+        for batches in [asyncio.run(from_stream()), asyncio.run(from_pipe())]:
+            self.assertEqual(3, len(batches))
+            for batch in batches:
+                self.assertIsInstance(batch, power_counter.sml_message_processor.SmlReadingBatch)
+                self.assertEqual([12345678.9, 471.1, -250.0], [round(reading.value, 3) for reading in batch.readings])